@@ -7,11 +7,21 @@ class UserLoginForm(forms.Form):
     dni = forms.CharField(label="DNI", max_length=9)
     password = forms.CharField(widget=forms.PasswordInput, label="Contraseña")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_cache = None
+
     def clean(self):
         cleaned_data = super().clean()
         dni = cleaned_data.get("dni")
         password = cleaned_data.get("password")
-        user = authenticate(username=dni, password=password)
-        if not user:
+        # sin DNI o contraseña el formulario ya es inválido: no hace falta calcular el hash
+        if dni and password:
+            self.user_cache = authenticate(username=dni, password=password)
+        if not self.user_cache:
             raise forms.ValidationError("Credenciales incorrectas")
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+    def get_user(self):
+        # usuario autenticado en clean(), para no volver a comprobar la contraseña en la vista
+        return self.user_cache
\ No newline at end of file
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import get_hasher
+from unittest import mock
 
 class AutenticacionIntegrationTestCase(TestCase):
     def test_register_login_logout_flow(self):
@@ -50,3 +52,24 @@ class AutenticacionIntegrationTestCase(TestCase):
         })
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Este DNI ya está registrado.")
+
+
+class LoginHashIntegrationTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='12345678A', password='password123')
+
+    def post_login(self, password):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+            response = self.client.post(reverse('login'), data={'dni': '12345678A', 'password': password})
+        return response, verify.call_count
+
+    def test_login_correcto_calcula_el_hash_una_vez(self):
+        response, hashes = self.post_login('password123')
+        self.assertRedirects(response, reverse('home'))
+        self.assertEqual(hashes, 1)
+
+    def test_login_incorrecto_calcula_el_hash_una_vez(self):
+        response, hashes = self.post_login('wrongpassword')
+        self.assertContains(response, "Credenciales incorrectas")
+        self.assertEqual(hashes, 1)
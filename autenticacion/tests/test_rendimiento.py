@@ -0,0 +1,32 @@
+"""Presupuesto de consultas SQL del inicio de sesión, con miles de usuarios en la base de datos."""
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+USUARIOS = 3000
+
+
+class LoginRendimientoTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('password123')
+        User.objects.bulk_create(
+            [User(username=f'{i:08d}X', password=password) for i in range(USUARIOS)], batch_size=500
+        )
+
+    def test_login_correcto(self):
+        # usuario, sesión nueva (comprobar clave + insertar), last_login y guardar la sesión
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), data={'dni': '00001500X', 'password': 'password123'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_login_incorrecto(self):
+        # solo se busca el usuario; el mensaje de error va en la cookie
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('login'), data={'dni': '00001500X', 'password': 'otra'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_pagina_de_login(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('login'))
@@ -0,0 +1,71 @@
+"""Tiempo de arranque del proyecto.
+
+Ejecuta ``python -X importtime manage.py check`` varias veces, resume el tiempo de
+importación y comprueba que no se cargan módulos que no hacen falta para arrancar
+(keyring, yagmail...). Con ``--max-ms`` termina con error si se supera ese tiempo, para
+usarlo como control de regresiones.
+
+    python benchmarks/arranque.py [--repeticiones 5] [--max-ms 800]
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from entorno import BASE_DIR
+
+# módulos que no deben importarse al arrancar
+PROHIBIDOS = ('keyring', 'keyrings', 'yagmail')
+LINEA = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def medir():
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', 'check'],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    total = time.perf_counter() - inicio
+    modulos = {}
+    for linea in proceso.stderr.splitlines():
+        coincidencia = LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            modulos[modulo] = (int(propio), int(acumulado), len(sangria))
+    return total, modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, help='Tiempo máximo (mediana) permitido en milisegundos')
+    parser.add_argument('--top', type=int, default=10, help='Módulos más lentos a mostrar')
+    args = parser.parse_args()
+
+    medidas = [medir() for _ in range(args.repeticiones)]
+    totales = [total * 1000 for total, _ in medidas]
+    # tiempo de importación = suma de los módulos de primer nivel
+    importacion = [sum(acumulado for _, acumulado, nivel in modulos.values() if nivel == 1) / 1000
+                   for _, modulos in medidas]
+    modulos = medidas[-1][1]
+    print(f'manage.py check: mediana {statistics.median(totales):.0f} ms '
+          f'(min {min(totales):.0f}, max {max(totales):.0f}); '
+          f'importaciones {statistics.median(importacion):.0f} ms; {len(modulos)} módulos')
+    for modulo, (_, acumulado, _) in sorted(modulos.items(), key=lambda m: -m[1][1])[:args.top]:
+        print(f'  {acumulado / 1000:8.1f} ms  {modulo}')
+
+    errores = []
+    cargados = sorted(m for m in modulos if m.split('.')[0] in PROHIBIDOS)
+    if cargados:
+        errores.append(f'módulos que no deberían importarse al arrancar: {", ".join(cargados)}')
+    if args.max_ms and statistics.median(totales) > args.max_ms:
+        errores.append(f'el arranque supera {args.max_ms:.0f} ms')
+    for error in errores:
+        print(f'ERROR: {error}', file=sys.stderr)
+    sys.exit(1 if errores else 0)
+
+
+if __name__ == '__main__':
+    main()
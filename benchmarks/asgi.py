@@ -0,0 +1,152 @@
+"""Vistas de reservas async con ASGI frente a las vistas síncronas con WSGI.
+
+Cada cliente concurrente repite el ciclo ver la página de reservas, crear una reserva y
+eliminarla. Con WSGI cada cliente es un hilo con el cliente de test y las vistas síncronas
+equivalentes a las de antes; con ASGI cada cliente es una corrutina con el cliente async
+y las vistas async. Las dos pasadas usan la misma base de datos SQLite en fichero.
+
+    python benchmarks/asgi.py [--concurrencia 8] [--ciclos 30]
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import ModuleType
+
+from entorno import base_de_datos_temporal, configurar_django, resumen
+
+
+def urls_sincronas():
+    # las vistas síncronas de antes para la página, crear y eliminar; el resto de rutas
+    # (las que usa la plantilla base) se toman de rede.urls
+    from django.contrib.auth.decorators import login_required
+    from django.http import JsonResponse
+    from django.shortcuts import render
+    from django.urls import include, path
+    from django.utils.timezone import make_aware, now
+    from gestion_reservas.models import Reserva
+    from gestion_reservas.services import ReservaError, crear_reserva, eliminar_reserva
+
+    @login_required
+    def reservas(request):
+        reservas = Reserva.objects.filter(user_id=request.user)
+        return render(request, 'gestion_reservas.html', {'reservas': reservas, 'momento': now().isoformat()})
+
+    @login_required
+    def crear(request):
+        data = json.loads(request.body)
+        try:
+            reserva = crear_reserva(request.user, data['espacio'],
+                                    make_aware(datetime.fromisoformat(data['momento_inicio'])),
+                                    make_aware(datetime.fromisoformat(data['momento_fin'])))
+        except ReservaError as e:
+            return JsonResponse({"error": str(e)})
+        return JsonResponse({"id": reserva.id}, status=201)
+
+    @login_required
+    def eliminar(request, reserva_id):
+        eliminar_reserva(request.user, reserva_id)
+        return JsonResponse({"success": True})
+
+    modulo = ModuleType('urls_sincronas')
+    modulo.urlpatterns = [
+        path('reservas/', reservas),
+        path('reservas/crear/', crear),
+        path('reservas/eliminar/<int:reserva_id>/', eliminar),
+        path('', include('rede.urls')),
+    ]
+    return modulo
+
+
+def datos_reserva(cliente, ciclo):
+    # cada cliente reserva en su propio día para no competir por la misma franja
+    from django.utils.timezone import localdate
+    dia = localdate() + timedelta(days=1 + cliente)
+    inicio = datetime.combine(dia, datetime.min.time()) + timedelta(hours=ciclo % 24)
+    return {'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+            'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+
+
+def comprobar(response, esperado):
+    if response.status_code != esperado:
+        raise RuntimeError(f'{response.request["PATH_INFO"]}: {response.status_code} {response.content[:200]}')
+    return response
+
+
+def medir_wsgi(usuarios, ciclos):
+    from django.test import Client, override_settings
+
+    def cliente(indice):
+        client = Client()
+        client.force_login(usuarios[indice])
+        tiempos = []
+        for ciclo in range(ciclos):
+            inicio = time.perf_counter()
+            comprobar(client.get('/reservas/'), 200)
+            reserva = comprobar(client.post('/reservas/crear/', data=datos_reserva(indice, ciclo),
+                                            content_type='application/json'), 201).json()
+            comprobar(client.delete(f'/reservas/eliminar/{reserva["id"]}/'), 200)
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+    with override_settings(ROOT_URLCONF=urls_sincronas()):
+        return ejecutar_hilos(cliente, len(usuarios))
+
+
+def ejecutar_hilos(cliente, concurrencia):
+    from django.db import connections
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        resultados = list(ejecutor.map(cliente, range(concurrencia)))
+    connections.close_all()
+    return time.perf_counter() - inicio, [t for tiempos in resultados for t in tiempos]
+
+
+async def medir_asgi(usuarios, ciclos):
+    from django.test import AsyncClient
+
+    async def cliente(indice):
+        client = AsyncClient()
+        await client.aforce_login(usuarios[indice])
+        tiempos = []
+        for ciclo in range(ciclos):
+            inicio = time.perf_counter()
+            comprobar(await client.get('/reservas/'), 200)
+            reserva = comprobar(await client.post('/reservas/crear/', data=datos_reserva(indice, ciclo),
+                                                  content_type='application/json'), 201).json()
+            comprobar(await client.delete(f'/reservas/eliminar/{reserva["id"]}/'), 200)
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(cliente(i) for i in range(len(usuarios))))
+    return time.perf_counter() - inicio, [t for tiempos in resultados for t in tiempos]
+
+
+def mostrar(nombre, total, tiempos):
+    # cada ciclo son tres peticiones
+    print(f'{nombre}: {3 * len(tiempos) / total:.1f} peticiones/s en conjunto')
+    resumen('  ciclo', tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--ciclos', type=int, default=30)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.contrib.auth.models import User
+
+    with base_de_datos_temporal(fichero=True):
+        usuarios = [User.objects.create_user(username=f'bench{i}', password='password123')
+                    for i in range(args.concurrencia)]
+        print(f'{args.concurrencia} clientes concurrentes, {args.ciclos} ciclos cada uno')
+        mostrar('WSGI, vistas síncronas', *medir_wsgi(usuarios, args.ciclos))
+        mostrar('ASGI, vistas async', *asyncio.run(medir_asgi(usuarios, args.ciclos)))
+
+
+if __name__ == '__main__':
+    main()
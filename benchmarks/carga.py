@@ -0,0 +1,179 @@
+"""Prueba de carga: muchos usuarios compitiendo por las mismas horas.
+
+Cada usuario simulado inicia sesión por ``user_login``, abre ``/reservas/`` y después todos
+intentan a la vez reservar las mismas franjas populares de un espacio, cada uno en un orden
+aleatorio. Las peticiones van por el cliente de test de Django desde varios hilos contra una
+base de datos SQLite temporal en fichero. Al final se informa del rendimiento, de los
+percentiles de latencia, de cuántos intentos acabaron en conflicto o en error y de si quedó
+alguna franja reservada dos veces o alguna fianza (importe o número de reservas) descuadrada.
+
+    python benchmarks/carga.py [--usuarios 50] [--hilos 8] [--franjas 3] [--espacio Padel] [--hash-rapido]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from entorno import base_de_datos_temporal, configurar_django, resumen
+
+PASSWORD = 'password123'
+
+
+class Resultados:
+    def __init__(self):
+        self.tiempos = {}
+        self.estados = Counter()
+
+    def anotar(self, tipo, tiempo, estado):
+        # cada hilo anota en su propio Resultados; se suman al final con sumar()
+        self.tiempos.setdefault(tipo, []).append(tiempo)
+        self.estados[(tipo, estado)] += 1
+
+    def sumar(self, otro):
+        for tipo, tiempos in otro.tiempos.items():
+            self.tiempos.setdefault(tipo, []).extend(tiempos)
+        self.estados.update(otro.estados)
+
+
+def medir(resultados, tipo, peticion, clasificar):
+    inicio = time.perf_counter()
+    try:
+        response = peticion()
+        estado = clasificar(response)
+    except Exception as e:
+        estado = f'excepción {type(e).__name__}'
+    resultados.anotar(tipo, time.perf_counter() - inicio, estado)
+    return estado
+
+
+def clasificar_reserva(response):
+    if response.status_code == 201:
+        return 'reservada'
+    if response.status_code >= 500:
+        return f'error {response.status_code}'
+    error = response.json().get('error', '')
+    return 'conflicto' if 'Ya existe' in error else f'rechazada: {error}'
+
+
+def entrar(usuario):
+    from django.test import Client
+    # como un servidor real: un fallo de la vista es un 500, no una excepción en el hilo
+    client = Client(raise_request_exception=False)
+    resultados = Resultados()
+    medir(resultados, 'login', lambda: client.post('/login/', {'dni': usuario, 'password': PASSWORD}),
+          lambda r: 'ok' if r.status_code == 302 else f'error {r.status_code}')
+    medir(resultados, 'reservas', lambda: client.get('/reservas/'),
+          lambda r: 'ok' if r.status_code == 200 else f'error {r.status_code}')
+    return client, resultados
+
+
+def reservar(client, franjas, espacio, salida):
+    resultados = Resultados()
+    franjas = random.sample(franjas, len(franjas))
+    # todos los hilos esperan a la misma señal para que las peticiones coincidan
+    salida.wait()
+    for inicio in franjas:
+        # hora local sin zona, como la envía el formulario
+        datos = {'espacio': espacio, 'momento_inicio': inicio.isoformat(),
+                 'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+        medir(resultados, 'reservar', lambda: client.post('/reservas/crear/', data=datos,
+                                                          content_type='application/json'),
+              clasificar_reserva)
+    return resultados
+
+
+def comprobar_consistencia(espacio, franjas):
+    from django.db.models import Count
+    from gestion_pistas.catalogo import horarios
+    from gestion_reservas.models import Fianza, Reserva
+    from gestion_reservas.services import FIANZA_POR_RESERVA
+    # con capacidad > 1 una franja admite varias reservas: es doble la que repite plaza o la que
+    # pasa de las plazas del horario
+    duplicadas = Reserva.objects.values('espacio', 'momento_inicio', 'plaza').annotate(n=Count('id')).filter(n__gt=1)
+    plantillas = horarios()
+    por_franja = Reserva.objects.values('espacio', 'momento_inicio').annotate(n=Count('id')).filter(n__gt=1)
+    sobrantes = sum(
+        max(franja['n'] - plantillas[franja['espacio']].plazas(franja['momento_inicio']), 0)
+        for franja in por_franja if franja['espacio'] in plantillas
+    )
+    reservadas = Reserva.objects.filter(espacio=espacio, momento_inicio__in=franjas).count()
+    plazas = sum(plantillas[espacio].plazas(franja) for franja in franjas)
+    por_usuario = Counter(Reserva.objects.values_list('user_id_id', flat=True))
+    descuadradas = sum(
+        1 for user_id, cantidad, reservas in Fianza.objects.values_list('user_id_id', 'cantidad', 'reservas')
+        if cantidad != FIANZA_POR_RESERVA * por_usuario[user_id] or reservas != por_usuario[user_id]
+    )
+    return max(sum(d['n'] - 1 for d in duplicadas), sobrantes), reservadas, plazas, descuadradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--franjas', type=int, default=3,
+                        help='Horas populares por las que se compite (con más de 3 entra en juego el límite por usuario)')
+    parser.add_argument('--espacio', default='Padel')
+    parser.add_argument('--semilla', type=int, default=None)
+    parser.add_argument('--hash-rapido', action='store_true',
+                        help='Contraseñas con MD5 para que el login no domine la prueba')
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    configurar_django()
+    import threading
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from django.test import override_settings
+    from django.utils.timezone import localdate, make_aware
+
+    ajustes = {'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher']} if args.hash_rapido else {}
+    with base_de_datos_temporal(fichero=True), override_settings(**ajustes):
+        password = make_password(PASSWORD)
+        usuarios = [f'{i:08d}C' for i in range(args.usuarios)]
+        User.objects.bulk_create([User(username=usuario, password=password) for usuario in usuarios])
+        manana = datetime.combine(localdate() + timedelta(days=1), datetime.min.time())
+        franjas = [manana + timedelta(hours=18 + i) for i in range(args.franjas)]
+
+        total = Resultados()
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.hilos) as ejecutor:
+            clientes = []
+            for client, resultados in ejecutor.map(entrar, usuarios):
+                clientes.append(client)
+                total.sumar(resultados)
+            fase_entrada = time.perf_counter() - inicio
+
+            salida = threading.Event()
+            tareas = [ejecutor.submit(reservar, client, franjas, args.espacio, salida) for client in clientes]
+            inicio_carrera = time.perf_counter()
+            salida.set()
+            for tarea in tareas:
+                total.sumar(tarea.result())
+            fase_carrera = time.perf_counter() - inicio_carrera
+        connections.close_all()
+        duracion = time.perf_counter() - inicio
+
+        peticiones = sum(len(tiempos) for tiempos in total.tiempos.values())
+        intentos = len(total.tiempos.get('reservar', []))
+        print(f'{args.usuarios} usuarios, {args.hilos} hilos, {args.franjas} franjas de {args.espacio}')
+        print(f'{peticiones} peticiones en {duracion:.2f} s: {peticiones / duracion:.1f} peticiones/s '
+              f'(entrada {fase_entrada:.2f} s, carrera {intentos / fase_carrera:.1f} intentos de reserva/s)')
+        for tipo, tiempos in total.tiempos.items():
+            resumen(f'  {tipo}', tiempos)
+        print('Resultados:')
+        for (tipo, estado), cantidad in sorted(total.estados.items()):
+            print(f'  {tipo:<9} {estado:<40} {cantidad:>6} ({cantidad / len(total.tiempos[tipo]):.1%})')
+
+        dobles, reservadas, plazas, descuadradas = comprobar_consistencia(args.espacio, [make_aware(f) for f in franjas])
+        print(f'Plazas reservadas en las franjas populares: {reservadas} de {plazas}')
+        print(f'Reservas dobles: {dobles}')
+        print(f'Fianzas descuadradas: {descuadradas}')
+        if dobles or descuadradas:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
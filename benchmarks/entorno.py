@@ -0,0 +1,60 @@
+"""Utilidades comunes de los benchmarks.
+
+Cada benchmark se ejecuta desde la raíz del proyecto (``python benchmarks/<nombre>.py``)
+sobre una base de datos de test temporal, nunca sobre db.sqlite3.
+"""
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def configurar_django(settings='rede.settings'):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
+    import django
+    django.setup()
+
+
+@contextmanager
+def base_de_datos_temporal(fichero=False):
+    # crea la base de datos de test (con las migraciones aplicadas) y la borra al terminar;
+    # con fichero=True va a un fichero temporal en lugar de a memoria, para que abrir y
+    # cerrar conexiones cueste lo mismo que en un despliegue real
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.test.utils import setup_databases, teardown_databases
+    if fichero:
+        directorio = tempfile.mkdtemp(prefix='rede-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directorio, 'db.sqlite3')
+    # a diferencia del runner de tests, se respeta el DEBUG del perfil que se está midiendo
+    setup_test_environment(debug=settings.DEBUG)
+    configuracion = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(configuracion, verbosity=0)
+        teardown_test_environment()
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    indice = min(len(valores) - 1, max(0, round(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def resumen(nombre, tiempos):
+    # tiempos en segundos, uno por operación
+    total = sum(tiempos)
+    print(f'{nombre}: {len(tiempos)} operaciones en {total:.2f} s '
+          f'({len(tiempos) / total if total else 0:.1f} op/s) | '
+          f'media {statistics.mean(tiempos) * 1000:.1f} ms, '
+          f'p50 {percentil(tiempos, 50) * 1000:.1f} ms, '
+          f'p99 {percentil(tiempos, 99) * 1000:.1f} ms')
@@ -0,0 +1,65 @@
+"""Latencia de las peticiones con el perfil de desarrollo y con el de producción.
+
+Lanza un proceso por perfil (rede.settings y rede.settings_produccion), cada uno con su
+base de datos temporal en fichero, y mide con el cliente de test de Django las páginas
+principales y las vistas de reservas.
+
+    python benchmarks/latencia.py [--peticiones 200]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from entorno import BASE_DIR, base_de_datos_temporal, configurar_django, resumen
+
+PERFILES = {
+    'desarrollo': 'rede.settings',
+    'produccion': 'rede.settings_produccion',
+}
+
+
+def medir_perfil(peticiones):
+    from datetime import timedelta
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.utils.timezone import localdate
+
+    with base_de_datos_temporal(fichero=True):
+        User.objects.create_user(username='12345678A', password='password123')
+        client = Client()
+        client.login(username='12345678A', password='password123')
+        manana = (localdate() + timedelta(days=1)).isoformat()
+        urls = ['/', '/about-us/', '/reservas/', f'/reservas/disponibilidad/?desde={manana}']
+        for url in urls:
+            client.get(url)  # calentar
+            tiempos = []
+            for _ in range(peticiones):
+                inicio = time.perf_counter()
+                client.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+            resumen(f'  GET {url}', tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--perfil', choices=PERFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.perfil:
+        configurar_django(PERFILES[args.perfil])
+        medir_perfil(args.peticiones)
+        return
+
+    for perfil, settings in PERFILES.items():
+        print(f'{perfil} ({settings})', flush=True)
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=settings)
+        entorno.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+        subprocess.run([sys.executable, __file__, '--perfil', perfil, '--peticiones', str(args.peticiones)],
+                       cwd=BASE_DIR, env=entorno, check=True)
+
+
+if __name__ == '__main__':
+    main()
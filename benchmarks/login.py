@@ -0,0 +1,44 @@
+"""Rendimiento del inicio de sesión.
+
+Mide logins por segundo contra ``user_login`` y cuenta cuántas veces se calcula el hash
+de la contraseña en cada intento (debería ser una).
+
+    python benchmarks/login.py [--intentos 50]
+"""
+import argparse
+import time
+
+from entorno import base_de_datos_temporal, configurar_django, resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--intentos', type=int, default=50)
+    args = parser.parse_args()
+
+    configurar_django()
+    from unittest import mock
+    from django.contrib.auth.hashers import get_hasher
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+
+    hasher = type(get_hasher())
+    with base_de_datos_temporal():
+        User.objects.create_user(username='12345678A', password='password123')
+        url = reverse('login')
+        with mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+            for nombre, password in (('correcto', 'password123'), ('incorrecto', 'otra')):
+                verify.reset_mock()
+                tiempos = []
+                for _ in range(args.intentos):
+                    client = Client()
+                    inicio = time.perf_counter()
+                    client.post(url, data={'dni': '12345678A', 'password': password})
+                    tiempos.append(time.perf_counter() - inicio)
+                resumen(f'login {nombre}', tiempos)
+                print(f'  hashes por intento: {verify.call_count / args.intentos:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,8 @@
 from django.contrib import admin
-
+from .models import CorreoSaliente
 # Register your models here.
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    readonly_fields=('created_at', 'enviado_at')
+    list_display = ('__str__', 'estado', 'intentos', 'created_at', 'enviado_at')
+    list_filter = ('estado',)
+admin.site.register(CorreoSaliente, CorreoSalienteAdmin)
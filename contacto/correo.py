@@ -0,0 +1,122 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, transaction
+from django.utils.timezone import now
+
+from .models import CorreoSaliente, EstadoCorreo
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 5
+# correos enviados por cada conexión SMTP
+TAMANO_LOTE = 20
+# tiempo que un worker se reserva los correos que está enviando
+RESERVA = timedelta(minutes=5)
+
+# espera mínima entre reintentos programados, para no encadenar envíos vacíos
+ESPERA_MINIMA = 1
+
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='correo')
+# temporizador del próximo reintento del hilo de envío (solo hay uno programado a la vez)
+_reintento = None
+_lock_reintento = threading.Lock()
+
+
+def encolar(asunto, cuerpo, destinatarios, remitente='', responder_a=None):
+    correo = CorreoSaliente.objects.create(
+        asunto=asunto, cuerpo=cuerpo, remitente=remitente,
+        destinatarios=list(destinatarios), responder_a=list(responder_a or []),
+    )
+    # si está activado, se envía en un hilo en cuanto la petición hace commit; si no,
+    # lo recoge el comando enviar_correos
+    if getattr(settings, 'CORREO_ENVIO_EN_SEGUNDO_PLANO', False):
+        transaction.on_commit(lambda: _ejecutor.submit(_enviar_en_hilo))
+    return correo
+
+
+def _enviar_en_hilo():
+    try:
+        # lote a lote hasta vaciar la cola; los que fallan esperan a su próximo intento
+        while sum(enviar_pendientes()):
+            pass
+        _programar_reintento()
+    except Exception:
+        logger.exception('Error enviando la cola de correos')
+    finally:
+        close_old_connections()
+
+
+def _programar_reintento():
+    # vuelve a lanzar el hilo cuando toque el siguiente reintento, sin esperar a otro correo
+    # ni al comando enviar_correos. El temporizador vive en el proceso: si se reinicia, los
+    # pendientes los recoge el siguiente encolar o el comando (ver CORREO_ENVIO_EN_SEGUNDO_PLANO)
+    global _reintento
+    siguiente = CorreoSaliente.objects.filter(estado=EstadoCorreo.PENDIENTE).order_by(
+        'proximo_intento').values_list('proximo_intento', flat=True).first()
+    if siguiente is None:
+        return
+    espera = max((siguiente - now()).total_seconds(), ESPERA_MINIMA)
+    with _lock_reintento:
+        if _reintento is not None:
+            _reintento.cancel()
+        _reintento = threading.Timer(espera, _ejecutor.submit, [_enviar_en_hilo])
+        _reintento.daemon = True
+        _reintento.start()
+
+
+def reservar_pendientes(limite=TAMANO_LOTE):
+    with transaction.atomic():
+        ids = list(CorreoSaliente.objects.filter(
+            estado=EstadoCorreo.PENDIENTE, proximo_intento__lte=now()
+        ).order_by('id').values_list('id', flat=True)[:limite])
+        CorreoSaliente.objects.filter(id__in=ids).update(proximo_intento=now() + RESERVA)
+    return list(CorreoSaliente.objects.filter(id__in=ids))
+
+
+def enviar_pendientes(limite=TAMANO_LOTE):
+    # envía un lote de correos pendientes reutilizando una sola conexión; devuelve
+    # cuántos se han enviado y cuántos han fallado en este intento
+    correos = reservar_pendientes(limite)
+    if not correos:
+        return 0, 0
+    enviados = fallidos = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for correo in correos:
+            _registrar_fallo(correo, e)
+        return 0, len(correos)
+    try:
+        for correo in correos:
+            try:
+                if not connection.send_messages([correo.como_email(connection)]):
+                    raise RuntimeError('El backend de correo no envió el mensaje')
+            except Exception as e:
+                _registrar_fallo(correo, e)
+                fallidos += 1
+            else:
+                correo.estado = EstadoCorreo.ENVIADO
+                correo.enviado_at = now()
+                correo.save(update_fields=['estado', 'enviado_at'])
+                enviados += 1
+    finally:
+        connection.close()
+    return enviados, fallidos
+
+
+def _registrar_fallo(correo, error):
+    correo.intentos += 1
+    correo.ultimo_error = str(error)
+    if correo.intentos >= MAX_INTENTOS:
+        correo.estado = EstadoCorreo.FALLIDO
+        logger.error('Correo %s descartado tras %s intentos: %s', correo.pk, correo.intentos, error)
+    else:
+        # espera exponencial: 1, 2, 4, 8... minutos
+        correo.proximo_intento = now() + timedelta(minutes=2 ** (correo.intentos - 1))
+    correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contacto.correo import TAMANO_LOTE, enviar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la cola, agrupando varios por conexión SMTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true',
+                            help='Sigue comprobando la cola en lugar de terminar cuando esté vacía')
+        parser.add_argument('--intervalo', type=float, default=5,
+                            help='Segundos de espera entre comprobaciones en modo continuo')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Correos enviados por conexión')
+
+    def handle(self, *args, **options):
+        while True:
+            enviados, fallidos = enviar_pendientes(options['lote'])
+            if enviados or fallidos:
+                self.stdout.write(f'{enviados} enviados, {fallidos} fallidos')
+            if enviados + fallidos < options['lote']:
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asunto', models.CharField(max_length=255)),
+                ('cuerpo', models.TextField()),
+                ('remitente', models.CharField(blank=True, max_length=254)),
+                ('destinatarios', models.JSONField(default=list)),
+                ('responder_a', models.JSONField(blank=True, default=list)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('enviado_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'correo saliente',
+                'verbose_name_plural': 'correos salientes',
+                'db_table': 'correos_salientes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='correo_pendiente_idx')],
+            },
+        ),
+    ]
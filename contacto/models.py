@@ -1,3 +1,40 @@
 from django.db import models
+from django.core.mail import EmailMessage
+from django.utils.timezone import now
 
-# Create your models here.
+class EstadoCorreo(models.TextChoices):
+    PENDIENTE = 'pendiente', 'Pendiente'
+    ENVIADO = 'enviado', 'Enviado'
+    FALLIDO = 'fallido', 'Fallido'
+
+class CorreoSaliente(models.Model):
+    # cola de correos: la vista solo la rellena y el envío se hace en segundo plano
+    asunto = models.CharField(max_length=255)
+    cuerpo = models.TextField()
+    remitente = models.CharField(max_length=254, blank=True)
+    destinatarios = models.JSONField(default=list)
+    responder_a = models.JSONField(default=list, blank=True)
+    estado = models.CharField(max_length=10, choices=EstadoCorreo.choices, default=EstadoCorreo.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+    # un worker que coge el correo lo aplaza unos minutos para que nadie más lo envíe a la vez
+    proximo_intento = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    enviado_at = models.DateTimeField(null=True, blank=True)
+    def __str__(self):
+        return f'Correo {self.pk} "{self.asunto}" ({self.estado})'
+
+    def como_email(self, connection=None):
+        return EmailMessage(
+            self.asunto, self.cuerpo, self.remitente or None, self.destinatarios,
+            reply_to=self.responder_a, connection=connection,
+        )
+
+    class Meta:
+        db_table = 'correos_salientes'
+        verbose_name = 'correo saliente'
+        verbose_name_plural = 'correos salientes'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_pendiente_idx'),
+        ]
@@ -2,6 +2,7 @@ from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.core import mail
 from contacto.forms import ContactForm
+from contacto.correo import enviar_pendientes
 
 class ContactoIntegrationTestCase(TestCase):
     def test_contacto_view_get_request(self):
@@ -19,6 +20,8 @@ class ContactoIntegrationTestCase(TestCase):
         response = self.client.post(reverse('Contacto'), data=form_data)
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, '/contacto/?valido')
+        self.assertEqual(len(mail.outbox), 0)
+        enviar_pendientes()
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('Nuevo mensaje de contacto', mail.outbox[0].subject)
         self.assertIn(form_data['contenido'], mail.outbox[0].body)
@@ -0,0 +1,28 @@
+"""Presupuesto de consultas SQL del formulario de contacto, con la cola de correos llena."""
+from django.test import TestCase
+from django.urls import reverse
+
+from contacto.models import CorreoSaliente
+
+CORREOS = 5000
+
+
+class ContactoRendimientoTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CorreoSaliente.objects.bulk_create([
+            CorreoSaliente(asunto='Prueba', cuerpo='Mensaje', destinatarios=['a@example.com'])
+            for _ in range(CORREOS)
+        ], batch_size=500)
+
+    def test_enviar_formulario(self):
+        # solo se encola el correo; el envío va aparte
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('Contacto'), data={
+                'nombre': 'Test', 'email': 'test@example.com', 'contenido': 'Hola',
+            })
+        self.assertEqual(response.status_code, 302)
+
+    def test_pagina_de_contacto(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('Contacto'))
@@ -3,6 +3,14 @@ from django.urls import reverse, resolve
 from django.core import mail
 from contacto.forms import ContactForm
 from contacto.views import contacto
+from contacto.correo import enviar_pendientes, encolar, MAX_INTENTOS, TAMANO_LOTE, _enviar_en_hilo
+from contacto.models import CorreoSaliente, EstadoCorreo
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.timezone import now
+from unittest import mock
+from datetime import timedelta
+from io import StringIO
 
 # Tests para ContactForm
 class ContactFormTestCase(TestCase):
@@ -44,6 +52,7 @@ class ContactoViewTestCase(TestCase):
             'contenido': 'Esto es un mensaje de prueba.'
         })
         self.assertEqual(response.status_code, 302)
+        enviar_pendientes()
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('test@example.com', mail.outbox[0].reply_to)
 
@@ -65,6 +74,86 @@ class ContactoViewTestCase(TestCase):
         })
         self.assertRedirects(response, '/contacto/?no_valido')
 
+# Tests para la cola de correos
+class CorreoSalienteTestCase(TestCase):
+    def encolar_varios(self, n):
+        for i in range(n):
+            encolar(f'Asunto {i}', 'Cuerpo', ['atencion.contacto.rede@gmail.com'], responder_a=['test@example.com'])
+
+    def test_la_vista_solo_encola(self):
+        self.client.post(reverse('Contacto'), data={
+            'nombre': 'Test',
+            'email': 'test@example.com',
+            'contenido': 'Esto es un mensaje de prueba.'
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.estado, EstadoCorreo.PENDIENTE)
+        self.assertEqual(correo.responder_a, ['test@example.com'])
+
+    def test_varios_correos_por_conexion(self):
+        self.encolar_varios(3)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_:
+            self.assertEqual(enviar_pendientes(), (3, 0))
+        self.assertEqual(open_.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(CorreoSaliente.objects.exclude(estado=EstadoCorreo.ENVIADO).exists())
+        self.assertEqual(enviar_pendientes(), (0, 0))
+
+    def test_reintenta_con_espera(self):
+        self.encolar_varios(1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP caído')):
+            self.assertEqual(enviar_pendientes(), (0, 1))
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.intentos, 1)
+        self.assertEqual(correo.ultimo_error, 'SMTP caído')
+        self.assertGreater(correo.proximo_intento, now())
+        # no se reintenta hasta que pase la espera
+        self.assertEqual(enviar_pendientes(), (0, 0))
+        CorreoSaliente.objects.update(proximo_intento=now() - timedelta(seconds=1))
+        self.assertEqual(enviar_pendientes(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_descarta_tras_el_maximo_de_intentos(self):
+        self.encolar_varios(1)
+        CorreoSaliente.objects.update(intentos=MAX_INTENTOS - 1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('sin conexión')):
+            enviar_pendientes()
+        self.assertEqual(CorreoSaliente.objects.get().estado, EstadoCorreo.FALLIDO)
+
+    def test_comando_enviar_correos(self):
+        self.encolar_varios(5)
+        salida = StringIO()
+        call_command('enviar_correos', lote=2, stdout=salida)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('2 enviados', salida.getvalue())
+
+    @override_settings(CORREO_ENVIO_EN_SEGUNDO_PLANO=True)
+    def test_envio_en_segundo_plano_tras_el_commit(self):
+        with mock.patch('contacto.correo._ejecutor') as ejecutor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.encolar_varios(1)
+        ejecutor.submit.assert_called_once()
+
+    @mock.patch('contacto.correo.close_old_connections')
+    def test_el_hilo_vacia_la_cola(self, _):
+        self.encolar_varios(2 * TAMANO_LOTE + 1)
+        with mock.patch('contacto.correo.threading.Timer') as temporizador:
+            _enviar_en_hilo()
+        self.assertEqual(len(mail.outbox), 2 * TAMANO_LOTE + 1)
+        temporizador.assert_not_called()
+
+    @mock.patch('contacto.correo.close_old_connections')
+    def test_el_hilo_programa_los_reintentos(self, _):
+        self.encolar_varios(1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP caído')), \
+                mock.patch('contacto.correo.threading.Timer') as temporizador:
+            _enviar_en_hilo()
+        # primer reintento al cabo de un minuto
+        espera = temporizador.call_args.args[0]
+        self.assertAlmostEqual(espera, 60, delta=5)
+        temporizador.return_value.start.assert_called_once()
+
 # Tests para URLs
 class ContactoURLTestCase(TestCase):
     def test_contacto_url_resolves_correct_view(self):
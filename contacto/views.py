@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect
-from django.core.mail import EmailMessage
 from .forms import ContactForm
+from .correo import encolar
 
 def contacto(request):
     if request.method == 'POST':
@@ -9,17 +9,17 @@ def contacto(request):
             name = request.POST.get('nombre')
             email = request.POST.get('email')
             content = request.POST.get('contenido')
-            email_message = EmailMessage(
-                'ReDe: Nuevo mensaje de contacto',
-                'El usuario con nombre {} con la dirección de correo {} escribe lo siguiente:\n\n{}'.format(name, email, content),
-                '', ['atencion.contacto.rede@gmail.com'], reply_to=[email]
-            )
+            # el correo se guarda en la cola y se envía en segundo plano, sin esperar al SMTP
             try:
-                email_message.send()
+                encolar(
+                    'ReDe: Nuevo mensaje de contacto',
+                    'El usuario con nombre {} con la dirección de correo {} escribe lo siguiente:\n\n{}'.format(name, email, content),
+                    ['atencion.contacto.rede@gmail.com'], responder_a=[email]
+                )
                 return redirect('/contacto/?valido')
             except:
                 return redirect('/contacto/?no_valido')
     else:
         contacto = ContactForm()
 
-    return render(request, 'contacto/Contacto.html', {'contacto': contacto})
\ No newline at end of file
+    return render(request, 'contacto/Contacto.html', {'contacto': contacto})
@@ -1,7 +1,20 @@
 from django.contrib import admin
-from .models import Pista
+from gestion_reservas.paginacion import RecuentoEstimadoPaginator
+from .models import Cierre, Pista
 # Register your models here.
+class CierreInline(admin.TabularInline):
+    model = Cierre
+    extra = 0
 class PistaAdmin(admin.ModelAdmin):
-    readonly_fields=('created_at')
-    search_fields = ['name']
-admin.register(Pista, PistaAdmin)
\ No newline at end of file
+    paginator = RecuentoEstimadoPaginator
+    show_full_result_count = False
+    list_display = ('name', 'category', 'date', 'start_time', 'end_time', 'capacidad', 'price', 'available')
+    # filtros y orden respaldados por los índices de Pista
+    list_filter = ('category', 'available', 'date')
+    ordering = ('-date', 'start_time')
+    search_fields = ['^name']
+    inlines = [CierreInline]
+    def get_readonly_fields(self, request, obj=None):
+        # las reservas apuntan a la pista por el nombre: para retirarla, desmarcar available
+        return ('name',) if obj else ()
+admin.site.register(Pista, PistaAdmin)
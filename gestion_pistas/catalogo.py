@@ -0,0 +1,102 @@
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.timezone import now
+
+from .horario import Horario
+from .models import Cierre, Pista
+
+# catálogo de pistas en la memoria de cada proceso, para validar y pintar las reservas sin
+# consultar la tabla pistas en cada petición. La versión vive en la caché compartida: cada
+# lectura la compara con la del catálogo cargado y solo vuelve a leer las tablas si ha cambiado.
+# Al cargarlo se compila el horario de cada pista (ver horario.py). Guardar o borrar una pista o
+# un cierre (el admin) cambia la versión al confirmarse la transacción. La caché 'catalogo' es de
+# fichero para que la compartan todos los procesos (ver settings.CACHES)
+
+CACHE = 'catalogo'
+CLAVE_VERSION = 'catalogo:version'
+
+
+class Catalogo:
+    def __init__(self):
+        # (versión, {nombre: Pista}, {nombre: Horario}) en una sola tupla, que se sustituye
+        # entera al recargar
+        self._cargado = (None, {}, {})
+
+    def version(self):
+        cache = caches[CACHE]
+        version = cache.get(CLAVE_VERSION)
+        if version is None:
+            # primera lectura o caché vaciada: vale cualquier versión, pero la misma para todos
+            cache.add(CLAVE_VERSION, uuid4().hex, None)
+            version = cache.get(CLAVE_VERSION)
+        return version
+
+    def cargar(self):
+        version = self.version()
+        if version != self._cargado[0]:
+            # la versión se lee antes que las tablas: un cambio posterior obliga a recargar
+            self._compilar(version, list(Pista.objects.all()), list(cierres_pendientes()))
+        return self._cargado
+
+    async def acargar(self):
+        version = self.version()
+        if version != self._cargado[0]:
+            self._compilar(version, [pista async for pista in Pista.objects.all()],
+                           [cierre async for cierre in cierres_pendientes()])
+        return self._cargado
+
+    def _compilar(self, version, pistas, cierres):
+        por_pista = {}
+        for cierre in cierres:
+            por_pista.setdefault(cierre.pista_id, []).append(cierre)
+        horarios = {pista.name: Horario(pista, por_pista.get(pista.id, ())) for pista in pistas}
+        self._cargado = (version, {pista.name: pista for pista in pistas}, horarios)
+
+
+def cierres_pendientes():
+    # los cierres ya terminados no afectan a las horas que aún se pueden reservar
+    return Cierre.objects.filter(fin__gt=now())
+
+
+catalogo = Catalogo()
+
+
+def version():
+    return catalogo.version()
+
+
+def pistas():
+    """{nombre: Pista} de todas las pistas del catálogo; las instancias son solo de lectura."""
+    return catalogo.cargar()[1]
+
+
+async def apistas():
+    return (await catalogo.acargar())[1]
+
+
+def pista(nombre):
+    return pistas().get(nombre)
+
+
+def horarios():
+    """{nombre: Horario} con las reglas de reserva compiladas de cada pista."""
+    return catalogo.cargar()[2]
+
+
+async def ahorarios():
+    return (await catalogo.acargar())[2]
+
+
+def horario(nombre):
+    return horarios().get(nombre)
+
+
+def cambiar_version():
+    caches[CACHE].set(CLAVE_VERSION, uuid4().hex, None)
+
+
+def invalidar_catalogo():
+    # después del commit: si otro proceso recargase antes, leería las pistas sin el cambio
+    transaction.on_commit(cambiar_version)
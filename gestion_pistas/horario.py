@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from django.utils.timezone import localtime
+
+HORAS_DIA = 24
+# plantilla de un día sin ninguna hora que se pueda reservar
+CERRADO = bytes(HORAS_DIA)
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _local(momento):
+    # hora local sin zona, para recorrer los días y las horas de un cierre
+    return localtime(momento).replace(tzinfo=None)
+
+
+class Horario:
+    """Reglas de reserva de una pista compiladas en plantillas de un día.
+
+    Una plantilla son 24 bytes con las plazas que se pueden reservar en cada hora: la
+    capacidad en las horas de apertura y 0 en el resto. Los días normales comparten la misma
+    plantilla y los días con algún cierre tienen la suya, así que saber si una hora se puede
+    reservar es un acceso a un diccionario y otro a la plantilla.
+    """
+
+    def __init__(self, pista, cierres=()):
+        self.pista = pista
+        apertura = _minutos(pista.start_time)
+        cierre = _minutos(pista.end_time) or HORAS_DIA * 60
+        capacidad = pista.capacidad if pista.available else 0
+        # las reservas duran una hora y empiezan en punto
+        self.base = bytes(capacidad if apertura <= hora * 60 and (hora + 1) * 60 <= cierre else 0
+                          for hora in range(HORAS_DIA))
+        self.excepciones = {}
+        self.cierres = {}
+        for cierre in cierres:
+            self._aplicar_cierre(cierre)
+
+    def _aplicar_cierre(self, cierre):
+        inicio, fin = _local(cierre.inicio), _local(cierre.fin)
+        dia = inicio.date()
+        while datetime.combine(dia, datetime.min.time()) < fin:
+            plantilla = bytearray(self.excepciones.get(dia, self.base))
+            for hora in range(HORAS_DIA):
+                franja = datetime.combine(dia, datetime.min.time()) + timedelta(hours=hora)
+                if franja < fin and franja + timedelta(hours=1) > inicio:
+                    plantilla[hora] = 0
+            self.excepciones[dia] = bytes(plantilla)
+            self.cierres.setdefault(dia, []).append(cierre)
+            dia += timedelta(days=1)
+
+    def plantilla(self, dia):
+        if dia < self.pista.date:
+            return CERRADO
+        return self.excepciones.get(dia, self.base)
+
+    def plazas(self, momento_inicio):
+        # plazas de la hora que empieza en momento_inicio, sin contar las ya reservadas
+        momento = localtime(momento_inicio)
+        return self.plantilla(momento.date())[momento.hour]
+
+    def motivo(self, momento_inicio):
+        # None si se puede reservar la hora que empieza en momento_inicio; si no, el motivo
+        if self.plazas(momento_inicio):
+            return None
+        pista = self.pista
+        if not pista.available:
+            return 'La pista no está disponible'
+        momento = localtime(momento_inicio)
+        if momento.date() < pista.date:
+            return f'La pista no se puede reservar hasta el {pista.date:%d/%m/%Y}'
+        for cierre in self.cierres.get(momento.date(), ()):
+            if cierre.inicio < momento_inicio + timedelta(hours=1) and cierre.fin > momento_inicio:
+                return f'La pista está cerrada: {cierre.motivo}' if cierre.motivo else 'La pista está cerrada'
+        return f'La pista abre de {pista.start_time:%H:%M} a {pista.end_time:%H:%M}'
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('price', models.FloatField()),
+                ('category', models.CharField(max_length=50)),
+                ('available', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'pista',
+                'verbose_name_plural': 'pistas',
+                'db_table': 'pistas',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 0001 coincide con la tabla que ya creaba syncdb, así que en esas bases de datos
+    # se puede marcar con migrate --fake-initial; los índices van aparte
+
+    dependencies = [
+        ('gestion_pistas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pista',
+            index=models.Index(fields=['date', 'start_time'], name='pista_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pista',
+            index=models.Index(fields=['category', 'date'], name='pista_categoria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pista',
+            index=models.Index(fields=['name'], name='pista_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_pistas', '0002_pista_indices'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pista',
+            name='pista_nombre_idx',
+        ),
+        migrations.AlterField(
+            model_name='pista',
+            name='date',
+            field=models.DateField(help_text='Primer día que se puede reservar'),
+        ),
+        migrations.AlterField(
+            model_name='pista',
+            name='end_time',
+            field=models.TimeField(help_text='Hora de cierre (00:00 es medianoche)'),
+        ),
+        migrations.AlterField(
+            model_name='pista',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='pista',
+            name='price',
+            field=models.FloatField(help_text='Precio por hora'),
+        ),
+        migrations.AlterField(
+            model_name='pista',
+            name='start_time',
+            field=models.TimeField(help_text='Hora de apertura'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:45
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_pistas', '0003_pista_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pista',
+            name='capacidad',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Reservas a la vez en cada hora (calles de la piscina)', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.CreateModel(
+            name='Cierre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('fin', models.DateTimeField()),
+                ('motivo', models.CharField(blank=True, max_length=100)),
+                ('pista', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres', to='gestion_pistas.pista')),
+            ],
+            options={
+                'verbose_name': 'cierre',
+                'verbose_name_plural': 'cierres',
+                'db_table': 'cierres',
+                'ordering': ['inicio'],
+                'indexes': [models.Index(fields=['fin'], name='cierre_fin_idx')],
+            },
+        ),
+    ]
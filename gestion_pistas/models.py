@@ -1,19 +1,54 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
 
 # Create your models here.
 class Pista(models.Model):
-    name = models.CharField(max_length=100)
-    date = models.DateField()
-    start_time = models.TimeField()
-    end_time = models.TimeField()
-    price = models.FloatField()
+    # catálogo de espacios que se pueden reservar; las reservas apuntan a la pista por su nombre
+    name = models.CharField(max_length=100, unique=True)
+    date = models.DateField(help_text='Primer día que se puede reservar')
+    start_time = models.TimeField(help_text='Hora de apertura')
+    end_time = models.TimeField(help_text='Hora de cierre (00:00 es medianoche)')
+    price = models.FloatField(help_text='Precio por hora')
     category = models.CharField(max_length=50)
     available = models.BooleanField(default=True)
+    # reservas a la vez en cada hora, p. ej. las calles de una piscina
+    capacidad = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)],
+                                                 help_text='Reservas a la vez en cada hora (calles de la piscina)')
     def __str__(self):
         return f'{self.name}'
+
     class Meta:
         db_table = 'pistas'
         verbose_name = 'pista'
         verbose_name_plural = 'pistas'
         ordering = ['id']
-    
+        # para los filtros y el orden del admin (el nombre ya tiene el índice único)
+        indexes = [
+            models.Index(fields=['date', 'start_time'], name='pista_fecha_idx'),
+            models.Index(fields=['category', 'date'], name='pista_categoria_idx'),
+        ]
+
+
+class Cierre(models.Model):
+    # la pista no se puede reservar entre inicio y fin (mantenimiento, competiciones...)
+    pista = models.ForeignKey(Pista, on_delete=models.CASCADE, related_name='cierres')
+    inicio = models.DateTimeField()
+    fin = models.DateTimeField()
+    motivo = models.CharField(max_length=100, blank=True)
+    def __str__(self):
+        return f'{self.pista} cerrada de {self.inicio} a {self.fin}'
+
+    def clean(self):
+        if self.inicio and self.fin and self.fin <= self.inicio:
+            raise ValidationError({'fin': 'El cierre tiene que terminar después de empezar'})
+
+    class Meta:
+        db_table = 'cierres'
+        verbose_name = 'cierre'
+        verbose_name_plural = 'cierres'
+        ordering = ['inicio']
+        # el catálogo solo carga los cierres que no han terminado
+        indexes = [
+            models.Index(fields=['fin'], name='cierre_fin_idx'),
+        ]
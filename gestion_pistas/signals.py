@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalogo import invalidar_catalogo
+from .models import Cierre, Pista
+
+
+@receiver(post_save, sender=Pista)
+@receiver(post_delete, sender=Pista)
+@receiver(post_save, sender=Cierre)
+@receiver(post_delete, sender=Cierre)
+def invalidar_catalogo_al_cambiar(sender, instance, **kwargs):
+    invalidar_catalogo()
@@ -1,3 +1,184 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import localdate, make_aware
+from gestion_reservas.models import Reserva
+
+from .catalogo import cambiar_version, horario, pista, pistas, version
+from .horario import Horario
+from .models import Cierre, Pista
+
+
+class PistaAdminTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        Pista.objects.create(name='Pista central', date=date(2025, 1, 1), start_time=time(10),
+                             end_time=time(11), price=8.5, category='Padel')
+
+    def test_listado(self):
+        response = self.client.get(reverse('admin:gestion_pistas_pista_changelist'), {'q': 'Pista'})
+        self.assertContains(response, 'Pista central')
+
+    def test_filtro_por_categoria(self):
+        response = self.client.get(reverse('admin:gestion_pistas_pista_changelist'), {'category': 'Fútbol'})
+        self.assertNotContains(response, 'Pista central')
+
+    def test_nombre_solo_lectura_al_editar(self):
+        central = Pista.objects.get(name='Pista central')
+        response = self.client.get(reverse('admin:gestion_pistas_pista_change', args=[central.id]))
+        self.assertNotContains(response, 'name="name"')
+
+
+class CatalogoTestCase(TestCase):
+    def setUp(self):
+        # el catálogo vive en el proceso: que ninguna prueba vea las pistas de otra
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+
+    def test_sin_consultas_una_vez_cargado(self):
+        # pistas y cierres
+        with self.assertNumQueries(2):
+            pistas()
+        with self.assertNumQueries(0):
+            self.assertEqual(pista('Padel').category, 'Padel')
+            self.assertIsNone(pista('Tenis'))
+            self.assertEqual(horario('Padel').plazas(make_aware(datetime(2025, 1, 1, 10))), 1)
+
+    def test_guardar_un_cierre_invalida_el_catalogo(self):
+        manana = localdate() + timedelta(days=1)
+        inicio = make_aware(datetime.combine(manana, time(10)))
+        self.assertEqual(horario('Padel').plazas(inicio), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cierre.objects.create(pista=pista('Padel'), inicio=inicio, fin=inicio + timedelta(hours=2))
+        self.assertEqual(horario('Padel').plazas(inicio), 0)
+        # los cierres ya terminados no se cargan
+        with self.captureOnCommitCallbacks(execute=True):
+            Cierre.objects.update(inicio=inicio - timedelta(days=3), fin=inicio - timedelta(days=2))
+            Pista.objects.get(name='Padel').save()
+        self.assertEqual(horario('Padel').excepciones, {})
+
+    def test_guardar_una_pista_invalida_el_catalogo(self):
+        pistas()
+        with self.captureOnCommitCallbacks(execute=True):
+            Pista.objects.create(name='Tenis', date=date(2025, 1, 1), start_time=time(9),
+                                 end_time=time(21), price=6, category='Tenis')
+        self.assertEqual(pista('Tenis').price, 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pista.objects.filter(name='Tenis').delete()
+            Pista.objects.get(name='Padel').delete()
+        self.assertNotIn('Padel', pistas())
+
+
+
+    def test_la_version_se_comparte_entre_procesos(self):
+        # lo que ve otro worker al comparar la versión con la de su catálogo
+        cambiar_version()
+        otro = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup(); from gestion_pistas.catalogo import version; print(version())'],
+            capture_output=True, text=True, check=True, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'rede.settings'},
+        )
+        self.assertEqual(otro.stdout.strip(), version())
+
+
+class HorarioTestCase(TestCase):
+    def setUp(self):
+        self.piscina = Pista(name='Piscina', date=date(2025, 1, 1), start_time=time(9, 30), end_time=time(21),
+                             price=4, category='Piscina', capacidad=6)
+
+    def momento(self, dia, hora):
+        return make_aware(datetime.combine(dia, time(hora)))
+
+    def test_plantilla_del_dia(self):
+        horario = Horario(self.piscina)
+        # de 9:30 solo se puede reservar desde las 10:00, y la última hora empieza a las 20:00
+        self.assertEqual(horario.plantilla(date(2025, 1, 1)), bytes([0] * 10 + [6] * 11 + [0] * 3))
+        self.assertIs(horario.plantilla(date(2025, 3, 1)), horario.base)
+        self.assertEqual(horario.plantilla(date(2024, 12, 31)), bytes(24))
+        self.piscina.end_time = time(0)
+        self.assertEqual(Horario(self.piscina).plazas(self.momento(date(2025, 1, 1), 23)), 6)
+        self.piscina.available = False
+        self.assertEqual(Horario(self.piscina).base, bytes(24))
+
+    def test_cierres(self):
+        dia = date(2025, 3, 1)
+        # de las 20:30 de un día a las 12:00 del siguiente
+        cierre = Cierre(inicio=make_aware(datetime.combine(dia, time(20, 30))),
+                        fin=self.momento(dia + timedelta(days=1), 12), motivo='mantenimiento')
+        horario = Horario(self.piscina, [cierre])
+        self.assertEqual(horario.plantilla(dia), bytes([0] * 10 + [6] * 10 + [0] * 4))
+        self.assertEqual(horario.plantilla(dia + timedelta(days=1)), bytes([0] * 12 + [6] * 9 + [0] * 3))
+        self.assertIs(horario.plantilla(dia + timedelta(days=2)), horario.base)
+
+    def test_motivo(self):
+        dia = date(2025, 3, 1)
+        cierre = Cierre(inicio=self.momento(dia, 12), fin=self.momento(dia, 14), motivo='mantenimiento')
+        horario = Horario(self.piscina, [cierre])
+        self.assertIsNone(horario.motivo(self.momento(dia, 20)))
+        self.assertEqual(horario.motivo(self.momento(dia, 21)), 'La pista abre de 09:30 a 21:00')
+        self.assertEqual(horario.motivo(self.momento(dia, 13)), 'La pista está cerrada: mantenimiento')
+        self.assertEqual(horario.motivo(self.momento(date(2024, 12, 31), 10)),
+                         'La pista no se puede reservar hasta el 01/01/2025')
+        self.piscina.available = False
+        self.assertEqual(Horario(self.piscina).motivo(self.momento(dia, 10)), 'La pista no está disponible')
+
+
+class ReservarPistaTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='12345678A', password='password123')
+        self.client.login(username='12345678A', password='password123')
+        self.dia = localdate() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pista.objects.create(name='Tenis', date=date(2025, 1, 1), start_time=time(9),
+                                 end_time=time(21), price=6, category='Tenis', capacidad=2)
+        self.addCleanup(cambiar_version)
+
+    def datos(self, hora):
+        inicio = datetime.combine(self.dia, time(hora))
+        return {'espacio': 'Tenis', 'momento_inicio': inicio.isoformat(),
+                'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+
+    def reservar(self, hora):
+        return self.client.post(reverse('crear_reserva'), data=json.dumps(self.datos(hora)),
+                                content_type='application/json').json()
+
+    def horas(self):
+        response = self.client.get(reverse('disponibilidad'), {'desde': self.dia.isoformat(), 'espacio': 'Tenis'})
+        return response.json()['espacios']['Tenis'][self.dia.isoformat()]
+
+    def test_reserva_con_el_precio_de_la_pista(self):
+        self.assertEqual(self.reservar(10)['precio'], 6)
+
+    def test_fuera_del_horario(self):
+        self.assertEqual(self.reservar(21)['error'], 'La pista abre de 09:00 a 21:00')
+
+    def test_cerrada_por_mantenimiento(self):
+        inicio = make_aware(datetime.combine(self.dia, time(12)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Cierre.objects.create(pista=pista('Tenis'), inicio=inicio, fin=inicio + timedelta(hours=1),
+                                  motivo='mantenimiento')
+        self.assertEqual(self.reservar(12)['error'], 'La pista está cerrada: mantenimiento')
+        self.assertIn('id', self.reservar(13))
+
+    def test_capacidad_de_la_franja(self):
+        self.assertEqual(self.horas(), '-' * 9 + '0' * 12 + '-' * 3)
+        self.assertIn('id', self.reservar(10))
+        self.assertEqual(self.horas()[10], '0')
+        self.assertIn('id', self.reservar(10))
+        self.assertEqual(self.horas()[10], '1')
+        self.assertEqual(self.reservar(10)['error'], 'No quedan plazas libres en ese momento')
+        self.assertEqual(sorted(Reserva.objects.values_list('plaza', flat=True)), [0, 1])
 
-# Create your tests here.
+    def test_capacidad_en_un_lote(self):
+        operaciones = [{'accion': 'crear', **self.datos(10)} for _ in range(3)]
+        response = self.client.post(reverse('lote_reservas'), data={'operaciones': operaciones},
+                                    content_type='application/json')
+        resultados = response.json()['resultados']
+        self.assertEqual(resultados[2], {'error': 'No quedan plazas libres en ese momento'})
+        self.assertEqual(sorted(Reserva.objects.values_list('plaza', flat=True)), [0, 1])
@@ -1,8 +1,78 @@
 from django.contrib import admin
-from .models import Reserva, LineaReserva, Fianza
+from django.http import StreamingHttpResponse
+from gestion_pistas.catalogo import pistas
+from .intercambio import exportar
+from .models import Reserva, ReservaArchivada, LineaReserva, Fianza, ReservaRecurrente
+from .paginacion import RecuentoEstimadoPaginator
 # Register your models here.
-class ReservaAdmin(admin.ModelAdmin):
-    readonly_fields=('created_at',)
+def exportar_accion(tipo, formato, content_type):
+    # acción que descarga las filas seleccionadas sin cargarlas todas en memoria
+    @admin.action(description=f'Exportar seleccionadas a {formato.upper()}')
+    def accion(modeladmin, request, queryset):
+        response = StreamingHttpResponse(exportar(tipo, formato, queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{tipo}.{formato}"'
+        return response
+    accion.__name__ = f'exportar_{formato}'
+    return accion
+class ListadoGrandeAdmin(admin.ModelAdmin):
+    # listados de tablas con cientos de miles de filas: sin el segundo COUNT(*) del total sin
+    # filtrar, con el recuento estimado y con los usuarios por id en lugar de un <select> con todos
+    paginator = RecuentoEstimadoPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    raw_id_fields = ('user_id',)
+    list_select_related = ('user_id',)
+    search_fields = ('^user_id__username',)
+    search_help_text = 'Principio del DNI del usuario'
+class EspacioFilter(admin.SimpleListFilter):
+    # las opciones salen del catálogo de pistas en memoria, sin el DISTINCT sobre las reservas
+    title = 'espacio'
+    parameter_name = 'espacio'
+    def lookups(self, request, model_admin):
+        return [(nombre, nombre) for nombre in pistas()]
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(espacio=self.value())
+        return queryset
+class ReservaAdmin(ListadoGrandeAdmin):
+    readonly_fields=('created_at', 'updated_at')
+    raw_id_fields = ('user_id', 'recurrencia')
+    # columnas sueltas en lugar de __str__; el espacio va por el índice de la franja y la
+    # fecha por el de momento_inicio. Sin date_hierarchy, que saca las fechas distintas
+    # recorriendo toda la tabla en cada carga del listado
+    list_display = ('id', 'nombre_espacio', 'plaza', 'momento_inicio', 'momento_fin', 'user_id')
+    list_filter = (EspacioFilter, 'momento_inicio')
+    ordering = ('-momento_inicio',)
+    actions = [exportar_accion('reservas', 'csv', 'text/csv'),
+               exportar_accion('reservas', 'jsonl', 'application/jsonl')]
+    @admin.display(description='espacio', ordering='espacio')
+    def nombre_espacio(self, obj):
+        # el nombre ya está en la columna: sin cargar la pista de cada fila
+        return obj.espacio_id
 admin.site.register(Reserva, ReservaAdmin)
-admin.site.register(LineaReserva)
-admin.site.register(Fianza)
+class ReservaArchivadaAdmin(ListadoGrandeAdmin):
+    # solo consulta: las reservas llegan aquí con el comando archivar_reservas
+    list_display = ('id', 'espacio', 'momento_inicio', 'momento_fin', 'user_id')
+    list_filter = (EspacioFilter, 'momento_inicio')
+    ordering = ('-momento_inicio',)
+    def has_add_permission(self, request):
+        return False
+    def has_change_permission(self, request, obj=None):
+        return False
+admin.site.register(ReservaArchivada, ReservaArchivadaAdmin)
+class LineaReservaAdmin(admin.ModelAdmin):
+    paginator = RecuentoEstimadoPaginator
+    show_full_result_count = False
+    raw_id_fields = ('reserva',)
+    list_select_related = ('reserva',)
+admin.site.register(LineaReserva, LineaReservaAdmin)
+class FianzaAdmin(ListadoGrandeAdmin):
+    list_display = ('id', 'user_id', 'cantidad', 'reservas')
+    actions = [exportar_accion('fianzas', 'csv', 'text/csv'),
+               exportar_accion('fianzas', 'jsonl', 'application/jsonl')]
+admin.site.register(Fianza, FianzaAdmin)
+class ReservaRecurrenteAdmin(admin.ModelAdmin):
+    readonly_fields=('created_at',)
+    list_display = ('__str__', 'user_id', 'fecha_inicio', 'fecha_fin')
+    list_select_related = ('user_id',)
+admin.site.register(ReservaRecurrente, ReservaRecurrenteAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class GestionReservasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_reservas'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .metricas import instalar_contador
+        connection_created.connect(instalar_contador, dispatch_uid='metricas_contador')
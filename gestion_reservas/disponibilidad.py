@@ -0,0 +1,128 @@
+from datetime import datetime, time, timedelta
+from urllib.parse import quote
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.timezone import localtime, make_aware
+
+from gestion_pistas.catalogo import horarios, version
+
+from .models import Reserva
+from .recurrencias import reglas_en_rango
+
+HORAS_DIA = 24
+# quedan plazas, no quedan, la pista no abre a esa hora
+LIBRE = '0'
+OCUPADA = '1'
+CERRADA = '-'
+
+CACHE = 'disponibilidad'
+CLAVE_ACIERTOS = 'disponibilidad:aciertos'
+CLAVE_FALLOS = 'disponibilidad:fallos'
+
+
+def dias_entre(desde, hasta):
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+
+def estado(plazas, ocupadas):
+    if not plazas:
+        return CERRADA
+    return LIBRE if ocupadas < plazas else OCUPADA
+
+
+def calcular_ocupacion(espacios, dias):
+    # una sola consulta por rango sobre el índice (espacio, momento_inicio); cuenta las reservas
+    # de cada hora y las compara con la plantilla del día de la pista.
+    # Devuelve {(espacio, dia): '--00100...'} con un carácter por hora del día
+    rejilla = {(espacio, dia): [0] * HORAS_DIA for espacio in espacios for dia in dias}
+    if not rejilla:
+        return {}
+    inicio = make_aware(datetime.combine(min(dias), time.min))
+    fin = make_aware(datetime.combine(max(dias) + timedelta(days=1), time.min))
+    reservas = Reserva.objects.filter(
+        espacio__in=espacios, momento_inicio__gte=inicio, momento_inicio__lt=fin
+    ).values_list('espacio', 'momento_inicio', 'recurrencia_id')
+    materializadas = set()
+    for espacio, momento_inicio, recurrencia_id in reservas:
+        momento_inicio = localtime(momento_inicio)
+        horas = rejilla.get((espacio, momento_inicio.date()))
+        if horas is not None:
+            horas[momento_inicio.hour] += 1
+        if recurrencia_id:
+            materializadas.add((recurrencia_id, momento_inicio.date()))
+    # las reservas recurrentes se expanden aquí, sin guardar cada ocurrencia
+    for regla in reglas_en_rango(espacios, min(dias), max(dias)):
+        for dia in regla.dias(min(dias), max(dias)):
+            horas = rejilla.get((regla.espacio_id, dia))
+            if horas is not None and (regla.pk, dia) not in materializadas:
+                horas[regla.hora_inicio.hour] += 1
+    plantillas = horarios()
+    return {
+        (espacio, dia): ''.join(map(estado, plantillas[espacio].plantilla(dia), horas))
+        for (espacio, dia), horas in rejilla.items()
+    }
+
+
+def clave_cache(catalogo, espacio, dia):
+    # con la versión del catálogo: un cambio de horario, cierre o capacidad no se sirve de la
+    # caché. quote() porque Memcached no admite claves con caracteres no ASCII ('Fútbol')
+    return f'disponibilidad:{catalogo}:{quote(espacio)}:{dia.isoformat()}'
+
+
+def obtener_ocupacion(espacios, dias):
+    # igual que calcular_ocupacion pero sirviendo desde la caché los (espacio, dia)
+    # ya calculados; los que faltan se calculan juntos con una sola consulta
+    cache = caches[CACHE]
+    catalogo = version()
+    claves = {clave_cache(catalogo, espacio, dia): (espacio, dia) for espacio in espacios for dia in dias}
+    encontradas = cache.get_many(claves)
+    ocupacion = {claves[clave]: horas for clave, horas in encontradas.items()}
+    faltan = [franja for clave, franja in claves.items() if clave not in encontradas]
+    if faltan:
+        calculadas = calcular_ocupacion(
+            sorted({espacio for espacio, _ in faltan}), sorted({dia for _, dia in faltan})
+        )
+        nuevas = {franja: calculadas[franja] for franja in faltan}
+        cache.set_many({clave_cache(catalogo, *franja): horas for franja, horas in nuevas.items()})
+        ocupacion.update(nuevas)
+    _contar(cache, CLAVE_ACIERTOS, len(encontradas))
+    _contar(cache, CLAVE_FALLOS, len(faltan))
+    return ocupacion
+
+
+def invalidar_ocupacion(*franjas):
+    # franjas: pares (espacio, momento_inicio). Se borra ya, para que este proceso no lea
+    # datos viejos, y otra vez tras el commit, por si otra petición volvió a cachear la
+    # ocupación anterior mientras la transacción seguía abierta
+    if not franjas:
+        return
+    catalogo = version()
+    claves = {clave_cache(catalogo, espacio, localtime(momento_inicio).date()) for espacio, momento_inicio in franjas}
+    cache = caches[CACHE]
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def estadisticas_cache():
+    cache = caches[CACHE]
+    contadores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = contadores.get(CLAVE_ACIERTOS, 0)
+    fallos = contadores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        "aciertos": aciertos,
+        "fallos": fallos,
+        "ratio_aciertos": round(aciertos / total, 4) if total else None,
+    }
+
+
+def _contar(cache, clave, cantidad):
+    if not cantidad:
+        return
+    # los contadores viven en el propio backend para sumarse entre workers si es compartido
+    try:
+        cache.incr(clave, cantidad)
+    except ValueError:
+        if not cache.add(clave, cantidad, timeout=None):
+            cache.incr(clave, cantidad)
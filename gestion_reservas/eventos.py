@@ -0,0 +1,136 @@
+import asyncio
+import json
+import threading
+from itertools import count
+
+from django.db import transaction
+from django.utils.timezone import localtime
+
+from gestion_pistas.catalogo import horario
+
+from .plazas import Ocupacion
+
+# la franja se ha completado o vuelve a tener plazas libres (como '1' y '0' en la disponibilidad)
+OCUPADA = 'ocupada'
+LIBRE = 'libre'
+# cuando una cola se llena se avisa al cliente para que vuelva a pedir la disponibilidad
+REINICIO = 'reinicio'
+
+# eventos pendientes por cliente antes de considerar que no da abasto
+TAMANO_COLA = 100
+
+
+class Suscripcion:
+    def __init__(self, franjas, loop):
+        self.franjas = franjas
+        self.loop = loop
+        self.cola = asyncio.Queue(TAMANO_COLA)
+        self.desbordada = False
+
+    def entregar(self, evento):
+        # se ejecuta en el bucle de eventos del cliente
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.desbordada = True
+
+    async def siguiente(self, espera):
+        # devuelve el siguiente evento, REINICIO si se han perdido eventos, o None si en
+        # `espera` segundos no ha llegado nada
+        if self.desbordada and self.cola.empty():
+            return {"tipo": REINICIO}
+        try:
+            return await asyncio.wait_for(self.cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Difusor:
+    """Reparte los cambios de ocupación entre los clientes suscritos a cada (espacio, dia).
+
+    Vive en memoria del proceso: cada cliente conectado cuesta una cola y una corrutina.
+    """
+
+    def __init__(self):
+        self._suscripciones = {}
+        self._lock = threading.Lock()
+        self._ids = count(1)
+
+    def suscribir(self, franjas):
+        suscripcion = Suscripcion(set(franjas), asyncio.get_running_loop())
+        with self._lock:
+            for franja in suscripcion.franjas:
+                self._suscripciones.setdefault(franja, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            for franja in suscripcion.franjas:
+                suscritas = self._suscripciones.get(franja)
+                if suscritas is not None:
+                    suscritas.discard(suscripcion)
+                    if not suscritas:
+                        del self._suscripciones[franja]
+
+    def publicar(self, espacio, dia, evento):
+        # puede llamarse desde cualquier hilo (las vistas síncronas corren en un hilo aparte)
+        evento = dict(evento, id=next(self._ids))
+        with self._lock:
+            suscritas = list(self._suscripciones.get((espacio, dia), ()))
+        for suscripcion in suscritas:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # el bucle del cliente ya se ha cerrado
+                self.cancelar(suscripcion)
+
+    def escuchando(self, espacio, dia):
+        with self._lock:
+            return bool(self._suscripciones.get((espacio, dia)))
+
+    def clientes(self):
+        with self._lock:
+            return len({s for suscritas in self._suscripciones.values() for s in suscritas})
+
+
+difusor = Difusor()
+
+
+def notificar_cambios(liberadas=(), ocupadas=()):
+    # franjas (espacio, momento_inicio) que pierden y que ganan una reserva; las que aparecen en
+    # ambas no cambian. Se publica tras el commit para no anunciar cambios que luego se deshacen
+    franjas = set(liberadas) ^ set(ocupadas)
+    if franjas:
+        transaction.on_commit(lambda: publicar_ocupacion(franjas))
+
+
+def publicar_ocupacion(franjas):
+    # con capacidad > 1 una reserva no llena la franja: se cuentan las plazas que quedan y se
+    # publica OCUPADA si no queda ninguna y LIBRE si no, con las libres. Solo se consultan las
+    # franjas que algún cliente está escuchando
+    franjas = [(espacio, localtime(momento_inicio)) for espacio, momento_inicio in franjas
+               if difusor.escuchando(espacio, localtime(momento_inicio).date())]
+    if not franjas:
+        return
+    ocupacion = Ocupacion.leer(franjas)
+    for espacio, momento_inicio in franjas:
+        plantilla = horario(espacio)
+        plazas = plantilla.plazas(momento_inicio) if plantilla else 0
+        libres = max(plazas - ocupacion.ocupadas((espacio, momento_inicio)), 0)
+        dia = momento_inicio.date()
+        difusor.publicar(espacio, dia, {
+            "tipo": LIBRE if libres else OCUPADA, "espacio": espacio, "dia": dia.isoformat(),
+            "hora": momento_inicio.hour, "libres": libres,
+        })
+
+
+def formatear(evento):
+    # formato text/event-stream
+    datos = {clave: valor for clave, valor in evento.items() if clave not in ('tipo', 'id')}
+    lineas = [f"event: {evento['tipo']}"]
+    if 'id' in evento:
+        lineas.append(f"id: {evento['id']}")
+    lineas.append(f"data: {json.dumps(datos, ensure_ascii=False)}")
+    return '\n'.join(lineas) + '\n\n'
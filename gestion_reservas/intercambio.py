@@ -0,0 +1,208 @@
+import csv
+import json
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import is_naive, localtime, make_aware
+
+from gestion_pistas.catalogo import pistas
+
+from .disponibilidad import invalidar_ocupacion
+from .eventos import notificar_cambios
+from .models import Fianza, Reserva
+from .plazas import Ocupacion
+from .services import contadores_reales, franja_completa, usuarios_por_cantidad
+
+User = get_user_model()
+
+# importación y exportación masiva de reservas y fianzas (CSV o JSON Lines) leyendo y
+# escribiendo por lotes, para que la memoria no dependa del tamaño del fichero
+
+FORMATOS = ('csv', 'jsonl')
+CAMPOS = {
+    'reservas': ['usuario', 'espacio', 'momento_inicio', 'momento_fin'],
+    'fianzas': ['usuario', 'cantidad'],
+}
+TAMANO_LOTE = 1000
+# errores que se guardan para mostrar; del resto solo se cuentan
+MAX_ERRORES = 100
+
+
+def lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def filas_reservas(queryset, chunk_size):
+    filas = queryset.order_by('id').values_list(
+        'user_id__username', 'espacio', 'momento_inicio', 'momento_fin'
+    ).iterator(chunk_size=chunk_size)
+    for usuario, espacio, inicio, fin in filas:
+        yield {'usuario': usuario, 'espacio': espacio,
+               'momento_inicio': localtime(inicio).isoformat(), 'momento_fin': localtime(fin).isoformat()}
+
+
+def filas_fianzas(queryset, chunk_size):
+    filas = queryset.order_by('id').values_list('user_id__username', 'cantidad').iterator(chunk_size=chunk_size)
+    for usuario, cantidad in filas:
+        yield {'usuario': usuario, 'cantidad': cantidad}
+
+
+EXPORTADORES = {
+    'reservas': (Reserva, filas_reservas),
+    'fianzas': (Fianza, filas_fianzas),
+}
+
+
+class _Eco:
+    # csv.writer escribe en un "fichero" que devuelve la línea en lugar de guardarla
+    def write(self, valor):
+        return valor
+
+
+def exportar(tipo, formato, queryset=None, chunk_size=TAMANO_LOTE):
+    # generador de trozos de texto, cada uno con chunk_size filas
+    modelo, filas = EXPORTADORES[tipo]
+    filas = filas(modelo.objects.all() if queryset is None else queryset, chunk_size)
+    if formato == 'csv':
+        writer = csv.DictWriter(_Eco(), fieldnames=CAMPOS[tipo])
+        lineas = chain([writer.writeheader()], map(writer.writerow, filas))
+    else:
+        lineas = (json.dumps(fila, ensure_ascii=False) + '\n' for fila in filas)
+    for lote in lotes(lineas, chunk_size):
+        yield ''.join(lote)
+
+
+def leer(fichero, formato):
+    # devuelve (número de línea, fila), o la excepción en lugar de la fila si no se puede leer
+    if formato == 'csv':
+        lector = csv.DictReader(fichero)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+    for numero, linea in enumerate(fichero, 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            yield numero, ValueError(f'JSON no válido: {e}')
+            continue
+        # [1, 2] o "x" son JSON válido, pero no una fila
+        yield numero, fila if isinstance(fila, dict) else ValueError('Cada línea tiene que ser un objeto JSON')
+
+
+def leer_momento(valor):
+    momento = datetime.fromisoformat(valor)
+    return make_aware(momento) if is_naive(momento) else momento
+
+
+def importar(tipo, filas, tamano_lote=TAMANO_LOTE):
+    # filas: (número de línea, fila) como las devuelve leer(); cada lote va en su transacción
+    resultado = {'importadas': 0, 'actualizadas': 0, 'descartadas': 0, 'errores': []}
+    importador = IMPORTADORES[tipo]
+    for lote in lotes(filas, tamano_lote):
+        with transaction.atomic():
+            importador(lote, resultado)
+    return resultado
+
+
+def _anotar_error(resultado, numero, error):
+    resultado['descartadas'] += 1
+    if len(resultado['errores']) < MAX_ERRORES:
+        resultado['errores'].append((numero, str(error)))
+
+
+def _usuarios(lote):
+    nombres = {fila.get('usuario') for _, fila in lote if isinstance(fila, dict)}
+    return dict(User.objects.filter(username__in=nombres).values_list('username', 'id'))
+
+
+def _importar_reservas(lote, resultado):
+    usuarios = _usuarios(lote)
+    candidatas = []
+    for numero, fila in lote:
+        try:
+            if isinstance(fila, Exception):
+                raise fila
+            if fila.get('usuario') not in usuarios:
+                raise ValueError(f"El usuario {fila.get('usuario')} no existe")
+            # cualquier pista del catálogo, aunque ya no esté disponible (p. ej. el historial)
+            if fila.get('espacio') not in pistas():
+                raise ValueError('Espacio no válido')
+            inicio, fin = leer_momento(fila['momento_inicio']), leer_momento(fila['momento_fin'])
+            if fin - inicio != timedelta(hours=1):
+                raise ValueError('La reserva debe durar una hora')
+            if inicio.minute or inicio.second:
+                raise ValueError('La reserva tiene que empezar y terminar en punto')
+        except (KeyError, TypeError, ValueError) as e:
+            _anotar_error(resultado, numero, e)
+            continue
+        candidatas.append((numero, Reserva(user_id_id=usuarios[fila['usuario']], espacio_id=fila['espacio'],
+                                           momento_inicio=inicio, momento_fin=fin)))
+    if not candidatas:
+        return
+
+    # plazas libres según la capacidad de la pista, sin mirar su horario (puede ser el
+    # historial), con una consulta de reservas y otra de reglas recurrentes por lote
+    ocupacion = Ocupacion.leer([(reserva.espacio_id, reserva.momento_inicio) for _, reserva in candidatas])
+    nuevas = []
+    for numero, reserva in candidatas:
+        franja = (reserva.espacio_id, reserva.momento_inicio)
+        capacidad = pistas()[reserva.espacio_id].capacidad
+        reserva.plaza = ocupacion.plaza_libre(franja, capacidad)
+        if reserva.plaza is None:
+            _anotar_error(resultado, numero, franja_completa(capacidad))
+            continue
+        ocupacion.ocupar(franja, reserva.plaza)
+        nuevas.append(reserva)
+    Reserva.objects.bulk_create(nuevas)
+    # el contador de reservas de cada usuario sí se mantiene (la cantidad no)
+    for cantidad, usuarios in usuarios_por_cantidad(reserva.user_id_id for reserva in nuevas).items():
+        Fianza.objects.filter(user_id__in=usuarios).update(reservas=F('reservas') + cantidad)
+    # bulk_create no envía señales
+    franjas = [(reserva.espacio_id, reserva.momento_inicio) for reserva in nuevas]
+    invalidar_ocupacion(*franjas)
+    notificar_cambios(ocupadas=franjas)
+    resultado['importadas'] += len(nuevas)
+
+
+def _importar_fianzas(lote, resultado):
+    # la cantidad del fichero sustituye a la de la fianza del usuario, o la crea si no tiene
+    usuarios = _usuarios(lote)
+    existentes = {fianza.user_id_id: fianza for fianza in Fianza.objects.filter(user_id__in=usuarios.values())}
+    actualizadas, nuevas = {}, {}
+    for numero, fila in lote:
+        try:
+            if isinstance(fila, Exception):
+                raise fila
+            if fila.get('usuario') not in usuarios:
+                raise ValueError(f"El usuario {fila.get('usuario')} no existe")
+            cantidad = int(fila['cantidad'])
+        except (KeyError, TypeError, ValueError) as e:
+            _anotar_error(resultado, numero, e)
+            continue
+        user_id = usuarios[fila['usuario']]
+        if user_id in existentes:
+            existentes[user_id].cantidad = cantidad
+            actualizadas[user_id] = existentes[user_id]
+        else:
+            nuevas[user_id] = Fianza(user_id_id=user_id, cantidad=cantidad)
+    Fianza.objects.bulk_update(actualizadas.values(), ['cantidad'])
+    Fianza.objects.bulk_create(nuevas.values())
+    # las fianzas nuevas empiezan con el contador de las reservas que el usuario ya tuviera
+    # (p. ej. importadas antes que las fianzas), como en cobrar_reserva
+    if nuevas:
+        Fianza.objects.filter(user_id__in=nuevas).update(reservas=contadores_reales())
+    resultado['actualizadas'] += len(actualizadas)
+    resultado['importadas'] += len(nuevas)
+
+
+IMPORTADORES = {
+    'reservas': _importar_reservas,
+    'fianzas': _importar_fianzas,
+}
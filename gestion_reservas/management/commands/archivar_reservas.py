@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.retencion import TAMANO_LOTE, archivar, purgar_archivo
+
+
+class Command(BaseCommand):
+    help = ('Pasa al archivo las reservas ya terminadas, devolviendo su parte de la fianza, para que '
+            'la tabla de reservas solo tenga las vigentes y futuras')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=0,
+                            help='Dejar sin archivar las reservas que terminaron en los últimos días')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Reservas por transacción')
+        parser.add_argument('--purgar', type=int, metavar='DIAS',
+                            help='Borrar además del archivo las reservas de hace más de DIAS días')
+
+    def handle(self, *args, **options):
+        archivadas = archivar(options['dias'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{archivadas} reservas archivadas'))
+        if options['purgar'] is not None:
+            borradas = purgar_archivo(options['purgar'])
+            self.stdout.write(self.style.SUCCESS(f'{borradas} reservas borradas del archivo'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.intercambio import FORMATOS, TAMANO_LOTE, exportar
+
+
+class Command(BaseCommand):
+    help = 'Exporta todas las reservas (o las fianzas) a CSV o JSON Lines, leyendo la base de datos por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fianzas', action='store_true', help='Exportar las fianzas en lugar de las reservas')
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('-o', '--salida', help='Fichero de salida (por defecto, la salida estándar)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas leídas y escritas de cada vez')
+
+    def handle(self, *args, **options):
+        tipo = 'fianzas' if options['fianzas'] else 'reservas'
+        trozos = exportar(tipo, options['formato'], chunk_size=options['lote'])
+        if not options['salida']:
+            for trozo in trozos:
+                self.stdout.write(trozo, ending='')
+            return
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as fichero:
+            for trozo in trozos:
+                fichero.write(trozo)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.intercambio import FORMATOS, MAX_ERRORES, TAMANO_LOTE, importar, leer
+
+
+class Command(BaseCommand):
+    help = ('Importa reservas (o fianzas) desde CSV o JSON Lines por lotes, descartando las filas no '
+            'válidas y las que chocan con una franja ya ocupada. Se actualiza el número de reservas de '
+            'cada usuario, pero no la cantidad de su fianza: las fianzas se importan aparte con --fianzas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero')
+        parser.add_argument('--fianzas', action='store_true', help='Importar fianzas en lugar de reservas')
+        parser.add_argument('--formato', choices=FORMATOS,
+                            help='Por defecto, según la extensión del fichero (.jsonl o .csv)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por transacción')
+
+    def handle(self, *args, **options):
+        tipo = 'fianzas' if options['fianzas'] else 'reservas'
+        formato = options['formato'] or ('jsonl' if options['fichero'].endswith('.jsonl') else 'csv')
+        with open(options['fichero'], encoding='utf-8', newline='') as fichero:
+            resultado = importar(tipo, leer(fichero, formato), options['lote'])
+
+        for numero, error in resultado['errores']:
+            self.stderr.write(f'Línea {numero}: {error}')
+        if resultado['descartadas'] > MAX_ERRORES:
+            self.stderr.write(f'... y {resultado["descartadas"] - MAX_ERRORES} errores más')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado["importadas"]} {tipo} importadas, {resultado["actualizadas"]} actualizadas, '
+            f'{resultado["descartadas"]} descartadas'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.recurrencias import VENTANA_MATERIALIZACION, materializar
+
+
+class Command(BaseCommand):
+    help = 'Guarda como reservas las ocurrencias de las reservas recurrentes de los próximos días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=VENTANA_MATERIALIZACION,
+                            help='Tamaño de la ventana a materializar, en días')
+
+    def handle(self, *args, **options):
+        creadas = materializar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{creadas} ocurrencias materializadas'))
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.metricas import INTERVALO_VOLCADO, resumen_metricas
+
+
+class Command(BaseCommand):
+    help = ('Muestra por vista las consultas, el tiempo en la base de datos y la latencia de las '
+            f'peticiones atendidas (los workers vuelcan sus datos cada {INTERVALO_VOLCADO} s)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Salida en JSON, con los histogramas')
+        parser.add_argument('--vista', help='Mostrar solo las vistas que contengan este texto')
+
+    def handle(self, *args, **options):
+        resumen = resumen_metricas()
+        if options['vista']:
+            resumen = {vista: datos for vista, datos in resumen.items() if options['vista'] in vista}
+        if options['json']:
+            self.stdout.write(json.dumps(resumen, indent=2))
+            return
+        if not resumen:
+            self.stdout.write('Todavía no hay peticiones registradas')
+            return
+
+        ancho = max(len(vista) for vista in resumen)
+        self.stdout.write(f'{"vista":<{ancho}}  {"peticiones":>10}  {"consultas media/p95/máx":>24}  '
+                          f'{"BD ms media/p95":>16}  {"latencia ms media/p95/p99":>26}')
+        for vista, datos in resumen.items():
+            consultas, bd, latencia = datos['consultas'], datos['tiempo_bd_ms'], datos['latencia_ms']
+            self.stdout.write(
+                f'{vista:<{ancho}}  {datos["peticiones"]:>10}  '
+                f'{consultas["media"]:>10.1f} / {consultas["p95"]:>4} / {consultas["max"]:>4}  '
+                f'{bd["media"]:>8.1f} / {bd["p95"]:>5}  '
+                f'{latencia["media"]:>10.1f} / {latencia["p95"]:>5} / {latencia["p99"]:>5}'
+            )
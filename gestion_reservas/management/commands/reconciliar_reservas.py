@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from gestion_reservas.services import contadores_descuadrados, reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = ('Compara el número de reservas guardado en cada fianza con las reservas sueltas del usuario '
+            'y, con --corregir, lo recalcula')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help='Guardar el número real en los que no cuadran')
+
+    def handle(self, *args, **options):
+        descuadrados = contadores_descuadrados().values_list('user_id__username', 'reservas', 'real')
+        total = 0
+        for username, reservas, real in descuadrados.iterator():
+            self.stdout.write(f'{username}: {reservas} en la fianza, {real} reales')
+            total += 1
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Todos los contadores cuadran'))
+        elif options['corregir']:
+            corregidos = reconciliar_contadores()
+            self.stdout.write(self.style.SUCCESS(f'{corregidos} contadores corregidos'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{total} contadores descuadrados; usa --corregir para recalcularlos'))
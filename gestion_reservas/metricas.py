@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE = 'metricas'
+CLAVE_PROCESOS = 'metricas:procesos'
+# segundos entre volcados de las métricas de cada proceso a la caché compartida
+INTERVALO_VOLCADO = 30
+
+# límites superiores de las cubetas; la última cubeta recoge lo que supera el último
+LIMITES_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100)
+
+# consultas de la petición en curso; sync_to_async copia el contexto, así que las
+# consultas que una vista async hace en otro hilo se suman a su petición
+_captura = ContextVar('captura_metricas', default=None)
+
+
+class Histograma:
+    def __init__(self, limites, cubetas=None, suma=0, maximo=0):
+        self.limites = tuple(limites)
+        self.cubetas = list(cubetas) if cubetas else [0] * (len(self.limites) + 1)
+        self.suma = suma
+        self.maximo = maximo
+
+    @property
+    def total(self):
+        return sum(self.cubetas)
+
+    def anotar(self, valor):
+        indice = next((i for i, limite in enumerate(self.limites) if valor <= limite), len(self.limites))
+        self.cubetas[indice] += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def sumar(self, otro):
+        self.cubetas = [a + b for a, b in zip(self.cubetas, otro.cubetas)]
+        self.suma += otro.suma
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def percentil(self, p):
+        # límite superior de la cubeta en la que cae el percentil (el máximo si es la última)
+        if not self.total:
+            return None
+        objetivo = p / 100 * self.total
+        acumulado = 0
+        for indice, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                return min(self.limites[indice], round(self.maximo, 2)) if indice < len(self.limites) else round(self.maximo, 2)
+
+    def como_dict(self):
+        return {"limites": list(self.limites), "cubetas": self.cubetas, "suma": self.suma, "maximo": self.maximo}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos["limites"], datos["cubetas"], datos["suma"], datos["maximo"])
+
+    def resumen(self):
+        total = self.total
+        return {
+            "media": round(self.suma / total, 2) if total else None,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+            "max": round(self.maximo, 2),
+        }
+
+
+def histogramas_vacios():
+    return {
+        "consultas": Histograma(LIMITES_CONSULTAS),
+        "tiempo_bd_ms": Histograma(LIMITES_MS),
+        "latencia_ms": Histograma(LIMITES_MS),
+    }
+
+
+class Metricas:
+    """Histogramas por vista de las peticiones atendidas por este proceso.
+
+    Se guardan en memoria y cada INTERVALO_VOLCADO segundos se copian a la caché 'metricas',
+    de donde las leen el endpoint y el comando metricas_vistas sumando todos los procesos.
+    """
+
+    def __init__(self):
+        self._vistas = {}
+        self._lock = threading.Lock()
+        self._ultimo_volcado = time.monotonic()
+
+    def anotar(self, vista, consultas, tiempo_bd_ms, latencia_ms):
+        with self._lock:
+            histogramas = self._vistas.get(vista)
+            if histogramas is None:
+                histogramas = self._vistas[vista] = histogramas_vacios()
+            histogramas["consultas"].anotar(consultas)
+            histogramas["tiempo_bd_ms"].anotar(tiempo_bd_ms)
+            histogramas["latencia_ms"].anotar(latencia_ms)
+            volcar = time.monotonic() - self._ultimo_volcado >= INTERVALO_VOLCADO
+            if volcar:
+                self._ultimo_volcado = time.monotonic()
+        if volcar:
+            self.volcar()
+
+    def como_dict(self):
+        with self._lock:
+            return {
+                vista: {nombre: histograma.como_dict() for nombre, histograma in histogramas.items()}
+                for vista, histogramas in self._vistas.items()
+            }
+
+    def volcar(self):
+        # cada proceso escribe solo su propia clave, así no se pisan entre ellos
+        try:
+            cache = caches[CACHE]
+            cache.set(clave_proceso(os.getpid()), self.como_dict())
+            procesos = set(cache.get(CLAVE_PROCESOS, ()))
+            if os.getpid() not in procesos:
+                cache.set(CLAVE_PROCESOS, sorted(procesos | {os.getpid()}))
+        except Exception:
+            logger.exception('No se han podido volcar las métricas')
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas = {}
+
+
+metricas = Metricas()
+
+
+def clave_proceso(pid):
+    return f'metricas:proceso:{pid}'
+
+
+def leer_metricas():
+    # suma lo volcado por todos los procesos, con los datos al día de este
+    cache = caches[CACHE]
+    pids = cache.get(CLAVE_PROCESOS, ())
+    volcados = cache.get_many([clave_proceso(pid) for pid in pids if pid != os.getpid()])
+    vistas = {}
+    for datos in [*volcados.values(), metricas.como_dict()]:
+        for vista, histogramas in datos.items():
+            acumulados = vistas.setdefault(vista, histogramas_vacios())
+            for nombre, histograma in histogramas.items():
+                acumulados[nombre].sumar(Histograma.desde_dict(histograma))
+    return vistas
+
+
+def resumen_metricas():
+    return {
+        vista: {
+            "peticiones": histogramas["latencia_ms"].total,
+            **{nombre: {**histograma.resumen(), "histograma": histograma.como_dict()}
+               for nombre, histograma in histogramas.items()},
+        }
+        for vista, histogramas in sorted(leer_metricas().items())
+    }
+
+
+class Captura:
+    def __init__(self, guardar_sql):
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.sql = [] if guardar_sql else None
+
+
+def contar_consultas(execute, sql, params, many, context):
+    # execute_wrapper instalado en todas las conexiones; fuera de una petición medida no hace nada
+    captura = _captura.get()
+    if captura is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        captura.consultas += 1
+        captura.tiempo_bd += duracion
+        if captura.sql is not None:
+            captura.sql.append((sql, duracion))
+
+
+def instalar_contador(sender, connection, **kwargs):
+    # receptor de connection_created; una conexión que se reabre conserva sus wrappers
+    if contar_consultas not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_consultas)
+
+
+def umbral_lento():
+    return getattr(settings, 'METRICAS_UMBRAL_LENTO_MS', None)
+
+
+def iniciar_captura():
+    captura = Captura(guardar_sql=umbral_lento() is not None)
+    return captura, _captura.set(captura)
+
+
+def terminar_captura(request, captura, token, inicio):
+    _captura.reset(token)
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # 404 y ficheros estáticos no cuentan
+        return
+    tiempo_bd_ms = captura.tiempo_bd * 1000
+    metricas.anotar(match.view_name, captura.consultas, tiempo_bd_ms, latencia_ms)
+    umbral = umbral_lento()
+    if umbral is not None and latencia_ms >= umbral:
+        consultas = '\n'.join(f'  {duracion * 1000:.1f} ms  {sql}' for sql, duracion in captura.sql)
+        logger.warning('Petición lenta %s %s (%s): %.1f ms, %s consultas en %.1f ms\n%s',
+                       request.method, request.path, match.view_name, latencia_ms,
+                       captura.consultas, tiempo_bd_ms, consultas)
@@ -0,0 +1,38 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metricas import iniciar_captura, terminar_captura
+
+
+class MetricasMiddleware:
+    """Cuenta las consultas, el tiempo en la base de datos y la latencia de cada vista.
+
+    No depende de DEBUG: las consultas se miden con un execute_wrapper (ver metricas.py).
+    Conviene ponerlo el primero para que la latencia incluya el resto de middlewares.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        captura, token = iniciar_captura()
+        try:
+            return self.get_response(request)
+        finally:
+            terminar_captura(request, captura, token, inicio)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        captura, token = iniciar_captura()
+        try:
+            return await self.get_response(request)
+        finally:
+            terminar_captura(request, captura, token, inicio)
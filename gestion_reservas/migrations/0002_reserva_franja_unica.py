@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+
+def resolver_reservas_duplicadas(apps, schema_editor):
+    # antes del índice único pudieron colarse dobles reservas de una misma franja:
+    # se conserva la más antigua y se devuelven los 2 euros de fianza de las demás, sin bajar de
+    # 0 (como services.eliminar_reserva): las reservas antiguas no siempre cobraron fianza
+    Reserva = apps.get_model('gestion_reservas', 'Reserva')
+    Fianza = apps.get_model('gestion_reservas', 'Fianza')
+    duplicadas = (
+        Reserva.objects.values('espacio', 'momento_inicio')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for franja in duplicadas:
+        sobrantes = Reserva.objects.filter(
+            espacio=franja['espacio'], momento_inicio=franja['momento_inicio']
+        ).order_by('created_at', 'id')[1:]
+        for reserva in sobrantes:
+            Fianza.objects.filter(user_id=reserva.user_id_id).update(cantidad=Greatest(F('cantidad') - 2, 0))
+            reserva.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(resolver_reservas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(fields=('espacio', 'momento_inicio'), name='reserva_franja_unica'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0002_reserva_franja_unica'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaRecurrente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('espacio', models.CharField(choices=[('Baloncesto', 'Baloncesto'), ('Fútbol', 'Fútbol'), ('Padel', 'Padel'), ('Piscina1', 'Piscina1'), ('Piscina2', 'Piscina2')], default='Padel', max_length=20)),
+                ('hora_inicio', models.TimeField()),
+                ('frecuencia', models.CharField(choices=[('diaria', 'Diaria'), ('semanal', 'Semanal')], default='semanal', max_length=10)),
+                ('intervalo', models.PositiveSmallIntegerField(default=1)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('excepciones', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_recurrentes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'reserva recurrente',
+                'verbose_name_plural': 'reservas recurrentes',
+                'db_table': 'reservas_recurrentes',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='recurrencia',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='gestion_reservas.reservarecurrente'),
+        ),
+        migrations.AddIndex(
+            model_name='reservarecurrente',
+            index=models.Index(fields=['espacio', 'hora_inicio', 'fecha_inicio'], name='recurrente_franja_idx'),
+        ),
+    ]
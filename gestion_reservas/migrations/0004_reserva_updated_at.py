@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copiar_created_at(apps, schema_editor):
+    Reserva = apps.get_model('gestion_reservas', 'Reserva')
+    Reserva.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0003_reservarecurrente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_created_at, migrations.RunPython.noop),
+    ]
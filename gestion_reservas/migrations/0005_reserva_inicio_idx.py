@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0004_reserva_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['momento_inicio'], name='reserva_inicio_idx'),
+        ),
+    ]
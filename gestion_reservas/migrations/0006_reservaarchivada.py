@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0005_reserva_inicio_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('espacio', models.CharField(choices=[('Baloncesto', 'Baloncesto'), ('Fútbol', 'Fútbol'), ('Padel', 'Padel'), ('Piscina1', 'Piscina1'), ('Piscina2', 'Piscina2')], max_length=20)),
+                ('momento_inicio', models.DateTimeField()),
+                ('momento_fin', models.DateTimeField()),
+                ('recurrencia_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archivada_at', models.DateTimeField(auto_now_add=True)),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'reserva archivada',
+                'verbose_name_plural': 'reservas archivadas',
+                'db_table': 'reservas_archivadas',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['momento_inicio'], name='archivada_inicio_idx')],
+            },
+        ),
+    ]
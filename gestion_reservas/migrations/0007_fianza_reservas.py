@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_reservas(apps, schema_editor):
+    Fianza = apps.get_model('gestion_reservas', 'Fianza')
+    Reserva = apps.get_model('gestion_reservas', 'Reserva')
+    sueltas = Reserva.objects.filter(
+        user_id=OuterRef('user_id'), recurrencia__isnull=True
+    ).order_by().values('user_id').annotate(n=Count('id')).values('n')
+    Fianza.objects.update(reservas=Coalesce(Subquery(sueltas), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_reservas', '0006_reservaarchivada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fianza',
+            name='reservas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(contar_reservas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:37
+
+from datetime import date, time
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# los espacios del antiguo enumerado Espacio, abiertos todo el día como hasta ahora
+ESPACIOS = [
+    ('Fútbol', 'Fútbol'),
+    ('Baloncesto', 'Baloncesto'),
+    ('Padel', 'Padel'),
+    ('Piscina1', 'Piscina'),
+    ('Piscina2', 'Piscina'),
+]
+
+
+def crear_pistas(apps, schema_editor):
+    # antes de la clave ajena: cada espacio usado en una reserva tiene que estar en pistas
+    Pista = apps.get_model('gestion_pistas', 'Pista')
+    Reserva = apps.get_model('gestion_reservas', 'Reserva')
+    ReservaRecurrente = apps.get_model('gestion_reservas', 'ReservaRecurrente')
+    usados = set(Reserva.objects.values_list('espacio', flat=True).distinct())
+    usados |= set(ReservaRecurrente.objects.values_list('espacio', flat=True).distinct())
+    categorias = dict(ESPACIOS)
+    existentes = set(Pista.objects.values_list('name', flat=True))
+    nombres = [nombre for nombre, _ in ESPACIOS] + sorted(usados - set(categorias))
+    Pista.objects.bulk_create([
+        Pista(name=nombre, category=categorias.get(nombre, nombre), date=date(2024, 1, 1),
+              start_time=time(0), end_time=time(0), price=0)
+        for nombre in nombres if nombre not in existentes
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_pistas', '0003_pista_catalogo'),
+        ('gestion_reservas', '0007_fianza_reservas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_pistas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reserva',
+            name='espacio',
+            field=models.ForeignKey(db_column='espacio', db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='reservas', to='gestion_pistas.pista', to_field='name'),
+        ),
+        migrations.AlterField(
+            model_name='reservaarchivada',
+            name='espacio',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='reservarecurrente',
+            name='espacio',
+            field=models.ForeignKey(db_column='espacio', db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='reservas_recurrentes', to='gestion_pistas.pista', to_field='name'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_pistas', '0004_cierres_capacidad'),
+        ('gestion_reservas', '0008_espacio_pista'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reserva',
+            name='reserva_franja_unica',
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='plaza',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(fields=('espacio', 'momento_inicio', 'plaza'), name='reserva_franja_unica'),
+        ),
+    ]
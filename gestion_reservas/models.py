@@ -1,32 +1,78 @@
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils.timezone import localtime, make_aware
+from datetime import date, datetime, timedelta
 
 User=get_user_model()
 
-class Espacio(models.TextChoices):
-    # tupla para el enumerado
-    BALONCESTO = 'Baloncesto', 'Baloncesto'
-    FUTBOL = 'Fútbol', 'Fútbol'
-    PADEL = 'Padel', 'Padel'
-    PISCINA1 = 'Piscina1', 'Piscina1'
-    PISCINA2 = 'Piscina2', 'Piscina2'
-
 class Reserva(models.Model):
-    espacio=models.CharField(max_length=20, choices=Espacio.choices, default=Espacio.PADEL)
+    # por el nombre de la pista, en la columna espacio: reserva.espacio_id es el nombre sin
+    # consultar la tabla pistas (las franjas, la caché de disponibilidad y los eventos van por él).
+    # Sin índice propio: ya empieza por espacio el de reserva_franja_unica
+    espacio=models.ForeignKey('gestion_pistas.Pista', to_field='name', db_column='espacio', db_index=False, on_delete=models.PROTECT, related_name='reservas')
     momento_inicio=models.DateTimeField()
     momento_fin=models.DateTimeField()
+    # plaza dentro de la franja (la calle de la piscina), de 0 a la capacidad de la pista menos 1
+    plaza=models.PositiveSmallIntegerField(default=0)
     user_id=models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas')
+    # ocurrencia materializada de una reserva recurrente (no cobra fianza ni cuenta para el límite)
+    recurrencia=models.ForeignKey('gestion_reservas.ReservaRecurrente', on_delete=models.CASCADE, null=True, blank=True, related_name='reservas')
     created_at = models.DateTimeField(auto_now_add=True)
+    # para que la lista de reservas pida solo lo que ha cambiado (?since=)
+    updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
-        return f'Reserva {self.pk} para {self.espacio} de {self.momento_inicio} a {self.momento_fin}'
+        return f'Reserva {self.pk} para {self.espacio_id} de {self.momento_inicio} a {self.momento_fin}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # franja leída de la base de datos, para invalidar también la anterior al modificarla
+        instance._franja_guardada = (instance.__dict__.get('espacio_id'), instance.__dict__.get('momento_inicio'))
+        return instance
    
     class Meta:
         db_table = 'reservas'
         verbose_name = 'reserva'
         verbose_name_plural = 'reservas'
         ordering = ['id'] 
+        # cada plaza de una franja (espacio + hora de inicio) solo puede estar ocupada una vez,
+        # así que dos reservas simultáneas no pueden pasar de la capacidad; el índice único
+        # sirve también para contar la ocupación de la franja con una sola consulta
+        constraints = [
+            models.UniqueConstraint(fields=['espacio', 'momento_inicio', 'plaza'], name='reserva_franja_unica'),
+        ]
+        # filtro por fecha y orden del admin sin fijar el espacio
+        indexes = [
+            models.Index(fields=['momento_inicio'], name='reserva_inicio_idx'),
+        ]
  
+class ReservaArchivada(models.Model):
+    # reserva ya pasada que el comando archivar_reservas saca de la tabla reservas; conserva
+    # el id original y solo lo necesario para el historial
+    id=models.BigIntegerField(primary_key=True)
+    # sin clave ajena, como la recurrencia: el historial se conserva aunque se borre la pista
+    espacio=models.CharField(max_length=100)
+    momento_inicio=models.DateTimeField()
+    momento_fin=models.DateTimeField()
+    user_id=models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_archivadas')
+    # sin clave ajena: la regla puede borrarse después
+    recurrencia_id=models.BigIntegerField(null=True, blank=True)
+    created_at=models.DateTimeField()
+    archivada_at=models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return f'Reserva archivada {self.pk} para {self.espacio} de {self.momento_inicio} a {self.momento_fin}'
+
+    class Meta:
+        db_table = 'reservas_archivadas'
+        verbose_name = 'reserva archivada'
+        verbose_name_plural = 'reservas archivadas'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['momento_inicio'], name='archivada_inicio_idx'),
+        ]
+
 class LineaReserva(models.Model):
     reserva = models.ForeignKey('gestion_reservas.Reserva', on_delete=models.CASCADE)
     def __str__(self):
@@ -34,6 +80,9 @@ class LineaReserva(models.Model):
 
 class Fianza(models.Model):
     cantidad=models.IntegerField(default=0)
+    # reservas sueltas vigentes del usuario, mantenido junto a la cantidad en cada operación
+    # para no contar sus reservas en cada petición (reconciliar_reservas lo recalcula)
+    reservas=models.IntegerField(default=0)
     user_id=models.ForeignKey(User, on_delete=models.CASCADE, related_name='fianzas')
     def __str__(self):
         return f'Fianza {self.pk} de {self.cantidad} euros'
@@ -43,3 +92,115 @@ class Fianza(models.Model):
         verbose_name = 'fianza'
         verbose_name_plural = 'fianzas'
         ordering = ['id']
+
+
+class Frecuencia(models.TextChoices):
+    DIARIA = 'diaria', 'Diaria'
+    SEMANAL = 'semanal', 'Semanal'
+
+class ReservaRecurrente(models.Model):
+    # regla del tipo "todos los martes a las 19:00 hasta junio"; las ocurrencias se generan
+    # al vuelo y solo se guardan como Reserva si se materializa una ventana
+    MAX_DIAS = 366
+
+    # como en Reserva; el índice recurrente_franja_idx empieza por espacio
+    espacio=models.ForeignKey('gestion_pistas.Pista', to_field='name', db_column='espacio', db_index=False, on_delete=models.PROTECT, related_name='reservas_recurrentes')
+    hora_inicio=models.TimeField()
+    frecuencia=models.CharField(max_length=10, choices=Frecuencia.choices, default=Frecuencia.SEMANAL)
+    # cada cuántos días o semanas se repite
+    intervalo=models.PositiveSmallIntegerField(default=1)
+    fecha_inicio=models.DateField()
+    fecha_fin=models.DateField()
+    # fechas ('AAAA-MM-DD') en las que no hay reserva
+    excepciones=models.JSONField(default=list, blank=True)
+    user_id=models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_recurrentes')
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return f'Reserva recurrente {self.pk} para {self.espacio_id} {self.get_frecuencia_display().lower()} a las {self.hora_inicio:%H:%M}'
+
+    class Meta:
+        db_table = 'reservas_recurrentes'
+        verbose_name = 'reserva recurrente'
+        verbose_name_plural = 'reservas recurrentes'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['espacio', 'hora_inicio', 'fecha_inicio'], name='recurrente_franja_idx'),
+        ]
+
+    @property
+    def paso(self):
+        return timedelta(days=self.intervalo * (7 if self.frecuencia == Frecuencia.SEMANAL else 1))
+
+    def ocurre_en(self, dia):
+        return (self.fecha_inicio <= dia <= self.fecha_fin
+                and (dia - self.fecha_inicio) % self.paso == timedelta(0)
+                and dia.isoformat() not in self.excepciones)
+
+    def dias(self, desde=None, hasta=None):
+        # generador de los días con ocurrencia entre desde y hasta (incluidos)
+        desde = max(desde or self.fecha_inicio, self.fecha_inicio)
+        hasta = min(hasta or self.fecha_fin, self.fecha_fin)
+        paso = self.paso
+        # primera ocurrencia >= desde
+        dia = self.fecha_inicio + paso * -(-(desde - self.fecha_inicio).days // paso.days)
+        excepciones = set(self.excepciones)
+        while dia <= hasta:
+            if dia.isoformat() not in excepciones:
+                yield dia
+            dia += paso
+
+    def ocurrencias(self, desde=None, hasta=None):
+        # generador de (momento_inicio, momento_fin) de cada ocurrencia
+        for dia in self.dias(desde, hasta):
+            momento_inicio = make_aware(datetime.combine(dia, self.hora_inicio))
+            yield momento_inicio, momento_inicio + timedelta(hours=1)
+
+    def clean(self):
+        if self.intervalo < 1:
+            raise ValidationError({'intervalo': 'El intervalo tiene que ser al menos 1'})
+        if self.hora_inicio and (self.hora_inicio.minute or self.hora_inicio.second):
+            raise ValidationError({'hora_inicio': 'La reserva tiene que empezar en punto'})
+        if self.fecha_inicio and self.fecha_fin:
+            if self.fecha_fin < self.fecha_inicio:
+                raise ValidationError({'fecha_fin': 'La fecha de fin tiene que ser posterior a la de inicio'})
+            if (self.fecha_fin - self.fecha_inicio).days > self.MAX_DIAS:
+                raise ValidationError({'fecha_fin': f'Una reserva recurrente no puede durar más de {self.MAX_DIAS} días'})
+        try:
+            excepciones = [date.fromisoformat(fecha).isoformat() for fecha in self.excepciones]
+        except (TypeError, ValueError):
+            raise ValidationError({'excepciones': 'Las excepciones tienen que ser fechas AAAA-MM-DD'})
+        self.excepciones = sorted(set(excepciones))
+        if self.espacio_id and self.hora_inicio and self.fecha_inicio and self.fecha_fin:
+            self.validar_conflictos()
+
+    def validar_conflictos(self):
+        # cada ocurrencia tiene que caer en una hora que el horario de la pista deja reservar y
+        # en la que queden plazas, contando las reservas sueltas y las demás reglas del mismo
+        # espacio y hora
+        from gestion_pistas.catalogo import horario
+        from .plazas import Ocupacion  # plazas importa este módulo
+        from .recurrencias import reglas_de_franja
+
+        plantilla = horario(self.espacio_id)
+        if plantilla is None:
+            return
+        ocurrencias = [inicio for inicio, _ in self.ocurrencias()]
+        reservas = Reserva.objects.filter(espacio=self.espacio_id, momento_inicio__in=ocurrencias)
+        if self.pk:
+            reservas = reservas.exclude(recurrencia_id=self.pk)
+        otras = list(ReservaRecurrente.objects.filter(
+            espacio=self.espacio_id, hora_inicio=self.hora_inicio,
+            fecha_inicio__lte=self.fecha_fin, fecha_fin__gte=self.fecha_inicio,
+        ).exclude(pk=self.pk))
+        ocupacion = Ocupacion(reservas.values_list('espacio', 'momento_inicio', 'plaza', 'id', 'recurrencia_id'), otras)
+        for inicio in ocurrencias:
+            motivo = plantilla.motivo(inicio)
+            if motivo:
+                raise ValidationError(f'{motivo} (el {localtime(inicio):%d/%m/%Y})')
+            franja = (self.espacio_id, inicio)
+            if ocupacion.ocupadas(franja) >= plantilla.plazas(inicio):
+                coinciden = reglas_de_franja(otras, *franja)
+                for otra in otras:
+                    if otra.pk in coinciden:
+                        raise ValidationError(f'Coincide con {otra}')
+                raise ValidationError(f'Ya existe una reserva el {localtime(inicio):%d/%m/%Y}')
@@ -0,0 +1,56 @@
+from django.utils.timezone import localtime
+
+from .models import Reserva
+from .recurrencias import reglas_de_franja, reglas_en_rango
+
+
+class Ocupacion:
+    """Plazas ocupadas de un conjunto de franjas (espacio, momento_inicio), leídas de una vez.
+
+    Para validar lotes de reservas en memoria. Las ocurrencias de las reglas recurrentes que
+    aún no se han materializado también ocupan una plaza, aunque todavía no tengan número.
+    """
+
+    def __init__(self, reservas, reglas):
+        # reservas: tuplas (espacio, momento_inicio, plaza, id, recurrencia_id)
+        self.reglas = reglas
+        self.plazas = {}
+        self.materializadas = {}
+        for espacio, momento_inicio, plaza, id, recurrencia_id in reservas:
+            self.ocupar((espacio, momento_inicio), plaza, id, recurrencia_id)
+
+    @classmethod
+    def leer(cls, franjas):
+        # una consulta de reservas y otra de reglas para todas las franjas
+        if not franjas:
+            return cls([], [])
+        espacios = {espacio for espacio, _ in franjas}
+        momentos = {momento for _, momento in franjas}
+        reservas = Reserva.objects.filter(espacio__in=espacios, momento_inicio__in=momentos).values_list(
+            'espacio', 'momento_inicio', 'plaza', 'id', 'recurrencia_id')
+        dias = [localtime(momento).date() for momento in momentos]
+        return cls(reservas, reglas_en_rango(espacios, min(dias), max(dias)))
+
+    def ocupar(self, franja, plaza, id=None, recurrencia_id=None):
+        # id None: reserva nueva, aún sin guardar
+        self.plazas.setdefault(franja, {})[plaza] = id
+        if recurrencia_id:
+            self.materializadas.setdefault(franja, set()).add(recurrencia_id)
+
+    def liberar(self, franja, plaza):
+        self.plazas.get(franja, {}).pop(plaza, None)
+
+    def ocupadas(self, franja):
+        # reservas de la franja más las ocurrencias de reglas que aún no se han materializado
+        pendientes = reglas_de_franja(self.reglas, *franja) - self.materializadas.get(franja, set())
+        return len(self.plazas.get(franja, {})) + len(pendientes)
+
+    def plaza_libre(self, franja, capacidad, reserva_id=None, recurrencia_id=None):
+        # primera plaza libre de la franja, o None si está completa; reserva_id y recurrencia_id
+        # son los de la reserva que se mueve, que no se cuenta a sí misma
+        tomadas = {plaza for plaza, id in self.plazas.get(franja, {}).items() if reserva_id is None or id != reserva_id}
+        pendientes = reglas_de_franja(self.reglas, *franja, excluir=recurrencia_id) - self.materializadas.get(franja, set())
+        libres = [plaza for plaza in range(capacidad) if plaza not in tomadas]
+        if len(libres) <= len(pendientes):
+            return None
+        return libres[0]
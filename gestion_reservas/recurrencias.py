@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.utils.timezone import localdate, localtime, now
+
+from gestion_pistas import catalogo
+
+from .models import Reserva, ReservaRecurrente
+
+# días por delante que materializa por defecto el comando materializar_recurrencias
+VENTANA_MATERIALIZACION = 14
+
+
+def reglas_en_rango(espacios, desde, hasta):
+    return list(ReservaRecurrente.objects.filter(
+        espacio__in=espacios, fecha_inicio__lte=hasta, fecha_fin__gte=desde
+    ))
+
+
+def reglas_de_franja(reglas, espacio, momento_inicio, excluir=None):
+    # ids de las reglas ya leídas con una ocurrencia en la franja, sin consultas
+    momento_inicio = localtime(momento_inicio)
+    return {
+        regla.pk for regla in reglas
+        if regla.espacio_id == espacio and regla.hora_inicio == momento_inicio.time()
+        and regla.pk != excluir and regla.ocurre_en(momento_inicio.date())
+    }
+
+
+def ocupada_por_recurrencia(espacio, momento_inicio, excluir=None):
+    # una consulta sobre el índice (espacio, hora_inicio, fecha_inicio)
+    local = localtime(momento_inicio)
+    reglas = ReservaRecurrente.objects.filter(
+        espacio=espacio, hora_inicio=local.time(),
+        fecha_inicio__lte=local.date(), fecha_fin__gte=local.date(),
+    )
+    return bool(reglas_de_franja(reglas, espacio, momento_inicio, excluir))
+
+
+def materializar(dias=VENTANA_MATERIALIZACION):
+    # guarda como Reserva las ocurrencias futuras de los próximos días que aún no existan
+    from .plazas import Ocupacion  # plazas importa este módulo
+
+    hoy = localdate()
+    hasta = hoy + timedelta(days=dias)
+    desde_momento = now()
+    reglas = list(ReservaRecurrente.objects.filter(fecha_inicio__lte=hasta, fecha_fin__gte=hoy))
+    # todas las reservas de esos espacios en la ventana, para dar a cada ocurrencia una plaza libre
+    reservas = list(Reserva.objects.filter(
+        espacio__in={regla.espacio_id for regla in reglas}, momento_inicio__gte=desde_momento,
+        momento_inicio__lt=desde_momento + timedelta(days=dias + 1),
+    ).values_list('espacio', 'momento_inicio', 'plaza', 'id', 'recurrencia_id'))
+    existentes = {(recurrencia_id, inicio) for _, inicio, _, _, recurrencia_id in reservas if recurrencia_id}
+    ocupacion = Ocupacion(reservas, reglas)
+    nuevas = []
+    for regla in reglas:
+        horario = catalogo.horario(regla.espacio_id)
+        for inicio, fin in regla.ocurrencias(hoy, hasta):
+            if inicio < desde_momento or (regla.pk, inicio) in existentes:
+                continue
+            # plazas del horario compilado: nada en los cierres ni fuera de las horas de apertura
+            capacidad = horario.plazas(inicio) if horario else 0
+            if not capacidad:
+                continue
+            franja = (regla.espacio_id, inicio)
+            plaza = ocupacion.plaza_libre(franja, capacidad, recurrencia_id=regla.pk)
+            if plaza is None:
+                continue
+            ocupacion.ocupar(franja, plaza, recurrencia_id=regla.pk)
+            nuevas.append(Reserva(user_id_id=regla.user_id_id, espacio_id=regla.espacio_id, recurrencia=regla,
+                                  momento_inicio=inicio, momento_fin=fin, plaza=plaza))
+    # la ocupación ya incluía estas ocurrencias, así que no hace falta invalidar la caché
+    Reserva.objects.bulk_create(nuevas, batch_size=500, ignore_conflicts=True)
+    return len(nuevas)
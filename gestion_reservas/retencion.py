@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils.timezone import now
+
+from .disponibilidad import invalidar_ocupacion
+from .eventos import notificar_cambios
+from .models import Fianza, Reserva, ReservaArchivada
+from .services import FIANZA_POR_RESERVA, reintentar_si_bloqueada, usuarios_por_cantidad
+from .signals import borrado_en_lote
+
+TAMANO_LOTE = 1000
+
+
+def archivar(dias=0, tamano_lote=TAMANO_LOTE):
+    # mueve a reservas_archivadas las reservas que terminaron hace más de `dias` días, un lote
+    # por transacción para no bloquear las reservas nuevas mientras dura. Devuelve cuántas
+    # se han archivado
+    corte = now() - timedelta(days=dias)
+    total = 0
+    while archivadas := archivar_lote(corte, tamano_lote):
+        total += archivadas
+    return total
+
+
+@reintentar_si_bloqueada
+def archivar_lote(corte, tamano_lote):
+    with transaction.atomic():
+        # momento_fin <= corte, por el índice de momento_inicio (las reservas duran una hora)
+        reservas = list(Reserva.objects.filter(
+            momento_inicio__lte=corte - timedelta(hours=1)
+        ).order_by('momento_inicio')[:tamano_lote])
+        if not reservas:
+            return 0
+        ReservaArchivada.objects.bulk_create([
+            ReservaArchivada(id=r.id, espacio=r.espacio_id, momento_inicio=r.momento_inicio, momento_fin=r.momento_fin,
+                             user_id_id=r.user_id_id, recurrencia_id=r.recurrencia_id, created_at=r.created_at)
+            for r in reservas
+        ])
+
+        # la reserva ya se ha usado: se devuelve su parte de la fianza, sin bajar de 0 (como en
+        # eliminar_reserva: las reservas antiguas o importadas pueden no haberla cobrado)
+        sueltas = [r.user_id_id for r in reservas if not r.recurrencia_id]
+        for cantidad, usuarios in usuarios_por_cantidad(sueltas).items():
+            Fianza.objects.filter(user_id__in=usuarios).update(
+                cantidad=Greatest(F('cantidad') - FIANZA_POR_RESERVA * cantidad, 0),
+                reservas=Greatest(F('reservas') - cantidad, 0),
+            )
+
+        # delete() borra en cascada lo que cuelga de la reserva (líneas...); las señales de cada
+        # reserva no hacen nada dentro del lote y las franjas se invalidan y se avisan una vez
+        with borrado_en_lote():
+            Reserva.objects.filter(id__in=[r.id for r in reservas]).delete()
+        franjas = [(r.espacio_id, r.momento_inicio) for r in reservas]
+        invalidar_ocupacion(*franjas)
+        notificar_cambios(liberadas=franjas)
+    return len(reservas)
+
+
+def purgar_archivo(dias):
+    # borra del archivo las reservas que terminaron hace más de `dias` días
+    corte = now() - timedelta(days=dias)
+    return ReservaArchivada.objects.filter(momento_inicio__lte=corte - timedelta(hours=1)).delete()[0]
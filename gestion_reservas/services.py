@@ -0,0 +1,388 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.timezone import localtime, now
+
+from gestion_pistas import catalogo
+
+from .models import Reserva, Fianza, ReservaRecurrente
+from .disponibilidad import invalidar_ocupacion
+from .eventos import notificar_cambios
+from .plazas import Ocupacion
+from .recurrencias import ocupada_por_recurrencia
+
+FIANZA_POR_RESERVA = 2
+FIANZA_MAXIMA = 10
+# reservas sueltas vigentes por usuario; modificar una reserva no cambia cuántas hay
+MAX_RESERVAS = 3
+
+# reintentos ante "database is locked" de SQLite
+MAX_REINTENTOS = 3
+ESPERA_REINTENTO = 0.05
+
+
+class ReservaError(Exception):
+    """Error de validación de una reserva; el mensaje se devuelve tal cual al cliente."""
+
+
+def reintentar_si_bloqueada(func):
+    # SQLite devuelve "database is locked" cuando otra conexión tiene el bloqueo de escritura
+    # más tiempo del timeout; la transacción se ha deshecho entera, así que se puede repetir
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for intento in range(MAX_REINTENTOS):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                ultimo = intento == MAX_REINTENTOS - 1
+                # dentro de una transacción externa no se puede repetir solo este trozo
+                if ultimo or 'locked' not in str(e) or transaction.get_connection().in_atomic_block:
+                    raise
+                time.sleep(ESPERA_REINTENTO * 2 ** intento)
+    return wrapper
+
+
+def en_transaccion(func):
+    # versión awaitable de una operación de reserva. Django no admite transacciones en
+    # contexto async, así que la función se ejecuta entera (transacción y reintentos
+    # incluidos) en el hilo compartido de sync_to_async, uno para todas las peticiones,
+    # lo que además encaja con que SQLite solo admite un escritor a la vez
+    return sync_to_async(func, thread_sensitive=True)
+
+
+def validar_franja(momento_inicio, momento_fin):
+    if momento_fin - momento_inicio != timedelta(hours=1):
+        raise ReservaError("La reserva debe durar una hora")
+    # la reserva tiene que ser en el futuro:
+    if momento_inicio < now() or momento_fin < now():
+        raise ReservaError("La reserva tiene que ser en el futuro")
+    # momento_inicio y momento_fin tiene que ser una hora entera y 0 minutos:
+    if momento_inicio.minute != 0 or momento_fin.minute != 0:
+        raise ReservaError("La reserva tiene que empezar y terminar en punto")
+
+
+def capacidad_franja(horario, momento_inicio):
+    # horario: el de la pista en el catálogo (None si no existe). Devuelve las plazas de la
+    # franja según las reglas de la pista, sin contar las ocupadas
+    if horario is None:
+        raise ReservaError("Espacio no válido")
+    capacidad = horario.plazas(momento_inicio)
+    if not capacidad:
+        raise ReservaError(horario.motivo(momento_inicio))
+    return capacidad
+
+
+def franja_completa(capacidad):
+    if capacidad == 1:
+        return ReservaError("Ya existe una reserva en ese momento")
+    return ReservaError("No quedan plazas libres en ese momento")
+
+
+def plaza_libre(espacio, momento_inicio, capacidad, reserva=None):
+    # plaza para la reserva (la nueva o la que se mueve) en la franja, o ReservaError si está
+    # completa. Con una sola plaza, la otra reserva la detecta el índice único sin leerla
+    excluir = reserva.recurrencia_id if reserva else None
+    if capacidad == 1:
+        if ocupada_por_recurrencia(espacio, momento_inicio, excluir=excluir):
+            raise franja_completa(capacidad)
+        return 0
+    # si una reserva simultánea se queda la misma plaza, el índice único hace fallar una de las dos
+    franja = (espacio, momento_inicio)
+    plaza = Ocupacion.leer([franja]).plaza_libre(franja, capacidad, reserva.id if reserva else None, excluir)
+    if plaza is None:
+        raise franja_completa(capacidad)
+    return plaza
+
+
+def aplicar_cambios(reserva, espacio=None, momento_inicio=None, momento_fin=None):
+    # aplica sobre la reserva los campos recibidos y valida el resultado; si cambia la franja,
+    # devuelve su capacidad
+    if momento_inicio:
+        reserva.momento_inicio = momento_inicio
+    if momento_fin:
+        reserva.momento_fin = momento_fin
+    if espacio:
+        reserva.espacio_id = espacio
+
+    if reserva.momento_fin - reserva.momento_inicio != timedelta(hours=1):
+        raise ReservaError("La reserva debe durar una hora")
+    for momento, error in ((momento_inicio, "La reserva tiene que empezar en punto"),
+                           (momento_fin, "La reserva tiene que terminar en punto")):
+        if momento and momento < now():
+            raise ReservaError("La reserva tiene que ser en el futuro")
+        if momento and momento.minute != 0:
+            raise ReservaError(error)
+    if espacio or momento_inicio:
+        return capacidad_franja(catalogo.horario(reserva.espacio_id), reserva.momento_inicio)
+    return None
+
+
+@reintentar_si_bloqueada
+def crear_reserva(user, espacio, momento_inicio, momento_fin):
+    validar_franja(momento_inicio, momento_fin)
+    capacidad = capacidad_franja(catalogo.horario(espacio), momento_inicio)
+    try:
+        with transaction.atomic():
+            cobrar_reserva(user)
+            # la plaza ocupada por otra reserva la detecta el índice único (espacio, momento_inicio, plaza)
+            reserva = Reserva.objects.create(
+                user_id=user,
+                espacio_id=espacio,
+                momento_inicio=momento_inicio,
+                momento_fin=momento_fin,
+                plaza=plaza_libre(espacio, momento_inicio, capacidad),
+            )
+    except IntegrityError:
+        raise ReservaError("Ya existe una reserva en ese momento")
+    return reserva
+
+
+@reintentar_si_bloqueada
+def modificar_reserva(user, reserva_id, espacio=None, momento_inicio=None, momento_fin=None):
+    try:
+        with transaction.atomic():
+            reserva = Reserva.objects.select_for_update().get(id=reserva_id, user_id=user)
+            capacidad = aplicar_cambios(reserva, espacio, momento_inicio, momento_fin)
+            if capacidad:
+                reserva.plaza = plaza_libre(reserva.espacio_id, reserva.momento_inicio, capacidad, reserva)
+            reserva.save()
+    except IntegrityError:
+        raise ReservaError("Ya existe una reserva en ese momento")
+    return reserva
+
+
+@reintentar_si_bloqueada
+def eliminar_reserva(user, reserva_id):
+    with transaction.atomic():
+        reserva = Reserva.objects.select_for_update().get(id=reserva_id, user_id=user)
+        reserva.delete()
+        if reserva.recurrencia_id:
+            anular_ocurrencias([reserva])
+        # devolver los 2 euros de la fianza, sin que la cantidad ni el contador bajen de 0 (las
+        # reservas anteriores a la fianza no la cobraron). Sin fianza no se crea ninguna: el
+        # contador lo corrige reconciliar_reservas
+        else:
+            Fianza.objects.filter(user_id=user).update(cantidad=Greatest(F('cantidad') - FIANZA_POR_RESERVA, 0),
+                                                       reservas=Greatest(F('reservas') - 1, 0))
+
+
+def reservas_sueltas(user):
+    # las ocurrencias materializadas de una reserva recurrente no cuentan para el límite
+    return Reserva.objects.filter(user_id=user, recurrencia__isnull=True)
+
+
+def usuarios_por_cantidad(user_ids):
+    # {n: [usuarios con n reservas en user_ids]}, para actualizar fianzas y contadores en
+    # bloque con un UPDATE por cada n distinto en lugar de uno por usuario
+    agrupados = {}
+    for user_id, cantidad in Counter(user_ids).items():
+        agrupados.setdefault(cantidad, []).append(user_id)
+    return agrupados
+
+
+def contadores_reales():
+    # número real de reservas sueltas de cada fianza, para compararlo con el contador
+    sueltas = Reserva.objects.filter(
+        user_id=OuterRef('user_id'), recurrencia__isnull=True
+    ).order_by().values('user_id').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(sueltas), 0)
+
+
+def contadores_descuadrados():
+    return Fianza.objects.annotate(real=contadores_reales()).exclude(reservas=F('real'))
+
+
+def reconciliar_contadores():
+    # recalcula desde Reserva los contadores que no cuadran; devuelve cuántos ha corregido
+    with transaction.atomic():
+        return contadores_descuadrados().update(reservas=contadores_reales())
+
+
+def cobrar_reserva(user):
+    # suma la reserva a la fianza y al contador del usuario solo si no pasa de los límites, en
+    # un único UPDATE que además deja la fila bloqueada hasta el commit; así dos reservas
+    # simultáneas no pueden pasar las dos con el último hueco
+    if Fianza.objects.filter(user_id=user, cantidad__lt=FIANZA_MAXIMA, reservas__lt=MAX_RESERVAS).update(
+        cantidad=F('cantidad') + FIANZA_POR_RESERVA, reservas=F('reservas') + 1
+    ):
+        return
+    # primera reserva del usuario: el contador empieza con las que ya tuviera sin fianza
+    fianza, creada = Fianza.objects.get_or_create(user_id=user, defaults={
+        'cantidad': FIANZA_POR_RESERVA, 'reservas': lambda: reservas_sueltas(user).count() + 1,
+    })
+    if creada and fianza.reservas <= MAX_RESERVAS:
+        return
+    if fianza.cantidad >= FIANZA_MAXIMA:
+        raise ReservaError("Tu fianza es igual o mayor a 10 euros")
+    raise ReservaError(f"No puedes tener más de {MAX_RESERVAS} reservas")
+
+
+def anular_ocurrencias(reservas):
+    # al cancelar una ocurrencia materializada se añade su fecha a las excepciones de la regla,
+    # para que no vuelva a generarse
+    por_regla = {}
+    for reserva in reservas:
+        por_regla.setdefault(reserva.recurrencia_id, set()).add(localtime(reserva.momento_inicio).date().isoformat())
+    reglas = ReservaRecurrente.objects.select_for_update().filter(pk__in=por_regla)
+    for regla in reglas:
+        regla.excepciones = sorted(set(regla.excepciones) | por_regla[regla.pk])
+        regla.save(update_fields=['excepciones'])
+
+
+def guardar_lote(modificadas, nuevas):
+    # bulk_update no rellena los campos auto_now
+    for reserva in modificadas:
+        reserva.updated_at = now()
+    if modificadas:
+        Reserva.objects.bulk_update(modificadas, ['espacio', 'momento_inicio', 'momento_fin', 'plaza', 'updated_at'])
+    if nuevas:
+        Reserva.objects.bulk_create(nuevas)
+
+
+@reintentar_si_bloqueada
+def procesar_lote(user, operaciones):
+    # operaciones: dicts {'accion', 'id', 'espacio', 'momento_inicio', 'momento_fin'} ya parseados,
+    # o ReservaError si el elemento no se pudo leer. Se validan todas contra una sola lectura de
+    # las franjas afectadas y se aplican con bulk_create/bulk_update en una transacción.
+    # Devuelve un resultado por operación; las que no pasan la validación no se aplican.
+    resultados = [None] * len(operaciones)
+    validas = []
+    for i, operacion in enumerate(operaciones):
+        if isinstance(operacion, ReservaError):
+            resultados[i] = {"error": str(operacion)}
+        else:
+            validas.append((i, operacion))
+
+    try:
+        with transaction.atomic():
+            fianza = Fianza.objects.select_for_update().get_or_create(
+                user_id=user, defaults={'reservas': lambda: reservas_sueltas(user).count()}
+            )[0]
+            ids = {op['id'] for _, op in validas if op['accion'] != 'crear'}
+            propias = {r.id: r for r in Reserva.objects.select_for_update().filter(user_id=user, id__in=ids)}
+            originales = {r.id: (r.espacio_id, r.momento_inicio) for r in propias.values()}
+            destinos = []
+            for _, op in validas:
+                if op['accion'] == 'crear':
+                    destinos.append((op['espacio'], op['momento_inicio']))
+                elif op['accion'] == 'modificar' and op['id'] in propias:
+                    reserva = propias[op['id']]
+                    destinos.append((op['espacio'] or reserva.espacio_id, op['momento_inicio'] or reserva.momento_inicio))
+            ocupacion = Ocupacion.leer(destinos)
+            total = fianza.reservas
+            cantidad = fianza.cantidad
+
+            nuevas, modificadas, eliminadas, anuladas = [], {}, [], []
+            # operación de cada reserva modificada, para poner ahí el error si no se puede guardar
+            posiciones = {}
+            franjas = []
+            for i, op in validas:
+                try:
+                    if op['accion'] == 'crear':
+                        validar_franja(op['momento_inicio'], op['momento_fin'])
+                        capacidad = capacidad_franja(catalogo.horario(op['espacio']), op['momento_inicio'])
+                        if cantidad >= FIANZA_MAXIMA:
+                            raise ReservaError("Tu fianza es igual o mayor a 10 euros")
+                        if total >= MAX_RESERVAS:
+                            raise ReservaError(f"No puedes tener más de {MAX_RESERVAS} reservas")
+                        franja = (op['espacio'], op['momento_inicio'])
+                        plaza = ocupacion.plaza_libre(franja, capacidad)
+                        if plaza is None:
+                            raise franja_completa(capacidad)
+                        reserva = Reserva(user_id=user, espacio_id=op['espacio'], momento_inicio=op['momento_inicio'],
+                                          momento_fin=op['momento_fin'], plaza=plaza)
+                        ocupacion.ocupar(franja, plaza)
+                        nuevas.append((i, reserva))
+                        franjas.append(franja)
+                        total += 1
+                        cantidad += FIANZA_POR_RESERVA
+                        continue
+
+                    reserva = propias.get(op['id'])
+                    if reserva is None:
+                        raise ReservaError("La reserva no existe")
+                    anterior = (reserva.espacio_id, reserva.momento_inicio)
+                    if op['accion'] == 'eliminar':
+                        del propias[reserva.id]
+                        modificadas.pop(reserva.id, None)
+                        ocupacion.liberar(anterior, reserva.plaza)
+                        eliminadas.append(reserva.id)
+                        if reserva.recurrencia_id:
+                            anuladas.append(reserva)
+                        else:
+                            # como en eliminar_reserva, sin bajar de 0
+                            total = max(total - 1, 0)
+                            cantidad = max(cantidad - FIANZA_POR_RESERVA, 0)
+                    else:
+                        cambios = (reserva.espacio_id, reserva.momento_inicio, reserva.momento_fin, reserva.plaza)
+                        try:
+                            capacidad = aplicar_cambios(reserva, op['espacio'], op['momento_inicio'], op['momento_fin'])
+                            franja = (reserva.espacio_id, reserva.momento_inicio)
+                            if capacidad:
+                                reserva.plaza = ocupacion.plaza_libre(franja, capacidad, reserva.id, reserva.recurrencia_id)
+                                if reserva.plaza is None:
+                                    raise franja_completa(capacidad)
+                        except ReservaError:
+                            reserva.espacio_id, reserva.momento_inicio, reserva.momento_fin, reserva.plaza = cambios
+                            raise
+                        ocupacion.liberar(anterior, cambios[3])
+                        ocupacion.ocupar(franja, reserva.plaza, reserva.id)
+                        modificadas[reserva.id] = reserva
+                        posiciones[reserva.id] = i
+                        franjas += [anterior, franja]
+                    resultados[i] = {"id": reserva.id}
+                except ReservaError as e:
+                    resultados[i] = {"error": str(e)}
+
+            # primero se liberan franjas y después se ocupan, para no chocar con el índice único
+            if eliminadas:
+                Reserva.objects.filter(id__in=eliminadas).delete()
+                anular_ocurrencias(anuladas)
+            if modificadas or nuevas:
+                try:
+                    with transaction.atomic():
+                        guardar_lote(list(modificadas.values()), [reserva for _, reserva in nuevas])
+                except IntegrityError:
+                    # otra petición ha ocupado alguna plaza después de leer la ocupación: se guarda
+                    # cada reserva en su savepoint y el error queda solo en las que chocan
+                    for id, reserva in list(modificadas.items()):
+                        try:
+                            with transaction.atomic():
+                                guardar_lote([reserva], [])
+                        except IntegrityError:
+                            del modificadas[id]
+                            resultados[posiciones[id]] = {"error": "Ya existe una reserva en ese momento"}
+                    for i, reserva in list(nuevas):
+                        try:
+                            with transaction.atomic():
+                                guardar_lote([], [reserva])
+                        except IntegrityError:
+                            nuevas.remove((i, reserva))
+                            resultados[i] = {"error": "Ya existe una reserva en ese momento"}
+                            total -= 1
+                            cantidad -= FIANZA_POR_RESERVA
+                for i, reserva in nuevas:
+                    resultados[i] = {"id": reserva.id}
+            if cantidad != fianza.cantidad or total != fianza.reservas:
+                Fianza.objects.filter(pk=fianza.pk).update(cantidad=F('cantidad') + (cantidad - fianza.cantidad),
+                                                           reservas=F('reservas') + (total - fianza.reservas))
+            # bulk_create y bulk_update no envían señales
+            invalidar_ocupacion(*franjas)
+            notificar_cambios(
+                liberadas=[originales[id] for id in [*eliminadas, *modificadas]],
+                ocupadas=[(r.espacio_id, r.momento_inicio) for r in [*modificadas.values(), *(r for _, r in nuevas)]],
+            )
+    except IntegrityError:
+        raise ReservaError("Ya existe una reserva en ese momento")
+    return resultados
+
+
+acrear_reserva = en_transaccion(crear_reserva)
+amodificar_reserva = en_transaccion(modificar_reserva)
+aeliminar_reserva = en_transaccion(eliminar_reserva)
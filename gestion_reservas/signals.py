@@ -0,0 +1,66 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .disponibilidad import invalidar_ocupacion
+from .eventos import notificar_cambios
+from .models import Reserva, ReservaRecurrente
+
+_lote = threading.local()
+
+
+@contextmanager
+def borrado_en_lote():
+    # dentro, borrar una reserva no invalida ni avisa de su franja: quien borra el lote lo hace
+    # una vez para todas
+    _lote.activo = True
+    try:
+        yield
+    finally:
+        _lote.activo = False
+
+
+@receiver(post_save, sender=Reserva)
+def invalidar_ocupacion_al_guardar(sender, instance, **kwargs):
+    franjas = [(instance.espacio_id, instance.momento_inicio)]
+    franja_guardada = getattr(instance, '_franja_guardada', None)
+    if franja_guardada and None not in franja_guardada:
+        franjas.append(franja_guardada)
+    invalidar_ocupacion(*franjas)
+    notificar_cambios(liberadas=franjas[1:], ocupadas=franjas[:1])
+    instance._franja_guardada = (instance.espacio_id, instance.momento_inicio)
+
+
+@receiver(post_delete, sender=Reserva)
+def invalidar_ocupacion_al_eliminar(sender, instance, **kwargs):
+    if getattr(_lote, 'activo', False):
+        return
+    invalidar_ocupacion((instance.espacio_id, instance.momento_inicio))
+    notificar_cambios(liberadas=[(instance.espacio_id, instance.momento_inicio)])
+
+
+def franjas_de_regla(regla):
+    return [(regla.espacio_id, momento_inicio) for momento_inicio, _ in regla.ocurrencias()]
+
+
+@receiver(pre_save, sender=ReservaRecurrente)
+def recordar_regla_anterior(sender, instance, **kwargs):
+    # las reglas se editan poco (admin), así que basta con releer la versión guardada
+    instance._regla_anterior = ReservaRecurrente.objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=ReservaRecurrente)
+def invalidar_ocupacion_al_guardar_regla(sender, instance, **kwargs):
+    franjas = franjas_de_regla(instance)
+    anteriores = franjas_de_regla(instance._regla_anterior) if getattr(instance, '_regla_anterior', None) else []
+    invalidar_ocupacion(*franjas, *anteriores)
+    notificar_cambios(liberadas=anteriores, ocupadas=franjas)
+
+
+@receiver(post_delete, sender=ReservaRecurrente)
+def invalidar_ocupacion_al_eliminar_regla(sender, instance, **kwargs):
+    franjas = franjas_de_regla(instance)
+    invalidar_ocupacion(*franjas)
+    notificar_cambios(liberadas=franjas)
@@ -55,30 +55,99 @@ document.addEventListener('DOMContentLoaded', () => {
   // Escuchar cambios en el campo de inicio
   momentoInicioInput.addEventListener('change', actualizarMomentoFin);
 
-  // Manejar la edición de reservas
-  const editarReservaButtons = document.querySelectorAll('.editar-reserva-btn');
-  editarReservaButtons.forEach(button => {
-      button.addEventListener('click', () => {
-          const reservaId = button.getAttribute('data-id');
-          const inicio = button.getAttribute('data-momento_inicio');
-          const fin = button.getAttribute('data-momento_fin');
-          const espacio = button.getAttribute('data-espacio');
-
-          reservaIdInput.value = reservaId;
-          momentoInicioInput.value = inicio;
-          momentoFinInput.value = fin;
-          document.getElementById('espacio').value = espacio;
-
-          const inicioDate = new Date(inicio);
-          const finDate = new Date(fin);
+  const reservasContainer = document.getElementById('reservas-container');
+  const reservasVacio = document.getElementById('reservas-vacio');
+  const plantillaTarjeta = document.getElementById('reserva-card-template');
+  // momento de la última sincronización; el servidor solo devuelve lo cambiado desde entonces
+  let ultimaSincronizacion = reservasContainer.dataset.momento;
 
-          // Actualizar la visualización formateada
-          displayInicio.innerText = formatearFechaDisplay(inicioDate);
-          displayFin.innerText = formatearFechaDisplay(finDate);
+  // '2024-01-01T14:00:00+01:00' -> '01/01/2024 14:00' (la fecha ya viene en hora local)
+  const formatearFechaTarjeta = (iso) => `${iso.slice(8, 10)}/${iso.slice(5, 7)}/${iso.slice(0, 4)} ${iso.slice(11, 16)}`;
 
-          // Actualizar el campo de fin automáticamente
-          actualizarMomentoFin();
+  // Rellena una tarjeta (nueva o existente) con los datos de la reserva
+  const pintarTarjeta = (tarjeta, reserva) => {
+      tarjeta.dataset.reservaId = reserva.id;
+      const imagen = tarjeta.querySelector('.reserva-imagen');
+      imagen.src = reserva.imagen;
+      imagen.srcset = reserva.imagen_srcset;
+      imagen.alt = reserva.espacio;
+      // las variantes AVIF/WebP van en los <source> del <picture>; sin srcset se ignoran
+      tarjeta.querySelectorAll('picture source').forEach(fuente => {
+          fuente.srcset = reserva.imagen_fuentes[fuente.type] || '';
       });
+      tarjeta.querySelector('.reserva-espacio').innerText = reserva.espacio;
+      tarjeta.querySelector('.reserva-inicio').innerText = formatearFechaTarjeta(reserva.momento_inicio);
+      tarjeta.querySelector('.reserva-fin').innerText = formatearFechaTarjeta(reserva.momento_fin);
+      const editar = tarjeta.querySelector('.editar-reserva-btn');
+      editar.dataset.id = reserva.id;
+      editar.dataset.momento_inicio = reserva.momento_inicio.slice(0, 16);
+      editar.dataset.momento_fin = reserva.momento_fin.slice(0, 16);
+      editar.dataset.espacio = reserva.espacio;
+      tarjeta.querySelector('.eliminar-reserva-btn').dataset.id = reserva.id;
+  };
+
+  // Pide al servidor solo las reservas cambiadas y actualiza las tarjetas en su sitio,
+  // en lugar de recargar la página entera
+  const sincronizarReservas = async () => {
+      let cursor = 0;
+      let ids = null;
+      let momento = null;
+      while (cursor !== null) {
+          const params = new URLSearchParams({since: ultimaSincronizacion, cursor: cursor});
+          const response = await fetch(`/reservas/lista/?${params}`);
+          if (!response.ok) {
+              throw new Error(`Error ${response.status} al actualizar las reservas`);
+          }
+          const data = await response.json();
+          momento = momento || data.momento;
+          ids = ids || new Set(data.ids);
+          data.reservas.forEach(reserva => {
+              let tarjeta = reservasContainer.querySelector(`[data-reserva-id="${reserva.id}"]`);
+              if (!tarjeta) {
+                  tarjeta = plantillaTarjeta.content.firstElementChild.cloneNode(true);
+                  reservasContainer.insertBefore(tarjeta, reservasVacio);
+              }
+              pintarTarjeta(tarjeta, reserva);
+          });
+          cursor = data.siguiente;
+      }
+      // las que ya no están en la lista se han borrado
+      reservasContainer.querySelectorAll('[data-reserva-id]').forEach(tarjeta => {
+          if (!ids.has(Number(tarjeta.dataset.reservaId))) {
+              tarjeta.remove();
+          }
+      });
+      reservasVacio.classList.toggle('hidden', ids.size > 0);
+      ultimaSincronizacion = momento;
+      toggleScrollButtons();
+  };
+
+  // Manejar la edición de reservas (delegado en el contenedor, para que funcione también
+  // con las tarjetas añadidas después)
+  reservasContainer.addEventListener('click', (e) => {
+      const button = e.target.closest('.editar-reserva-btn');
+      if (!button) {
+          return;
+      }
+      const reservaId = button.getAttribute('data-id');
+      const inicio = button.getAttribute('data-momento_inicio');
+      const fin = button.getAttribute('data-momento_fin');
+      const espacio = button.getAttribute('data-espacio');
+
+      reservaIdInput.value = reservaId;
+      momentoInicioInput.value = inicio;
+      momentoFinInput.value = fin;
+      document.getElementById('espacio').value = espacio;
+
+      const inicioDate = new Date(inicio);
+      const finDate = new Date(fin);
+
+      // Actualizar la visualización formateada
+      displayInicio.innerText = formatearFechaDisplay(inicioDate);
+      displayFin.innerText = formatearFechaDisplay(finDate);
+
+      // Actualizar el campo de fin automáticamente
+      actualizarMomentoFin();
   });
 
   // Manejar el envío del formulario
@@ -116,7 +185,7 @@ document.addEventListener('DOMContentLoaded', () => {
           } else {
               alert("Reserva creada con éxito!");
           }
-          window.location.reload(); // Recargar la página para actualizar la lista
+          return sincronizarReservas();
       })
       .catch(error => {
           console.error('Error:', error);
@@ -125,37 +194,37 @@ document.addEventListener('DOMContentLoaded', () => {
   });
 
   // Manejar la eliminación de reservas
-  const eliminarReservaButtons = document.querySelectorAll('.eliminar-reserva-btn');
-  eliminarReservaButtons.forEach(button => {
-      button.addEventListener('click', () => {
-          const reservaId = button.getAttribute('data-id');
-          if (confirm('¿Estás seguro de que deseas eliminar esta reserva?')) {
-              fetch(`/reservas/eliminar/${reservaId}/`, {
-                  method: 'DELETE',
-                  headers: {
-                      'Content-Type': 'application/json',
-                      'X-CSRFToken': csrfToken,
-                  },
-              })
-              .then(response => response.json())
-              .then(data => {
-                  if (data.success) {
-                      alert("Reserva eliminada con éxito!");
-                      window.location.reload(); // Recargar la página para actualizar la lista
-                  } else {
-                      alert('Error al eliminar la reserva.');
-                  }
-              })
-              .catch(error => {
-                  console.error('Error al eliminar reserva:', error);
-                  alert("Ocurrió un error al eliminar la reserva.");
-              });
-          }
-      });
+  reservasContainer.addEventListener('click', (e) => {
+      const button = e.target.closest('.eliminar-reserva-btn');
+      if (!button) {
+          return;
+      }
+      const reservaId = button.getAttribute('data-id');
+      if (confirm('¿Estás seguro de que deseas eliminar esta reserva?')) {
+          fetch(`/reservas/eliminar/${reservaId}/`, {
+              method: 'DELETE',
+              headers: {
+                  'Content-Type': 'application/json',
+                  'X-CSRFToken': csrfToken,
+              },
+          })
+          .then(response => response.json())
+          .then(data => {
+              if (data.success) {
+                  alert("Reserva eliminada con éxito!");
+                  return sincronizarReservas();
+              } else {
+                  alert('Error al eliminar la reserva.');
+              }
+          })
+          .catch(error => {
+              console.error('Error al eliminar reserva:', error);
+              alert("Ocurrió un error al eliminar la reserva.");
+          });
+      }
   });
 
   // Funcionalidad de desplazamiento horizontal
-  const reservasContainer = document.getElementById('reservas-container');
   const scrollLeftBtn = document.getElementById('scroll-left');
   const scrollRightBtn = document.getElementById('scroll-right');
 
@@ -0,0 +1,636 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from home.imagenes import variantes
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.utils.timezone import localdate, make_aware
+from datetime import datetime, time, timedelta
+import asyncio
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from gestion_reservas.models import Reserva, Fianza, LineaReserva, ReservaArchivada, ReservaRecurrente
+from gestion_reservas.services import crear_reserva, modificar_reserva, eliminar_reserva
+from gestion_reservas.eventos import difusor, OCUPADA
+from gestion_reservas.plazas import Ocupacion
+from gestion_reservas.metricas import metricas, resumen_metricas
+
+class DisponibilidadIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.dia = localdate() + timedelta(days=1)
+        inicio = make_aware(datetime.combine(self.dia, time(10)))
+        Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=inicio,
+                               momento_fin=inicio + timedelta(hours=1))
+
+    def get_disponibilidad(self, **params):
+        return self.client.get(reverse('disponibilidad'), data=params)
+
+    def test_rejilla_marca_horas_ocupadas(self):
+        response = self.get_disponibilidad(desde=self.dia.isoformat(), hasta=(self.dia + timedelta(days=1)).isoformat(),
+                                           espacio=['Padel', 'Baloncesto'])
+        self.assertEqual(response.status_code, 200)
+        espacios = response.json()['espacios']
+        padel = espacios['Padel'][self.dia.isoformat()]
+        self.assertEqual(len(padel), 24)
+        self.assertEqual(padel[10], '1')
+        self.assertEqual(padel.count('1'), 1)
+        self.assertEqual(espacios['Padel'][(self.dia + timedelta(days=1)).isoformat()], '0' * 24)
+        self.assertEqual(espacios['Baloncesto'][self.dia.isoformat()], '0' * 24)
+
+    def test_una_consulta_por_tabla(self):
+        # reservas sueltas y reservas recurrentes
+        with self.assertNumQueries(2):
+            self.get_disponibilidad(desde=self.dia.isoformat(), hasta=(self.dia + timedelta(days=6)).isoformat())
+
+    def test_etag_devuelve_304(self):
+        response = self.get_disponibilidad(desde=self.dia.isoformat())
+        etag = response['ETag']
+        response = self.client.get(reverse('disponibilidad'), data={'desde': self.dia.isoformat()},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_cambia_al_reservar(self):
+        etag = self.get_disponibilidad(desde=self.dia.isoformat())['ETag']
+        inicio = make_aware(datetime.combine(self.dia, time(12)))
+        Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=inicio,
+                               momento_fin=inicio + timedelta(hours=1))
+        response = self.client.get(reverse('disponibilidad'), data={'desde': self.dia.isoformat()},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.get_disponibilidad(desde='mañana').status_code, 400)
+        self.assertEqual(self.get_disponibilidad(espacio='Tenis').status_code, 400)
+        self.assertEqual(self.get_disponibilidad(desde=self.dia.isoformat(),
+                                                 hasta=(self.dia + timedelta(days=60)).isoformat()).status_code, 400)
+
+
+class CacheDisponibilidadIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.dia = localdate() + timedelta(days=1)
+        self.inicio = make_aware(datetime.combine(self.dia, time(10)))
+
+    def horas(self, espacio='Padel', dia=None):
+        dia = dia or self.dia
+        response = self.client.get(reverse('disponibilidad'), data={'desde': dia.isoformat(), 'espacio': espacio})
+        return response.json()['espacios'][espacio][dia.isoformat()]
+
+    def test_segunda_consulta_sale_de_cache(self):
+        self.horas()
+        with self.assertNumQueries(0):
+            self.horas()
+
+    def test_crear_reserva_invalida_la_cache(self):
+        self.assertEqual(self.horas()[10], '0')
+        crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+        self.assertEqual(self.horas()[10], '1')
+
+    def test_modificar_reserva_libera_la_franja_anterior(self):
+        reserva = crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+        otro_dia = self.dia + timedelta(days=1)
+        self.assertEqual(self.horas()[10], '1')
+        self.assertEqual(self.horas(dia=otro_dia)[10], '0')
+        nuevo_inicio = make_aware(datetime.combine(otro_dia, time(10)))
+        modificar_reserva(self.user, reserva.id, momento_inicio=nuevo_inicio,
+                          momento_fin=nuevo_inicio + timedelta(hours=1))
+        self.assertEqual(self.horas()[10], '0')
+        self.assertEqual(self.horas(dia=otro_dia)[10], '1')
+
+    def test_eliminar_reserva_invalida_la_cache(self):
+        reserva = crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+        self.assertEqual(self.horas()[10], '1')
+        eliminar_reserva(self.user, reserva.id)
+        self.assertEqual(self.horas()[10], '0')
+
+    def test_estadisticas_solo_para_staff(self):
+        self.horas()
+        self.horas()
+        self.client.login(username='12345678A', password='password123')
+        self.assertEqual(self.client.get(reverse('disponibilidad_estadisticas')).status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        estadisticas = self.client.get(reverse('disponibilidad_estadisticas')).json()
+        self.assertEqual(estadisticas['aciertos'], 1)
+        self.assertEqual(estadisticas['fallos'], 1)
+        self.assertEqual(estadisticas['ratio_aciertos'], 0.5)
+
+
+class LoteReservasIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.client.login(username='12345678A', password='password123')
+        self.dia = localdate() + timedelta(days=1)
+
+    def franja(self, hora, dias=0):
+        inicio = datetime.combine(self.dia + timedelta(days=dias), time(hora))
+        return inicio.isoformat(), (inicio + timedelta(hours=1)).isoformat()
+
+    def crear(self, hora, espacio='Padel', dias=0):
+        inicio, fin = self.franja(hora, dias)
+        return {'accion': 'crear', 'espacio': espacio, 'momento_inicio': inicio, 'momento_fin': fin}
+
+    def post_lote(self, operaciones):
+        return self.client.post(reverse('lote_reservas'), data=json.dumps({'operaciones': operaciones}),
+                                content_type='application/json')
+
+    def test_crear_varias_reservas(self):
+        response = self.post_lote([self.crear(10, dias=7 * semana) for semana in range(3)])
+        resultados = response.json()['resultados']
+        self.assertEqual(len(resultados), 3)
+        self.assertTrue(all('id' in resultado for resultado in resultados))
+        self.assertEqual(Reserva.objects.filter(user_id=self.user).count(), 3)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 6)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, 3)
+
+    def test_resultado_por_operacion(self):
+        otro = User.objects.create_user(username='87654321B', password='password123')
+        inicio = make_aware(datetime.combine(self.dia, time(11)))
+        Reserva.objects.create(user_id=otro, espacio_id='Padel', momento_inicio=inicio,
+                               momento_fin=inicio + timedelta(hours=1))
+        resultados = self.post_lote([
+            self.crear(10),
+            self.crear(11),
+            self.crear(10),
+            {'accion': 'eliminar', 'id': 9999},
+            {'accion': 'volar'},
+        ]).json()['resultados']
+        self.assertIn('id', resultados[0])
+        self.assertEqual(resultados[1]['error'], 'Ya existe una reserva en ese momento')
+        self.assertEqual(resultados[2]['error'], 'Ya existe una reserva en ese momento')
+        self.assertEqual(resultados[3]['error'], 'La reserva no existe')
+        self.assertEqual(resultados[4]['error'], 'Acción no válida')
+        self.assertEqual(Reserva.objects.filter(user_id=self.user).count(), 1)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 2)
+
+    def test_choque_al_guardar_solo_falla_su_operacion(self):
+        # otra petición reserva la franja de las 11 después de que el lote lea la ocupación
+        otro = User.objects.create_user(username='87654321B', password='password123')
+        inicio = make_aware(datetime.combine(self.dia, time(11)))
+        Reserva.objects.create(user_id=otro, espacio_id='Padel', momento_inicio=inicio,
+                               momento_fin=inicio + timedelta(hours=1))
+        with mock.patch('gestion_reservas.services.Ocupacion.leer', return_value=Ocupacion([], [])):
+            resultados = self.post_lote([self.crear(10), self.crear(11), self.crear(12)]).json()['resultados']
+        self.assertIn('id', resultados[0])
+        self.assertEqual(resultados[1]['error'], 'Ya existe una reserva en ese momento')
+        self.assertIn('id', resultados[2])
+        self.assertEqual(Reserva.objects.filter(user_id=self.user).count(), 2)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, 2)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 4)
+
+    def test_eliminar_y_reservar_la_misma_franja(self):
+        ids = [r['id'] for r in self.post_lote([self.crear(10), self.crear(12)]).json()['resultados']]
+        inicio, fin = self.franja(13)
+        resultados = self.post_lote([
+            {'accion': 'eliminar', 'id': ids[0]},
+            {'accion': 'modificar', 'id': ids[1], 'momento_inicio': inicio, 'momento_fin': fin},
+            self.crear(10, espacio='Padel'),
+        ]).json()['resultados']
+        self.assertTrue(all('id' in resultado for resultado in resultados), resultados)
+        horas = sorted(r.momento_inicio.hour for r in Reserva.objects.filter(user_id=self.user))
+        self.assertEqual(horas, [10, 13])
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 4)
+
+    def test_lote_invalida_la_cache(self):
+        url = reverse('disponibilidad')
+        self.client.get(url, data={'desde': self.dia.isoformat(), 'espacio': 'Padel'})
+        self.post_lote([self.crear(10)])
+        horas = self.client.get(url, data={'desde': self.dia.isoformat(), 'espacio': 'Padel'}).json()
+        self.assertEqual(horas['espacios']['Padel'][self.dia.isoformat()][10], '1')
+
+    def test_consultas_no_crecen_con_el_lote(self):
+        # la primera petición crea la fianza
+        self.post_lote([self.crear(7)])
+        with CaptureQueriesContext(connection) as pocas:
+            self.post_lote([self.crear(8)])
+        with CaptureQueriesContext(connection) as muchas:
+            self.post_lote([self.crear(hora) for hora in range(9, 9 + 8)])
+        self.assertEqual(len(pocas), len(muchas))
+
+class ListaReservasIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.client.login(username='12345678A', password='password123')
+        dia = localdate() + timedelta(days=1)
+        self.reservas = [
+            Reserva.objects.create(
+                user_id=self.user, espacio_id='Padel',
+                momento_inicio=make_aware(datetime.combine(dia, time(hora))),
+                momento_fin=make_aware(datetime.combine(dia, time(hora + 1))),
+            )
+            for hora in (9, 10, 11)
+        ]
+
+    def test_paginacion_por_cursor(self):
+        response = self.client.get(reverse('lista_reservas'), {'limite': 2})
+        data = response.json()
+        self.assertEqual([r['id'] for r in data['reservas']], [r.id for r in self.reservas[:2]])
+        self.assertEqual(data['siguiente'], self.reservas[1].id)
+
+        data = self.client.get(reverse('lista_reservas'), {'limite': 2, 'cursor': data['siguiente']}).json()
+        self.assertEqual([r['id'] for r in data['reservas']], [self.reservas[2].id])
+        self.assertIsNone(data['siguiente'])
+
+    def test_since_devuelve_solo_los_cambios(self):
+        momento = self.client.get(reverse('lista_reservas')).json()['momento']
+        modificada, eliminada = self.reservas[0], self.reservas[1]
+        eliminar_reserva(self.user, eliminada.id)
+        modificar_reserva(self.user, modificada.id, espacio='Fútbol')
+
+        data = self.client.get(reverse('lista_reservas'), {'since': momento}).json()
+        self.assertEqual([r['id'] for r in data['reservas']], [modificada.id])
+        self.assertEqual(data['reservas'][0]['espacio'], 'Fútbol')
+        self.assertEqual(data['reservas'][0]['imagen'], variantes('images/fútbol.jpg')['src'])
+        # los ids vigentes permiten quitar las tarjetas de las reservas borradas
+        self.assertEqual(sorted(data['ids']), [modificada.id, self.reservas[2].id])
+
+    def test_parametros_no_validos(self):
+        for params in ({'cursor': 'a'}, {'limite': 'x'}, {'limite': 0}, {'limite': -1}, {'since': 'ayer'}):
+            response = self.client.get(reverse('lista_reservas'), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_solo_reservas_propias(self):
+        User.objects.create_user(username='87654321B', password='password123')
+        self.client.login(username='87654321B', password='password123')
+        data = self.client.get(reverse('lista_reservas')).json()
+        self.assertEqual(data['reservas'], [])
+
+
+class EventosDisponibilidadIntegrationTestCase(TestCase):
+    def test_con_wsgi_responde_sin_abrir_el_flujo(self):
+        # el cliente síncrono pasa por WSGI: la petición tiene que terminar
+        response = self.client.get(reverse('eventos_disponibilidad'), {'espacio': 'Padel'})
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('ASGI', response.json()['error'])
+        self.assertEqual(difusor.clientes(), 0)
+
+    async def test_flujo_recibe_los_cambios_del_espacio(self):
+        dia = localdate() + timedelta(days=1)
+        response = await self.async_client.get(
+            reverse('eventos_disponibilidad'), {'desde': dia.isoformat(), 'espacio': 'Padel'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flujo = aiter(response.streaming_content)
+        self.assertEqual(await anext(flujo), b'retry: 5000\n\n')
+
+        difusor.publicar('Fútbol', dia, {"tipo": OCUPADA, "espacio": 'Fútbol', "hora": 9})
+        difusor.publicar('Padel', dia, {"tipo": OCUPADA, "espacio": 'Padel', "hora": 10})
+        evento = (await anext(flujo)).decode()
+        self.assertTrue(evento.startswith('event: ocupada\n'))
+        self.assertIn('"espacio": "Padel"', evento)
+        self.assertIn('"hora": 10', evento)
+
+        # al desconectarse el cliente, el servidor cancela la tarea que espera el siguiente evento
+        espera = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0.01)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(difusor.clientes(), 0)
+
+    async def test_rango_no_valido(self):
+        response = await self.async_client.get(reverse('eventos_disponibilidad'), {'desde': 'mañana'})
+        self.assertEqual(response.status_code, 400)
+
+
+class VistasAsincronasIntegrationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.client.login(username='12345678A', password='password123')
+        self.async_client.cookies = self.client.cookies
+        inicio = datetime.combine(localdate() + timedelta(days=1), time(10))
+        self.datos = {'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+                      'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+
+    async def test_crear_modificar_y_eliminar(self):
+        response = await self.async_client.post(reverse('crear_reserva'), data=self.datos,
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        reserva_id = response.json()['id']
+
+        response = await self.async_client.put(reverse('modificar_reserva', args=[reserva_id]),
+                                               data={'espacio': 'Fútbol'}, content_type='application/json')
+        self.assertEqual(response.json()['espacio'], 'Fútbol')
+
+        response = await self.async_client.delete(reverse('eliminar_reserva', args=[reserva_id]))
+        self.assertEqual(response.json(), {"success": True})
+        self.assertFalse(await Reserva.objects.filter(id=reserva_id).aexists())
+
+    async def test_franja_ocupada_sin_transaccion(self):
+        await self.async_client.post(reverse('crear_reserva'), data=self.datos, content_type='application/json')
+        with mock.patch('gestion_reservas.views.acrear_reserva') as acrear_reserva:
+            response = await self.async_client.post(reverse('crear_reserva'), data=self.datos,
+                                                    content_type='application/json')
+        self.assertEqual(response.json(), {"error": "Ya existe una reserva en ese momento"})
+        acrear_reserva.assert_not_called()
+
+    async def test_reserva_ajena_o_inexistente(self):
+        response = await self.async_client.put(reverse('modificar_reserva', args=[999]),
+                                               data={'espacio': 'Fútbol'}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.delete(reverse('eliminar_reserva', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_pagina_de_reservas(self):
+        # la plantilla base consulta el usuario; no debe hacerlo de forma síncrona
+        response = await self.async_client.get(reverse('reservas'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No tienes reservas actualmente.')
+
+
+class MetricasVistasIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['metricas'].clear()
+        metricas.reiniciar()
+        self.user = User.objects.create_user(username='12345678A', password='password123', is_staff=True)
+        self.client.login(username='12345678A', password='password123')
+        self.async_client.cookies = self.client.cookies
+        inicio = datetime.combine(localdate() + timedelta(days=1), time(10))
+        self.datos = {'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+                      'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+
+    def test_consultas_por_vista(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('lista_reservas'))
+        esperadas = len(consultas)
+        datos = self.client.get(reverse('metricas_vistas')).json()
+        lista = datos['lista_reservas']
+        self.assertEqual(lista['peticiones'], 1)
+        self.assertEqual(lista['consultas']['max'], esperadas)
+        self.assertGreater(lista['latencia_ms']['max'], 0)
+
+    async def test_cuenta_las_consultas_de_las_vistas_async(self):
+        # las consultas de la transacción se hacen en el hilo de sync_to_async
+        await self.async_client.post(reverse('crear_reserva'), data=self.datos, content_type='application/json')
+        crear = resumen_metricas()['crear_reserva']
+        self.assertGreaterEqual(crear['consultas']['max'], 5)
+
+    def test_solo_personal(self):
+        User.objects.create_user(username='87654321B', password='password123')
+        self.client.login(username='87654321B', password='password123')
+        response = self.client.get(reverse('metricas_vistas'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_peticiones_lentas_al_log(self):
+        with self.settings(METRICAS_UMBRAL_LENTO_MS=0):
+            with self.assertLogs('gestion_reservas.metricas', 'WARNING') as logs:
+                self.client.get(reverse('reservas'))
+        self.assertIn('Petición lenta GET /reservas/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_comando(self):
+        self.client.get(reverse('reservas'))
+        salida = StringIO()
+        call_command('metricas_vistas', stdout=salida)
+        self.assertIn('reservas', salida.getvalue())
+
+
+class IntercambioReservasIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.otro = User.objects.create_user(username='87654321B', password='password123')
+        self.manana = make_aware(datetime.combine(localdate() + timedelta(days=1), time(10)))
+        for hora, user in enumerate([self.user, self.otro, self.user]):
+            inicio = self.manana + timedelta(hours=hora)
+            Reserva.objects.create(user_id=user, espacio_id='Padel', momento_inicio=inicio,
+                                   momento_fin=inicio + timedelta(hours=1))
+        Fianza.objects.create(user_id=self.user, cantidad=2)
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio.name, nombre)
+
+    def exportar_e_importar(self, formato):
+        fichero = self.ruta(f'reservas.{formato}')
+        call_command('exportar_reservas', formato=formato, salida=fichero, lote=2)
+        Reserva.objects.all().delete()
+        salida = StringIO()
+        call_command('importar_reservas', fichero, lote=2, stdout=salida, stderr=StringIO())
+        self.assertIn('3 reservas importadas', salida.getvalue())
+        self.assertEqual(
+            list(Reserva.objects.order_by('momento_inicio').values_list('user_id__username', flat=True)),
+            ['12345678A', '87654321B', '12345678A'],
+        )
+
+    def test_exportar_e_importar_csv(self):
+        self.exportar_e_importar('csv')
+
+    def test_exportar_e_importar_jsonl(self):
+        self.exportar_e_importar('jsonl')
+
+    def test_importar_descarta_conflictos_y_filas_no_validas(self):
+        inicio = self.manana + timedelta(hours=5)
+        filas = [
+            # ya ocupada
+            {'usuario': '12345678A', 'espacio': 'Padel', 'momento_inicio': self.manana.isoformat(),
+             'momento_fin': (self.manana + timedelta(hours=1)).isoformat()},
+            {'usuario': '12345678A', 'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+             'momento_fin': (inicio + timedelta(hours=1)).isoformat()},
+            # repetida dentro del mismo fichero
+            {'usuario': '87654321B', 'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+             'momento_fin': (inicio + timedelta(hours=1)).isoformat()},
+            {'usuario': 'nadie', 'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+             'momento_fin': (inicio + timedelta(hours=1)).isoformat()},
+            {'usuario': '12345678A', 'espacio': 'Padel', 'momento_inicio': inicio.isoformat(),
+             'momento_fin': (inicio + timedelta(hours=2)).isoformat()},
+        ]
+        fichero = self.ruta('reservas.jsonl')
+        with open(fichero, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(fila) + '\n' for fila in filas)
+            f.write('{no es json\n')
+            # JSON válido pero no una fila
+            f.write('[1, 2]\n"x"\n')
+        salida, errores = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importar_reservas', fichero, lote=2, stdout=salida, stderr=errores)
+        self.assertIn('1 reservas importadas, 0 actualizadas, 7 descartadas', salida.getvalue())
+        self.assertEqual(errores.getvalue().count('Ya existe una reserva'), 2)
+        self.assertIn('Línea 4: El usuario nadie no existe', errores.getvalue())
+        self.assertIn('Línea 6: JSON no válido', errores.getvalue())
+        self.assertIn('Línea 7: Cada línea tiene que ser un objeto JSON', errores.getvalue())
+        self.assertIn('Línea 8: Cada línea tiene que ser un objeto JSON', errores.getvalue())
+        self.assertTrue(Reserva.objects.filter(espacio='Padel', momento_inicio=inicio, user_id=self.user).exists())
+
+    def test_importar_invalida_la_disponibilidad(self):
+        dia = localdate() + timedelta(days=1)
+        parametros = {'desde': dia.isoformat(), 'hasta': dia.isoformat(), 'espacio': 'Padel'}
+        self.client.force_login(self.user)
+        self.client.get(reverse('disponibilidad'), parametros)
+        inicio = self.manana + timedelta(hours=5)
+        fichero = self.ruta('reservas.csv')
+        with open(fichero, 'w', encoding='utf-8', newline='') as f:
+            f.write('usuario,espacio,momento_inicio,momento_fin\n')
+            f.write(f'12345678A,Padel,{inicio.isoformat()},{(inicio + timedelta(hours=1)).isoformat()}\n')
+        call_command('importar_reservas', fichero, stdout=StringIO())
+        datos = self.client.get(reverse('disponibilidad'), parametros).json()
+        self.assertEqual(datos['espacios']['Padel'][dia.isoformat()][15], '1')
+
+    def test_importar_fianzas(self):
+        fichero = self.ruta('fianzas.csv')
+        with open(fichero, 'w', encoding='utf-8', newline='') as f:
+            f.write('usuario,cantidad\n12345678A,6\n87654321B,2\n87654321B,x\n')
+        salida = StringIO()
+        call_command('importar_reservas', fichero, fianzas=True, stdout=salida, stderr=StringIO())
+        self.assertIn('1 fianzas importadas, 1 actualizadas, 1 descartadas', salida.getvalue())
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'cantidad')),
+                         {'12345678A': 6, '87654321B': 2})
+
+    def test_importar_reservas_y_despues_fianzas(self):
+        # 87654321B no tiene fianza: la crea la importación de fianzas, después de sus reservas
+        reservas = self.ruta('reservas.csv')
+        with open(reservas, 'w', encoding='utf-8', newline='') as f:
+            f.write('usuario,espacio,momento_inicio,momento_fin\n')
+            for hora in (5, 6):
+                inicio = self.manana + timedelta(hours=hora)
+                f.write(f'87654321B,Padel,{inicio.isoformat()},{(inicio + timedelta(hours=1)).isoformat()}\n')
+        call_command('importar_reservas', reservas, stdout=StringIO())
+        fianzas = self.ruta('fianzas.csv')
+        with open(fianzas, 'w', encoding='utf-8', newline='') as f:
+            f.write('usuario,cantidad\n87654321B,6\n')
+        call_command('importar_reservas', fianzas, fianzas=True, stdout=StringIO())
+        self.assertEqual(Fianza.objects.get(user_id=self.otro).reservas, 3)
+
+    def test_exportar_por_lotes(self):
+        with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True,
+                        side_effect=lambda qs, chunk_size=None: iter(list(qs))) as iterator:
+            call_command('exportar_reservas', lote=500, stdout=StringIO())
+        self.assertEqual(iterator.call_args.kwargs['chunk_size'], 500)
+
+    def test_accion_de_admin(self):
+        User.objects.create_superuser(username='admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        ids = list(Reserva.objects.filter(user_id=self.user).values_list('id', flat=True))
+        response = self.client.post(reverse('admin:gestion_reservas_reserva_changelist'),
+                                    {'action': 'exportar_csv', '_selected_action': ids})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'usuario,espacio,momento_inicio,momento_fin')
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(all(linea.startswith('12345678A,Padel,') for linea in lineas[1:]))
+
+
+class ArchivarReservasIntegrationTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.otro = User.objects.create_user(username='87654321B', password='password123')
+        ayer = make_aware(datetime.combine(localdate() - timedelta(days=1), time(10)))
+        self.pasadas = [self.reserva(self.user, ayer), self.reserva(self.user, ayer + timedelta(hours=1)),
+                        self.reserva(self.otro, ayer, espacio='Baloncesto')]
+        self.futura = self.reserva(self.user, ayer + timedelta(days=2))
+        regla = ReservaRecurrente.objects.create(user_id=self.otro, espacio_id='Fútbol', hora_inicio=time(10),
+                                                 fecha_inicio=ayer.date(), fecha_fin=ayer.date())
+        self.ocurrencia = self.reserva(self.otro, ayer, espacio='Fútbol', recurrencia=regla)
+        LineaReserva.objects.create(reserva=self.pasadas[0])
+        Fianza.objects.create(user_id=self.user, cantidad=6, reservas=3)
+        Fianza.objects.create(user_id=self.otro, cantidad=2, reservas=1)
+
+    def reserva(self, user, inicio, espacio='Padel', recurrencia=None):
+        return Reserva.objects.create(user_id=user, espacio_id=espacio, momento_inicio=inicio,
+                                      momento_fin=inicio + timedelta(hours=1), recurrencia=recurrencia)
+
+    def test_archiva_las_pasadas_y_devuelve_la_fianza(self):
+        salida = StringIO()
+        call_command('archivar_reservas', lote=2, stdout=salida)
+        self.assertIn('4 reservas archivadas', salida.getvalue())
+        self.assertEqual(list(Reserva.objects.values_list('id', flat=True)), [self.futura.id])
+        archivadas = ReservaArchivada.objects.in_bulk()
+        self.assertEqual(set(archivadas), {r.id for r in [*self.pasadas, self.ocurrencia]})
+        self.assertEqual(archivadas[self.ocurrencia.id].recurrencia_id, self.ocurrencia.recurrencia_id)
+        self.assertEqual(archivadas[self.pasadas[0].id].created_at, self.pasadas[0].created_at)
+        # la ocurrencia de la regla no había cobrado fianza
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'cantidad')),
+                         {'12345678A': 2, '87654321B': 0})
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'reservas')),
+                         {'12345678A': 1, '87654321B': 0})
+        self.assertFalse(LineaReserva.objects.exists())
+
+    def test_la_fianza_no_baja_de_cero(self):
+        # reservas sin fianza cobrada (anteriores a la fianza o importadas)
+        Fianza.objects.filter(user_id=self.user).update(cantidad=2, reservas=1)
+        Fianza.objects.filter(user_id=self.otro).update(cantidad=0, reservas=0)
+        call_command('archivar_reservas', stdout=StringIO())
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'cantidad')),
+                         {'12345678A': 0, '87654321B': 0})
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'reservas')),
+                         {'12345678A': 0, '87654321B': 0})
+
+    def test_invalida_y_avisa_una_vez_por_lote(self):
+        with mock.patch('gestion_reservas.retencion.invalidar_ocupacion') as invalidar, \
+                mock.patch('gestion_reservas.signals.invalidar_ocupacion') as por_reserva:
+            call_command('archivar_reservas', lote=10, stdout=StringIO())
+        por_reserva.assert_not_called()
+        invalidar.assert_called_once()
+        self.assertEqual(len(invalidar.call_args.args), 4)
+
+    def test_consultas_por_lote(self):
+        # por lote: lectura, archivo, fianzas por cantidad, y el borrado (reservas a borrar, líneas
+        # en cascada y reservas), más el savepoint de la transacción (dentro del test); la última
+        # vuelta solo lee
+        with self.assertNumQueries(2 * 8 + 3):
+            call_command('archivar_reservas', lote=2, stdout=StringIO())
+
+    def test_dias_y_purga(self):
+        call_command('archivar_reservas', dias=3, stdout=StringIO())
+        self.assertFalse(ReservaArchivada.objects.exists())
+        call_command('archivar_reservas', stdout=StringIO())
+        salida = StringIO()
+        call_command('archivar_reservas', purgar=0, stdout=salida)
+        self.assertIn('4 reservas borradas del archivo', salida.getvalue())
+        self.assertFalse(ReservaArchivada.objects.exists())
+
+
+class ReconciliarReservasIntegrationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.otro = User.objects.create_user(username='87654321B', password='password123')
+        inicio = make_aware(datetime.combine(localdate() + timedelta(days=1), time(10)))
+        for hora in range(2):
+            Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=inicio + timedelta(hours=hora),
+                                   momento_fin=inicio + timedelta(hours=hora + 1))
+        Fianza.objects.create(user_id=self.user, cantidad=4, reservas=2)
+        Fianza.objects.create(user_id=self.otro, cantidad=0, reservas=0)
+
+    def test_todo_cuadra(self):
+        salida = StringIO()
+        call_command('reconciliar_reservas', stdout=salida)
+        self.assertIn('Todos los contadores cuadran', salida.getvalue())
+
+    def test_detecta_y_corrige(self):
+        Fianza.objects.filter(user_id=self.user).update(reservas=5)
+        Fianza.objects.filter(user_id=self.otro).update(reservas=-1)
+        salida = StringIO()
+        call_command('reconciliar_reservas', stdout=salida)
+        self.assertIn('12345678A: 5 en la fianza, 2 reales', salida.getvalue())
+        self.assertIn('87654321B: -1 en la fianza, 0 reales', salida.getvalue())
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, 5)
+
+        salida = StringIO()
+        call_command('reconciliar_reservas', corregir=True, stdout=salida)
+        self.assertIn('2 contadores corregidos', salida.getvalue())
+        self.assertEqual(dict(Fianza.objects.values_list('user_id__username', 'reservas')),
+                         {'12345678A': 2, '87654321B': 0})
+
+    def test_importar_suma_al_contador(self):
+        inicio = make_aware(datetime.combine(localdate() + timedelta(days=2), time(10)))
+        fichero = os.path.join(tempfile.mkdtemp(), 'reservas.csv')
+        with open(fichero, 'w', encoding='utf-8', newline='') as f:
+            f.write('usuario,espacio,momento_inicio,momento_fin\n')
+            f.write(f'87654321B,Padel,{inicio.isoformat()},{(inicio + timedelta(hours=1)).isoformat()}\n')
+        call_command('importar_reservas', fichero, stdout=StringIO())
+        self.assertEqual(Fianza.objects.get(user_id=self.otro).reservas, 1)
+        salida = StringIO()
+        call_command('reconciliar_reservas', stdout=salida)
+        self.assertIn('Todos los contadores cuadran', salida.getvalue())
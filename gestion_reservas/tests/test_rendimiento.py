@@ -0,0 +1,177 @@
+"""Presupuesto de consultas SQL de las vistas de reservas.
+
+Cada test fija el número exacto de consultas de una vista sobre una base de datos con
+miles de usuarios y reservas, de modo que un N+1 o una validación de más rompe el test.
+Si un cambio necesita de verdad otra consulta, hay que actualizar aquí el número.
+"""
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Max
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate, make_aware
+
+from gestion_pistas.catalogo import pistas
+from gestion_reservas.models import Fianza, Reserva
+
+USUARIOS = 2000
+RESERVAS = 5000
+RESERVAS_PROPIAS = 2
+
+
+class VistasReservasRendimientoTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('password123')
+        User.objects.bulk_create(
+            [User(username=f'{i:08d}X', password=password) for i in range(USUARIOS)], batch_size=500
+        )
+        usuarios = list(User.objects.values_list('id', flat=True))
+        # reservas repartidas entre usuarios, espacios y las horas de los próximos días
+        manana = make_aware(datetime.combine(localdate() + timedelta(days=1), time.min))
+        espacios = list(pistas())
+        reservas = []
+        for i in range(RESERVAS):
+            inicio = manana + timedelta(hours=i // len(espacios))
+            reservas.append(Reserva(user_id_id=usuarios[i % len(usuarios)], espacio_id=espacios[i % len(espacios)],
+                                    momento_inicio=inicio, momento_fin=inicio + timedelta(hours=1)))
+        Reserva.objects.bulk_create(reservas, batch_size=500)
+        Fianza.objects.bulk_create([Fianza(user_id_id=id, cantidad=2) for id in usuarios], batch_size=500)
+
+        cls.user = User.objects.create_user(username='12345678A', password='password123')
+        cls.dia = localdate() + timedelta(days=RESERVAS // len(espacios) // 24 + 2)
+        cls.propias = [
+            Reserva.objects.create(user_id=cls.user, espacio_id='Padel',
+                                   momento_inicio=cls.momento(hora), momento_fin=cls.momento(hora + 1))
+            for hora in range(10, 10 + RESERVAS_PROPIAS)
+        ]
+        Fianza.objects.create(user_id=cls.user, cantidad=0, reservas=RESERVAS_PROPIAS)
+
+    @classmethod
+    def momento(cls, hora):
+        return make_aware(datetime.combine(cls.dia, time(hora)))
+
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.client.force_login(self.user)
+
+    def datos(self, hora, espacio='Padel'):
+        inicio = datetime.combine(self.dia, time(hora))
+        return {'espacio': espacio, 'momento_inicio': inicio.isoformat(),
+                'momento_fin': (inicio + timedelta(hours=1)).isoformat()}
+
+    def test_pagina_de_reservas(self):
+        # sesión, usuario y reservas del usuario
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('reservas'))
+        self.assertEqual(len(response.context['reservas']), RESERVAS_PROPIAS)
+
+    def test_lista_de_reservas(self):
+        # sesión, usuario, página; con since además los ids vigentes
+        with self.assertNumQueries(3):
+            self.client.get(reverse('lista_reservas'))
+        with self.assertNumQueries(4):
+            self.client.get(reverse('lista_reservas'), {'since': '2000-01-01T00:00:00+00:00'})
+
+    def test_crear_reserva(self):
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('crear_reserva'), data=self.datos(15),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_crear_reserva_en_franja_ocupada(self):
+        # se rechaza antes de abrir la transacción
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('crear_reserva'), data=self.datos(10),
+                                        content_type='application/json')
+        self.assertIn('error', response.json())
+
+    def test_modificar_reserva(self):
+        with self.assertNumQueries(8):
+            response = self.client.put(reverse('modificar_reserva', args=[self.propias[0].id]),
+                                       data=self.datos(16), content_type='application/json')
+        self.assertNotIn('error', response.json())
+
+    def test_eliminar_reserva(self):
+        with self.assertNumQueries(8):
+            self.client.delete(reverse('eliminar_reserva', args=[self.propias[0].id]))
+
+    def test_lote_de_reservas(self):
+        # el número de consultas no depende del tamaño del lote (incluye el savepoint de la escritura)
+        def lote(eliminar, horas):
+            operaciones = [{'accion': 'eliminar', 'id': id} for id in eliminar]
+            operaciones += [{'accion': 'crear', **self.datos(hora)} for hora in horas]
+            with self.assertNumQueries(15):
+                response = self.client.post(reverse('lote_reservas'), data={'operaciones': operaciones},
+                                            content_type='application/json')
+            resultados = response.json()['resultados']
+            self.assertTrue(all('id' in resultado for resultado in resultados))
+            return [resultado['id'] for resultado in resultados[len(eliminar):]]
+
+        creadas = lote([self.propias[0].id], [15, 16])
+        lote([self.propias[1].id, *creadas], [17, 18])
+
+    def test_disponibilidad(self):
+        parametros = {'desde': localdate().isoformat(),
+                      'hasta': (localdate() + timedelta(days=30)).isoformat()}
+        # una consulta de reservas y otra de reglas recurrentes para todo el rango
+        with self.assertNumQueries(2):
+            self.client.get(reverse('disponibilidad'), parametros)
+        # después sale de la caché
+        with self.assertNumQueries(0):
+            self.client.get(reverse('disponibilidad'), parametros)
+
+
+class AdminReservasRendimientoTestCase(TestCase):
+    # con el límite de recuento bajo, las 5000 reservas cuentan como una tabla grande
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([User(username=f'{i:08d}X') for i in range(300)])
+        usuarios = list(User.objects.values_list('id', flat=True))
+        manana = make_aware(datetime.combine(localdate() + timedelta(days=1), time.min))
+        espacios = list(pistas())
+        Reserva.objects.bulk_create([
+            Reserva(user_id_id=usuarios[i % len(usuarios)], espacio_id=espacios[i % len(espacios)],
+                    momento_inicio=manana + timedelta(hours=i // len(espacios)),
+                    momento_fin=manana + timedelta(hours=i // len(espacios) + 1))
+            for i in range(1000)
+        ])
+        Fianza.objects.bulk_create([Fianza(user_id_id=id, cantidad=2) for id in usuarios])
+        cls.admin = User.objects.create_superuser(username='admin', password='password123')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        limite = mock.patch('gestion_reservas.paginacion.LIMITE_RECUENTO', 100)
+        limite.start()
+        self.addCleanup(limite.stop)
+
+    def listado(self, url, params=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params or {})
+        return response, len(consultas)
+
+    def test_listado_de_reservas(self):
+        # sesión, usuario, recuento acotado, id máximo y página con los usuarios en la misma consulta
+        response, consultas = self.listado(reverse('admin:gestion_reservas_reserva_changelist'))
+        self.assertEqual(consultas, 5)
+        self.assertEqual(response.context['cl'].result_count, Reserva.objects.aggregate(m=Max('id'))['m'])
+
+    def test_listado_de_reservas_filtrado(self):
+        # los filtros se cuentan enteros en lugar de estimarse
+        url = reverse('admin:gestion_reservas_reserva_changelist')
+        response, consultas = self.listado(url, {'espacio': 'Padel'})
+        self.assertEqual(consultas, 5)
+        self.assertEqual(response.context['cl'].result_count, 200)
+        response, consultas = self.listado(url, {'q': '00000001'})
+        self.assertEqual(consultas, 4)
+
+    def test_listado_de_fianzas(self):
+        response, consultas = self.listado(reverse('admin:gestion_reservas_fianza_changelist'))
+        self.assertEqual(consultas, 5)
+        self.assertContains(response, '00000000X')
@@ -1,10 +1,23 @@
+import asyncio
 import json
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
-from django.utils.timezone import make_aware
-from datetime import datetime
-from gestion_reservas.models import  Reserva
+from django.utils.timezone import make_aware, now, localdate
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from datetime import datetime, time, timedelta
+from gestion_pistas.catalogo import cambiar_version
+from gestion_pistas.models import Cierre, Pista
+from gestion_reservas.models import  Reserva, Fianza, ReservaRecurrente, Frecuencia
+from gestion_reservas.disponibilidad import calcular_ocupacion
+from gestion_reservas.recurrencias import materializar
+from gestion_reservas.metricas import Histograma
+from gestion_reservas.eventos import Difusor, difusor, LIBRE, OCUPADA, REINICIO, TAMANO_COLA
+from gestion_reservas.services import MAX_RESERVAS, ReservaError, crear_reserva, eliminar_reserva, reintentar_si_bloqueada
 
 class ReservaViewTestCase(TestCase):
     def set_up(self):
@@ -22,7 +35,7 @@ class ReservaViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(Reserva.objects.filter(user_id=self.user).exists())
         reserva = Reserva.objects.get(user_id=self.user)
-        self.assertEqual(reserva.espacio, self.espacio)
+        self.assertEqual(reserva.espacio_id, self.espacio)
         self.assertEqual(reserva.momento_inicio, make_aware(datetime(2024, 1, 1, 14, 0)))
         self.assertEqual(reserva.momento_fin, make_aware(datetime(2024, 1, 1, 15, 0)))
 
@@ -51,4 +64,381 @@ class ReservaViewTestCase(TestCase):
             'espacio': 'Baloncesto'
         }), content_type='application/json')
         self.assertEqual(response.status_code, 400)
-        self.assertIn('La reserva tiene que ser en el futuro', response.json()['error'])
\ No newline at end of file
+        self.assertIn('La reserva tiene que ser en el futuro', response.json()['error'])
+
+class FranjaUnicaTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.otro = User.objects.create_user(username='87654321B', password='password123')
+        self.client.login(username='12345678A', password='password123')
+        self.inicio = (now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def post_reserva(self, espacio='Padel', inicio=None):
+        inicio = inicio or self.inicio
+        return self.client.post(reverse('crear_reserva'), data=json.dumps({
+            'momento_inicio': inicio.replace(tzinfo=None).isoformat(),
+            'momento_fin': (inicio + timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+            'espacio': espacio,
+        }), content_type='application/json')
+
+    def test_franja_ocupada_devuelve_error(self):
+        Reserva.objects.create(user_id=self.otro, espacio_id='Padel', momento_inicio=self.inicio,
+                               momento_fin=self.inicio + timedelta(hours=1))
+        response = self.post_reserva()
+        self.assertEqual(response.json()['error'], 'Ya existe una reserva en ese momento')
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_otro_espacio_misma_hora_permitido(self):
+        Reserva.objects.create(user_id=self.otro, espacio_id='Padel', momento_inicio=self.inicio,
+                               momento_fin=self.inicio + timedelta(hours=1))
+        response = self.post_reserva(espacio='Baloncesto')
+        self.assertEqual(response.status_code, 201)
+
+    def test_indice_unico_impide_doble_reserva(self):
+        Reserva.objects.create(user_id=self.otro, espacio_id='Padel', momento_inicio=self.inicio,
+                               momento_fin=self.inicio + timedelta(hours=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=self.inicio,
+                                   momento_fin=self.inicio + timedelta(hours=1))
+
+    def test_modificar_solo_espacio_no_choca_consigo_misma(self):
+        reserva = Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=self.inicio,
+                                         momento_fin=self.inicio + timedelta(hours=1))
+        response = self.client.put(reverse('modificar_reserva', args=[reserva.id]),
+                                   data=json.dumps({'espacio': 'Baloncesto'}), content_type='application/json')
+        self.assertNotIn('error', response.json())
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.espacio_id, 'Baloncesto')
+
+
+class ServicioReservasTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.inicio = (now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.fin = self.inicio + timedelta(hours=1)
+
+    def test_crear_reserva_cobra_fianza(self):
+        crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        crear_reserva(self.user, 'Baloncesto', self.inicio, self.fin)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 4)
+
+    def test_crear_reserva_fianza_maxima(self):
+        Fianza.objects.create(user_id=self.user, cantidad=10)
+        with self.assertRaisesMessage(ReservaError, 'Tu fianza es igual o mayor a 10 euros'):
+            crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_franja_ocupada_no_cobra_fianza(self):
+        crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        with self.assertRaisesMessage(ReservaError, 'Ya existe una reserva en ese momento'):
+            crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 2)
+
+    def test_eliminar_reserva_devuelve_fianza(self):
+        reserva = crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        eliminar_reserva(self.user, reserva.id)
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(Fianza.objects.get(user_id=self.user).cantidad, 0)
+
+    def test_eliminar_reserva_sin_fianza_no_la_deja_negativa(self):
+        reserva = Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=self.inicio,
+                                         momento_fin=self.fin)
+        eliminar_reserva(self.user, reserva.id)
+        self.assertFalse(Fianza.objects.exists())
+        # reserva anterior a la fianza: el contador baja, la cantidad se queda en 0
+        Fianza.objects.create(user_id=self.user, cantidad=0, reservas=1)
+        reserva = Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=self.inicio,
+                                         momento_fin=self.fin)
+        eliminar_reserva(self.user, reserva.id)
+        fianza = Fianza.objects.get(user_id=self.user)
+        self.assertEqual((fianza.cantidad, fianza.reservas), (0, 0))
+        reserva = Reserva.objects.create(user_id=self.user, espacio_id='Padel', momento_inicio=self.inicio,
+                                         momento_fin=self.fin)
+        eliminar_reserva(self.user, reserva.id)
+        fianza.refresh_from_db()
+        self.assertEqual((fianza.cantidad, fianza.reservas), (0, 0))
+
+    def test_contador_de_reservas(self):
+        reservas = [crear_reserva(self.user, 'Padel', self.inicio + timedelta(hours=h), self.fin + timedelta(hours=h))
+                    for h in range(MAX_RESERVAS)]
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, MAX_RESERVAS)
+        with self.assertRaisesMessage(ReservaError, f'No puedes tener más de {MAX_RESERVAS} reservas'):
+            crear_reserva(self.user, 'Baloncesto', self.inicio, self.fin)
+        eliminar_reserva(self.user, reservas[0].id)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, MAX_RESERVAS - 1)
+
+    def test_contador_de_usuario_sin_fianza(self):
+        # reservas anteriores al contador, sin fila de fianza
+        Reserva.objects.create(user_id=self.user, espacio_id='Baloncesto', momento_inicio=self.inicio, momento_fin=self.fin)
+        crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        self.assertEqual(Fianza.objects.get(user_id=self.user).reservas, 2)
+
+    def test_limite_con_una_sola_consulta_de_fianza(self):
+        Fianza.objects.create(user_id=self.user, reservas=MAX_RESERVAS)
+        with CaptureQueriesContext(connection) as consultas:
+            with self.assertRaises(ReservaError):
+                crear_reserva(self.user, 'Padel', self.inicio, self.fin)
+        self.assertFalse(any('COUNT' in consulta['sql'] for consulta in consultas.captured_queries))
+
+    def test_eliminar_reserva_ajena(self):
+        otro = User.objects.create_user(username='87654321B', password='password123')
+        reserva = crear_reserva(otro, 'Padel', self.inicio, self.fin)
+        with self.assertRaises(Reserva.DoesNotExist):
+            eliminar_reserva(self.user, reserva.id)
+        self.assertTrue(Reserva.objects.exists())
+
+    def test_reintenta_si_la_base_de_datos_esta_bloqueada(self):
+        llamadas = []
+
+        @reintentar_si_bloqueada
+        def operacion():
+            llamadas.append(1)
+            if len(llamadas) < 2:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        # fuera del atomic del TestCase, como en una petición real
+        with mock.patch('gestion_reservas.services.transaction.get_connection') as conexion, \
+                mock.patch('gestion_reservas.services.time.sleep'):
+            conexion.return_value.in_atomic_block = False
+            self.assertEqual(operacion(), 'ok')
+        self.assertEqual(len(llamadas), 2)
+
+    def test_no_reintenta_otros_errores(self):
+        @reintentar_si_bloqueada
+        def operacion():
+            raise OperationalError('no such table: reservas')
+
+        with self.assertRaises(OperationalError):
+            operacion()
+
+
+class ReservaRecurrenteTestCase(TestCase):
+    def setUp(self):
+        caches['disponibilidad'].clear()
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.otro = User.objects.create_user(username='87654321B', password='password123')
+        # un martes de la semana que viene
+        hoy = localdate()
+        self.martes = hoy + timedelta(days=(1 - hoy.weekday()) % 7 + 7)
+        self.regla = ReservaRecurrente.objects.create(
+            user_id=self.user, espacio_id='Fútbol', hora_inicio=time(19), frecuencia=Frecuencia.SEMANAL,
+            fecha_inicio=self.martes, fecha_fin=self.martes + timedelta(weeks=4),
+            excepciones=[(self.martes + timedelta(weeks=2)).isoformat()],
+        )
+        # ventana de materialización que solo alcanza la primera ocurrencia
+        self.ventana = (self.martes - hoy).days
+
+    def momento(self, dia, hora=19):
+        return make_aware(datetime.combine(dia, time(hora)))
+
+    def test_ocurrencias_semanales_con_excepcion(self):
+        dias = list(self.regla.dias())
+        self.assertEqual(dias, [self.martes + timedelta(weeks=n) for n in (0, 1, 3, 4)])
+        inicio, fin = next(self.regla.ocurrencias())
+        self.assertEqual(inicio, self.momento(self.martes))
+        self.assertEqual(fin - inicio, timedelta(hours=1))
+
+    def test_ocurrencias_son_perezosas_y_respetan_el_rango(self):
+        desde = self.martes + timedelta(days=1)
+        ocurrencias = self.regla.ocurrencias(desde, desde + timedelta(days=7))
+        self.assertEqual(next(ocurrencias)[0], self.momento(self.martes + timedelta(weeks=1)))
+        self.assertEqual(list(ocurrencias), [])
+
+    def test_intervalo(self):
+        self.regla.intervalo = 2
+        self.assertTrue(self.regla.ocurre_en(self.martes + timedelta(weeks=4)))
+        self.assertFalse(self.regla.ocurre_en(self.martes + timedelta(weeks=1)))
+
+    def test_regla_ocupa_la_franja(self):
+        with self.assertRaisesMessage(ReservaError, 'Ya existe una reserva en ese momento'):
+            crear_reserva(self.otro, 'Fútbol', self.momento(self.martes), self.momento(self.martes, 20))
+        # la excepción queda libre
+        excepcion = self.martes + timedelta(weeks=2)
+        crear_reserva(self.otro, 'Fútbol', self.momento(excepcion), self.momento(excepcion, 20))
+
+    def test_clean_detecta_conflictos(self):
+        dia = self.martes + timedelta(weeks=1)
+        regla = ReservaRecurrente(user_id=self.otro, espacio_id='Fútbol', hora_inicio=time(19),
+                                  frecuencia=Frecuencia.DIARIA, fecha_inicio=dia - timedelta(days=3),
+                                  fecha_fin=dia + timedelta(days=3))
+        with self.assertRaises(ValidationError):
+            regla.full_clean()
+        regla.hora_inicio = time(18)
+        regla.full_clean()
+        Reserva.objects.create(user_id=self.user, espacio_id='Fútbol', momento_inicio=self.momento(dia, 18),
+                               momento_fin=self.momento(dia, 19))
+        with self.assertRaises(ValidationError):
+            regla.full_clean()
+
+    def test_clean_respeta_el_horario(self):
+        dia = self.martes + timedelta(weeks=1)
+        Cierre.objects.create(pista=Pista.objects.get(name='Fútbol'), inicio=self.momento(dia, 18),
+                              fin=self.momento(dia, 20), motivo='Mantenimiento')
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+        regla = ReservaRecurrente(user_id=self.otro, espacio_id='Fútbol', hora_inicio=time(18),
+                                  frecuencia=Frecuencia.DIARIA, fecha_inicio=dia - timedelta(days=3),
+                                  fecha_fin=dia + timedelta(days=3))
+        with self.assertRaisesMessage(ValidationError, 'La pista está cerrada: Mantenimiento'):
+            regla.full_clean()
+        regla.fecha_fin = dia - timedelta(days=1)
+        regla.full_clean()
+
+    def test_clean_admite_reglas_mientras_queden_plazas(self):
+        Pista.objects.filter(name='Fútbol').update(capacidad=2)
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+        regla = ReservaRecurrente(user_id=self.otro, espacio_id='Fútbol', hora_inicio=time(19),
+                                  frecuencia=Frecuencia.SEMANAL, fecha_inicio=self.martes,
+                                  fecha_fin=self.martes + timedelta(weeks=1))
+        # la otra plaza la ocupa self.regla
+        regla.full_clean()
+        Reserva.objects.create(user_id=self.user, espacio_id='Fútbol', momento_inicio=self.momento(self.martes),
+                               momento_fin=self.momento(self.martes, 20), plaza=1)
+        with self.assertRaisesMessage(ValidationError, 'Coincide con'):
+            regla.full_clean()
+
+    def test_materializar_respeta_los_cierres(self):
+        Cierre.objects.create(pista=Pista.objects.get(name='Fútbol'), inicio=self.momento(self.martes),
+                              fin=self.momento(self.martes, 20))
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+        self.assertEqual(materializar(dias=self.ventana), 0)
+
+    def test_disponibilidad_incluye_ocurrencias(self):
+        ocupacion = calcular_ocupacion(['Fútbol'], [self.martes, self.martes + timedelta(weeks=2)])
+        self.assertEqual(ocupacion[('Fútbol', self.martes)][19], '1')
+        self.assertEqual(ocupacion[('Fútbol', self.martes + timedelta(weeks=2))], '0' * 24)
+
+    def test_materializar_es_idempotente(self):
+        self.assertEqual(materializar(dias=self.ventana), 1)
+        self.assertEqual(materializar(dias=self.ventana), 0)
+        reserva = Reserva.objects.get(recurrencia=self.regla)
+        self.assertEqual(reserva.momento_inicio, self.momento(self.martes))
+        self.assertFalse(Fianza.objects.filter(user_id=self.user).exists())
+
+    def test_ocurrencia_ocupa_una_plaza(self):
+        Pista.objects.filter(name='Fútbol').update(capacidad=2)
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+        # la ocurrencia aún sin materializar ocupa la otra plaza
+        crear_reserva(self.otro, 'Fútbol', self.momento(self.martes), self.momento(self.martes, 20))
+        self.assertEqual(calcular_ocupacion(['Fútbol'], [self.martes])[('Fútbol', self.martes)][19], '1')
+        with self.assertRaises(ReservaError):
+            crear_reserva(self.otro, 'Fútbol', self.momento(self.martes), self.momento(self.martes, 20))
+        self.assertEqual(materializar(dias=self.ventana), 1)
+        self.assertEqual(Reserva.objects.get(recurrencia=self.regla).plaza, 1)
+        self.assertEqual(calcular_ocupacion(['Fútbol'], [self.martes])[('Fútbol', self.martes)][19], '1')
+
+    def test_cancelar_ocurrencia_materializada(self):
+        materializar(dias=self.ventana)
+        reserva = Reserva.objects.get(recurrencia=self.regla)
+        eliminar_reserva(self.user, reserva.id)
+        self.regla.refresh_from_db()
+        self.assertIn(self.martes.isoformat(), self.regla.excepciones)
+        self.assertFalse(Fianza.objects.filter(user_id=self.user).exists())
+        self.assertEqual(materializar(dias=self.ventana), 0)
+
+
+class DifusorTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='12345678A', password='password123')
+        self.dia = localdate() + timedelta(days=1)
+        self.inicio = make_aware(datetime.combine(self.dia, time(10)))
+
+    def test_solo_reciben_los_suscritos_a_la_franja(self):
+        async def escenario():
+            hub = Difusor()
+            padel = hub.suscribir([('Padel', self.dia)])
+            futbol = hub.suscribir([('Fútbol', self.dia)])
+            hub.publicar('Padel', self.dia, {"tipo": OCUPADA, "hora": 10})
+            evento = await padel.siguiente(1)
+            ninguno = await futbol.siguiente(0.01)
+            hub.cancelar(padel)
+            hub.cancelar(futbol)
+            return evento, ninguno, hub.clientes()
+
+        evento, ninguno, clientes = asyncio.run(escenario())
+        self.assertEqual(evento["tipo"], OCUPADA)
+        self.assertIsNone(ninguno)
+        self.assertEqual(clientes, 0)
+
+    def test_cola_llena_pide_reinicio(self):
+        async def escenario():
+            hub = Difusor()
+            suscripcion = hub.suscribir([('Padel', self.dia)])
+            for hora in range(TAMANO_COLA + 1):
+                hub.publicar('Padel', self.dia, {"tipo": OCUPADA, "hora": hora % 24})
+            await asyncio.sleep(0)
+            eventos = [await suscripcion.siguiente(1) for _ in range(TAMANO_COLA + 1)]
+            return [evento["tipo"] for evento in eventos]
+
+        tipos = asyncio.run(escenario())
+        self.assertEqual(tipos[:TAMANO_COLA], [OCUPADA] * TAMANO_COLA)
+        self.assertEqual(tipos[-1], REINICIO)
+
+    def test_reservas_publican_tras_el_commit(self):
+        with mock.patch.object(difusor, 'escuchando', return_value=True), \
+                mock.patch.object(difusor, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                reserva = crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+            publicar.assert_called_once_with('Padel', self.dia, {
+                "tipo": OCUPADA, "espacio": 'Padel', "dia": self.dia.isoformat(), "hora": 10, "libres": 0,
+            })
+
+            publicar.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                eliminar_reserva(self.user, reserva.id)
+            self.assertEqual(publicar.call_args.args[2]["tipo"], LIBRE)
+            self.assertEqual(publicar.call_args.args[2]["libres"], 1)
+
+    def test_con_capacidad_solo_se_ocupa_al_completarse(self):
+        Pista.objects.filter(name='Padel').update(capacidad=2)
+        cambiar_version()
+        self.addCleanup(cambiar_version)
+        otro = User.objects.create_user(username='87654321B', password='password123')
+        with mock.patch.object(difusor, 'escuchando', return_value=True), \
+                mock.patch.object(difusor, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+            self.assertEqual(publicar.call_args.args[2]["tipo"], LIBRE)
+            self.assertEqual(publicar.call_args.args[2]["libres"], 1)
+            self.assertEqual(calcular_ocupacion(['Padel'], [self.dia])[('Padel', self.dia)][10], '0')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                crear_reserva(otro, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+            self.assertEqual(publicar.call_args.args[2]["tipo"], OCUPADA)
+            self.assertEqual(publicar.call_args.args[2]["libres"], 0)
+
+    def test_sin_clientes_no_se_consulta_la_ocupacion(self):
+        with mock.patch.object(difusor, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+            publicar.assert_not_called()
+
+    def test_sin_commit_no_se_publica(self):
+        with mock.patch.object(difusor, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=False):
+                crear_reserva(self.user, 'Padel', self.inicio, self.inicio + timedelta(hours=1))
+            publicar.assert_not_called()
+
+
+class HistogramaTestCase(TestCase):
+    def test_percentiles_por_cubetas(self):
+        histograma = Histograma((1, 5, 10))
+        for valor in (0.5, 0.7, 3, 4, 8, 20):
+            histograma.anotar(valor)
+        self.assertEqual(histograma.cubetas, [2, 2, 1, 1])
+        self.assertEqual(histograma.percentil(50), 5)
+        self.assertEqual(histograma.percentil(99), 20)
+        self.assertEqual(histograma.resumen()["max"], 20)
+
+    def test_sumar_procesos(self):
+        a, b = Histograma((1, 5)), Histograma((1, 5))
+        a.anotar(1)
+        b.anotar(3)
+        a.sumar(Histograma.desde_dict(b.como_dict()))
+        self.assertEqual(a.cubetas, [1, 1, 0])
+        self.assertEqual(a.suma, 4)
+        self.assertIsNone(Histograma((1,)).percentil(50))
@@ -1,164 +1,281 @@
 # views.py
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from .models import Reserva, Espacio, Fianza
-from django.http import JsonResponse
-from django.utils.timezone import make_aware
-from datetime import datetime, timedelta
-from django.utils.timezone import now
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import Reserva
+from .services import (ReservaError, acrear_reserva, amodificar_reserva, aeliminar_reserva, procesar_lote,
+                       capacidad_franja, franja_completa, validar_franja)
+from .disponibilidad import obtener_ocupacion, dias_entre, estadisticas_cache
+from .eventos import difusor, formatear, REINICIO
+from .metricas import resumen_metricas
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.timezone import make_aware, localdate, localtime, now
+from django.utils.dateparse import parse_datetime
+from gestion_pistas.catalogo import ahorarios, apistas, pistas
+from home.imagenes import variantes
+from django.views.decorators.http import require_GET
+from datetime import datetime, date, timedelta
+import hashlib
 import json
 
+MAX_DIAS_DISPONIBILIDAD = 31
+# segundos sin eventos tras los que se manda un ping por el flujo de eventos
+ESPERA_EVENTOS = 15
+MAX_OPERACIONES_LOTE = 200
+LIMITE_LISTA = 20
+MAX_LIMITE_LISTA = 100
+
+@login_required
+async def reservas_view(request):
+    # el procesador de contexto 'auth' usaría request.user, que consulta la BD de forma
+    # síncrona; se sustituye por el usuario ya cargado
+    request.user = await request.auser()
+    # momento de referencia para pedir después solo los cambios a lista_reservas_view
+    momento = now().isoformat()
+    reservas = [reserva async for reserva in Reserva.objects.filter(user_id=request.user)]
+    # las opciones del formulario salen del catálogo en memoria, sin consultar la tabla pistas
+    disponibles = [pista for pista in (await apistas()).values() if pista.available]
+    return render(request, 'gestion_reservas.html', {'reservas': reservas, 'momento': momento, 'pistas': disponibles})
+
 @login_required
-def reservas_view(request):
+@require_GET
+def lista_reservas_view(request):
+    # ?cursor=<último id recibido>&limite=20 para paginar, ?since=<momento> para recibir solo
+    # las reservas cambiadas desde la última consulta (y los ids vigentes, para quitar las borradas)
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limite = min(int(request.GET.get('limite', LIMITE_LISTA)), MAX_LIMITE_LISTA)
+        since = parse_datetime(request.GET['since']) if request.GET.get('since') else None
+    except ValueError:
+        return JsonResponse({"error": "Parámetros no válidos"}, status=400)
+    if limite < 1 or (request.GET.get('since') and since is None):
+        return JsonResponse({"error": "Parámetros no válidos"}, status=400)
+
+    momento = now()
     reservas = Reserva.objects.filter(user_id=request.user)
-    return render(request, 'gestion_reservas.html', {'reservas': reservas})
+    data = {"momento": momento.isoformat()}
+    if since is not None:
+        data["ids"] = list(reservas.values_list('id', flat=True))
+        reservas = reservas.filter(updated_at__gte=since)
+    pagina = list(reservas.filter(id__gt=cursor).order_by('id')[:limite + 1])
+    data["siguiente"] = pagina[limite - 1].id if len(pagina) > limite else None
+    data["reservas"] = [reserva_json(reserva) for reserva in pagina[:limite]]
+    return JsonResponse(data)
+
+def reserva_json(reserva):
+    # las fechas van en la hora local, igual que en la plantilla
+    return {
+        "id": reserva.id,
+        "espacio": reserva.espacio_id,
+        "momento_inicio": localtime(reserva.momento_inicio).isoformat(),
+        "momento_fin": localtime(reserva.momento_fin).isoformat(),
+        **imagen_json(f'images/{reserva.espacio_id.lower()}.jpg'),
+    }
+
+def imagen_json(ruta):
+    # lo mismo que pinta {% imagen %} en la tarjeta, para que el JavaScript rellene la plantilla
+    datos = variantes(ruta)
+    return {"imagen": datos['src'], "imagen_srcset": datos['srcset'], "imagen_fuentes": datos['fuentes']}
 
 @login_required
-def crear_reserva_view(request):
+async def crear_reserva_view(request):
     # en el formulario hay que usar el formato '2024-01-01T14:00:00''
     data = json.loads(request.body)
     momento_inicio = data.get('momento_inicio')
     momento_fin = data.get('momento_fin')
-    espacio_str = data.get('espacio')
+    espacio = data.get('espacio')
 
-    espacio = evaluate(espacio_str)
     momento_inicio_naive = datetime.fromisoformat(momento_inicio)
     momento_fin_naive = datetime.fromisoformat(momento_fin)
 
     momento_inicio_aware = make_aware(momento_inicio_naive)
     momento_fin_aware = make_aware(momento_fin_naive)
 
-    created_at = now()
-
-    user = request.user
-
-    resultado_validacion = validate_post(user, momento_inicio_aware, momento_fin_aware, espacio)
-    if resultado_validacion is not None:
-        return resultado_validacion
-
-    reserva = Reserva.objects.create(
-        # user_id=request.user,
-        user_id=user,
-        momento_inicio=momento_inicio_aware,
-        momento_fin=momento_fin_aware,
-        espacio=espacio,
-        created_at=created_at
-    )
-
-    # aumentar la fianza del user en 2 euros (ya se ha hecho el evaluate_post por lo que el objeto Fianza existe y no hace falta usear el get_or_create):
-    fianza = Fianza.objects.get(user_id=user)
-    fianza.cantidad += 2
-    fianza.save()
+    user = await request.auser()
+    try:
+        validar_franja(momento_inicio_aware, momento_fin_aware)
+        horario = (await ahorarios()).get(espacio)
+        capacidad = capacidad_franja(horario, momento_inicio_aware)
+        # una franja ya completa se rechaza sin pasar por el hilo de las transacciones
+        if await Reserva.objects.filter(espacio=espacio, momento_inicio=momento_inicio_aware).acount() >= capacidad:
+            raise franja_completa(capacidad)
+        # validación, alta y cobro de la fianza en una sola transacción
+        reserva = await acrear_reserva(user, espacio, momento_inicio_aware, momento_fin_aware)
+    except ReservaError as e:
+        return JsonResponse({"error": str(e)})
 
     return JsonResponse({
         "id": reserva.id,
         "momento_inicio": reserva.momento_inicio,
         "momento_fin": reserva.momento_fin,
-        "espacio": reserva.espacio,
+        "espacio": reserva.espacio_id,
+        "precio": horario.pista.price,
         "created_at": reserva.created_at
     }, status=201)
 
 @login_required
-def modificar_reserva_view(request, reserva_id):
-    user = request.user
-    reserva = Reserva.objects.get(id=reserva_id, user_id=user)
+async def modificar_reserva_view(request, reserva_id):
     data = json.loads(request.body)
     momento_inicio = data.get('momento_inicio')
     if momento_inicio:
-        momento_inicio_naive = datetime.fromisoformat(momento_inicio)
-        momento_inicio_aware = make_aware(momento_inicio_naive)
-        reserva.momento_inicio = momento_inicio_aware
+        momento_inicio = make_aware(datetime.fromisoformat(momento_inicio))
     momento_fin = data.get('momento_fin')
     if momento_fin:
-        momento_fin_naive = datetime.fromisoformat(momento_fin)
-        momento_fin_aware = make_aware(momento_fin_naive)
-        reserva.momento_fin = momento_fin_aware
-    espacio_str = data.get('espacio')
-    if espacio_str:
-        reserva.espacio = evaluate(espacio_str)
-
-    resultado_validacion = validate_put(user, reserva, data)
-    if resultado_validacion is not None:
-        return resultado_validacion
-    reserva.save()
+        momento_fin = make_aware(datetime.fromisoformat(momento_fin))
+    espacio = data.get('espacio') or None
+
+    user = await request.auser()
+    if not await Reserva.objects.filter(id=reserva_id, user_id=user).aexists():
+        return JsonResponse({"error": "La reserva no existe"}, status=404)
+    try:
+        reserva = await amodificar_reserva(user, reserva_id, espacio, momento_inicio, momento_fin)
+    except ReservaError as e:
+        return JsonResponse({"error": str(e)})
+    except Reserva.DoesNotExist:
+        # borrada entre la comprobación y la transacción
+        return JsonResponse({"error": "La reserva no existe"}, status=404)
 
     return JsonResponse({
         "id": reserva.id,
         "momento_inicio": reserva.momento_inicio,
         "momento_fin": reserva.momento_fin,
-        "espacio": reserva.espacio
+        "espacio": reserva.espacio_id
     })
 
 @login_required
-def eliminar_reserva_view(request, reserva_id):
-    user = request.user
-    reserva = Reserva.objects.get(id=reserva_id, user_id=user)
-    reserva = Reserva.objects.get(id=reserva_id, user_id = user)
-    reserva.delete()
-    fianza = Fianza.objects.get_or_create(user_id=user)[0]
-    fianza.cantidad -= 2
-    fianza.save()
+async def eliminar_reserva_view(request, reserva_id):
+    user = await request.auser()
+    try:
+        await aeliminar_reserva(user, reserva_id)
+    except Reserva.DoesNotExist:
+        return JsonResponse({"error": "La reserva no existe"}, status=404)
     return JsonResponse({"success": True}, status=200)
 
-def evaluate(pista_str):
-    match pista_str:
-        case 'Baloncesto':
-            return Espacio.BALONCESTO
-        case 'Fútbol':
-            return Espacio.FUTBOL
-        case 'Padel':
-            return Espacio.PADEL
-        case 'Piscina1':
-            return Espacio.PISCINA1
-        case 'Piscina2':
-            return Espacio.PISCINA2
-
-def validate_post(user, momento_inicio, momento_fin, espacio):
-    fianza = Fianza.objects.get_or_create(user_id=user)[0]
-    if fianza.cantidad >= 10:
-        return JsonResponse({"error": "Tu fianza es igual o mayor a 10 euros"})
-
-    if momento_fin - momento_inicio != timedelta(hours=1):
-        return JsonResponse({"error": "La reserva debe durar una hora"})
-    if Reserva.objects.filter(user_id=user).count() >= 10:
-        return JsonResponse({"error": "No puedes tener más de 3 reservas"})
-    if Reserva.objects.filter(espacio=espacio, momento_inicio=momento_inicio, momento_fin=momento_fin).exists():
-        return JsonResponse({"error": "Ya existe una reserva en ese momento"})
-    # la reserva tiene que ser en el futuro:
-    if momento_inicio < now() or momento_fin < now():
-        return JsonResponse({"error": "La reserva tiene que ser en el futuro"})
-    if Reserva.objects.filter(espacio=espacio, momento_inicio=momento_inicio, momento_fin=momento_inicio).exists():
-        return JsonResponse({"error": "Ya existe una reserva en ese momento"})
-    # momento_inicio y momento_fin tiene que ser una hora entera y 0 minutos:
-    if momento_inicio.minute != 0 or momento_fin.minute != 0:
-        return JsonResponse({"error": "La reserva tiene que empezar y terminar en punto"})
-    return None
-
-def validate_put(user, reserva, data):
-    if data.get('momento_inicio'):
-        momento_inicio = make_aware(datetime.fromisoformat(data.get('momento_inicio')))
-        if reserva.momento_fin - momento_inicio != timedelta(hours=1):
-            return JsonResponse({"error": "La reserva debe durar una hora"})
-        if momento_inicio < now():
-            return JsonResponse({"error": "La reserva tiene que ser en el futuro"})
-        if momento_inicio.minute != 0:
-            return JsonResponse({"error": "La reserva tiene que empezar en punto"})
-
-    if data.get('momento_fin'):
-        momento_fin = make_aware(datetime.fromisoformat(data.get('momento_fin')))
-        if momento_fin - reserva.momento_inicio != timedelta(hours=1):
-            return JsonResponse({"error": "La reserva debe durar una hora"})
-        if momento_fin < now():
-            return JsonResponse({"error": "La reserva tiene que ser en el futuro"})
-        if momento_fin.minute != 0:
-            return JsonResponse({"error": "La reserva tiene que terminar en punto"})
-
-    if Reserva.objects.filter(user_id=user).count() >= 3:
-        return JsonResponse({"error": "No puedes tener más de 3 reservas"})
-   
-    espacio = evaluate(data.get('espacio')) if data.get('espacio') else reserva.espacio
-    momento_inicio = make_aware(datetime.fromisoformat(data.get('momento_inicio')) if data.get('momento_inicio') else reserva.momento_inicio)
-    momento_fin = make_aware(datetime.fromisoformat(data.get('momento_fin')) if data.get('momento_fin') else reserva.momento_fin)
-    if Reserva.objects.filter(espacio=espacio, momento_inicio=momento_inicio, momento_fin=momento_fin).exists():
-        return JsonResponse({"error": "Ya existe una reserva en ese momento"})
-    return None
+@login_required
+def lote_reservas_view(request):
+    # {"operaciones": [{"accion": "crear", "espacio": "Padel", "momento_inicio": "...", "momento_fin": "..."},
+    #                  {"accion": "modificar", "id": 1, ...}, {"accion": "eliminar", "id": 2}]}
+    data = json.loads(request.body)
+    operaciones = data.get('operaciones') or []
+    if len(operaciones) > MAX_OPERACIONES_LOTE:
+        return JsonResponse({"error": f"No se pueden enviar más de {MAX_OPERACIONES_LOTE} operaciones"}, status=400)
+    try:
+        resultados = procesar_lote(request.user, [parsear_operacion(op) for op in operaciones])
+    except ReservaError as e:
+        return JsonResponse({"error": str(e)})
+    return JsonResponse({"resultados": resultados})
+
+def parsear_operacion(op):
+    # devuelve la operación con los campos ya convertidos, o el ReservaError que la invalida
+    try:
+        accion = op.get('accion')
+        if accion not in ('crear', 'modificar', 'eliminar'):
+            raise ReservaError("Acción no válida")
+        if accion != 'crear' and not isinstance(op.get('id'), int):
+            raise ReservaError("Falta el id de la reserva")
+        espacio = op.get('espacio') or None
+        if espacio and espacio not in pistas():
+            raise ReservaError("Espacio no válido")
+        momentos = [make_aware(datetime.fromisoformat(op[campo])) if op.get(campo) else None
+                    for campo in ('momento_inicio', 'momento_fin')]
+        if accion == 'crear' and not (espacio and all(momentos)):
+            raise ReservaError("Faltan datos de la reserva")
+    except ReservaError as e:
+        return e
+    except (AttributeError, TypeError, ValueError):
+        return ReservaError("Operación no válida")
+    return {"accion": accion, "id": op.get('id'), "espacio": espacio,
+            "momento_inicio": momentos[0], "momento_fin": momentos[1]}
+
+def leer_rango(request, catalogo):
+    # ?desde=2024-01-01&hasta=2024-01-07&espacio=Padel&espacio=Fútbol -> (espacios, dias);
+    # catalogo: {nombre: Pista}, que la vista async obtiene sin bloquear. Lanza ValueError
+    # con el mensaje para el cliente
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else localdate()
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else desde
+    except ValueError:
+        raise ValueError("Las fechas tienen que tener el formato AAAA-MM-DD")
+    if hasta < desde or hasta - desde >= timedelta(days=MAX_DIAS_DISPONIBILIDAD):
+        raise ValueError(f"El rango tiene que ser de 1 a {MAX_DIAS_DISPONIBILIDAD} días")
+    espacios = (list(dict.fromkeys(request.GET.getlist('espacio')))
+                or [nombre for nombre, pista in catalogo.items() if pista.available])
+    if any(espacio not in catalogo for espacio in espacios):
+        raise ValueError("Espacio no válido")
+    return espacios, dias_entre(desde, hasta)
+
+@require_GET
+def disponibilidad_view(request):
+    try:
+        espacios, dias = leer_rango(request, pistas())
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    desde, hasta = dias[0], dias[-1]
+
+    ocupacion = obtener_ocupacion(espacios, dias)
+    # cada día es una cadena de 24 caracteres, uno por hora: '0' con plazas libres, '1' completa
+    # y '-' cerrada
+    data = {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "espacios": {
+            espacio: {dia.isoformat(): ocupacion[(espacio, dia)] for dia in dias}
+            for espacio in espacios
+        },
+    }
+    etag = '"%s"' % hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=30)
+    return response
+
+@require_GET
+async def eventos_disponibilidad_view(request):
+    # Server-Sent Events con los cambios de ocupación de los espacios y días pedidos (mismos
+    # parámetros que disponibilidad_view). Cada cliente es una corrutina esperando en su cola,
+    # así que solo funciona con ASGI: WSGI consume entero un iterador asíncrono antes de
+    # responder, y con un flujo sin fin la petición no terminaría nunca
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Los eventos solo están disponibles con un servidor ASGI"}, status=501)
+    try:
+        espacios, dias = leer_rango(request, await apistas())
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    franjas = [(espacio, dia) for espacio in espacios for dia in dias]
+
+    async def flujo():
+        suscripcion = difusor.suscribir(franjas)
+        try:
+            # el navegador reintenta a los 5 s si se corta la conexión
+            yield "retry: 5000\n\n"
+            while True:
+                evento = await suscripcion.siguiente(ESPERA_EVENTOS)
+                if evento is None:
+                    # comentario para que proxies y navegador no den la conexión por muerta
+                    yield ": ping\n\n"
+                    continue
+                yield formatear(evento)
+                if evento["tipo"] == REINICIO:
+                    return
+        finally:
+            difusor.cancelar(suscripcion)
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular la respuesta
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@staff_member_required
+def disponibilidad_estadisticas_view(request):
+    # aciertos/fallos de la caché de disponibilidad, para dimensionarla
+    return JsonResponse(estadisticas_cache())
+
+@staff_member_required
+def metricas_vistas_view(request):
+    # consultas, tiempo en la BD y latencia por vista (ms), con sus histogramas
+    return JsonResponse(resumen_metricas())
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+# variantes reducidas y en formatos modernos de las imágenes de static/images. Las genera el
+# comando generar_imagenes antes de collectstatic y las plantillas las usan con {% imagen %}
+
+ORIGEN = 'images'
+DESTINO = 'images/variantes'
+MANIFIESTO = f'{DESTINO}/manifest.json'
+ANCHOS = (320, 640, 1280, 1920)
+# (formato de Pillow, tipo MIME, extensión, opciones), de más a menos preferido
+FORMATOS = (
+    ('AVIF', 'image/avif', 'avif', {'quality': 50}),
+    ('WEBP', 'image/webp', 'webp', {'quality': 75, 'method': 6}),
+)
+# formato de respaldo para <img>, el mismo que el original
+RESPALDOS = {
+    '.jpg': ('JPEG', 'image/jpeg', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    '.jpeg': ('JPEG', 'image/jpeg', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    '.png': ('PNG', 'image/png', 'png', {'optimize': True}),
+}
+
+
+def anchos_para(ancho_original):
+    # sin ampliar: los anchos menores que el original y, como máximo, el original
+    return [ancho for ancho in ANCHOS[:-1] if ancho < ancho_original] + [min(ancho_original, ANCHOS[-1])]
+
+
+def huella(datos):
+    return hashlib.sha256(datos).hexdigest()[:12]
+
+
+def generar(directorio, forzar=False):
+    """Genera las variantes de las imágenes de <directorio>/images y actualiza el manifiesto.
+
+    Los nombres llevan el hash del contenido, así que se pueden servir con caché para siempre.
+    Las imágenes que no han cambiado desde la última vez se saltan salvo con forzar. Devuelve
+    [(ruta, tamaño original, tamaño de la variante más pequeña)] de las procesadas.
+    """
+    from PIL import Image, ImageOps
+
+    origen, destino = Path(directorio) / ORIGEN, Path(directorio) / DESTINO
+    destino.mkdir(parents=True, exist_ok=True)
+    ruta_manifiesto = Path(directorio) / MANIFIESTO
+    anterior = json.loads(ruta_manifiesto.read_text(encoding='utf-8')) if ruta_manifiesto.exists() else {}
+    # cambiar los anchos o las opciones también obliga a regenerar
+    configuracion = repr((ANCHOS, FORMATOS, sorted(RESPALDOS.items()))).encode()
+
+    manifiesto, procesadas = {}, []
+    for fichero in sorted(origen.iterdir()):
+        respaldo = RESPALDOS.get(fichero.suffix.lower())
+        if respaldo is None or not fichero.is_file():
+            continue
+        ruta = f'{ORIGEN}/{fichero.name}'
+        datos = fichero.read_bytes()
+        hash_origen = huella(datos + configuracion)
+        entrada = anterior.get(ruta)
+        if (not forzar and entrada and entrada['hash'] == hash_origen
+                and all((destino / nombre).exists() for _, nombre in nombres(entrada))):
+            manifiesto[ruta] = entrada
+            continue
+
+        imagen = ImageOps.exif_transpose(Image.open(BytesIO(datos)))
+        entrada = {'hash': hash_origen, 'ancho': imagen.width, 'respaldo': respaldo[1], 'variantes': {}}
+        for ancho in anchos_para(imagen.width):
+            reducida = imagen.resize((ancho, round(imagen.height * ancho / imagen.width)), Image.LANCZOS)
+            for formato, mime, extension, opciones in (*FORMATOS, respaldo):
+                salida = BytesIO()
+                preparar(reducida, formato).save(salida, formato, **opciones)
+                nombre = f'{fichero.stem}-{ancho}.{huella(salida.getvalue())[:8]}.{extension}'
+                (destino / nombre).write_bytes(salida.getvalue())
+                entrada['variantes'].setdefault(mime, []).append([ancho, nombre])
+        manifiesto[ruta] = entrada
+        menor = min((destino / nombre).stat().st_size for _, nombre in nombres(entrada))
+        procesadas.append((ruta, len(datos), menor))
+
+    # las variantes que ya no están en el manifiesto son de versiones anteriores
+    vigentes = {nombre for entrada in manifiesto.values() for _, nombre in nombres(entrada)}
+    for fichero in destino.iterdir():
+        if fichero.name != Path(MANIFIESTO).name and fichero.name not in vigentes:
+            fichero.unlink()
+    ruta_manifiesto.write_text(json.dumps(manifiesto, indent=1, sort_keys=True, ensure_ascii=False), encoding='utf-8')
+    manifiesto_estatico.cache_clear()
+    return procesadas
+
+
+def preparar(imagen, formato):
+    # JPEG no admite transparencia; AVIF y WebP la conservan y los PNG se quedan como están
+    if formato == 'PNG':
+        return imagen
+    if formato == 'JPEG' or imagen.mode not in ('RGBA', 'LA', 'P'):
+        return imagen.convert('RGB')
+    return imagen.convert('RGBA')
+
+
+def nombres(entrada):
+    return [(mime, nombre) for mime, lista in entrada['variantes'].items() for _, nombre in lista]
+
+
+@lru_cache(maxsize=None)
+def manifiesto_estatico():
+    # el de static/ en desarrollo; en producción puede que solo esté el copiado por collectstatic
+    ruta = finders.find(MANIFIESTO)
+    if not ruta and settings.STATIC_ROOT and os.path.exists(os.path.join(settings.STATIC_ROOT, MANIFIESTO)):
+        ruta = os.path.join(settings.STATIC_ROOT, MANIFIESTO)
+    if not ruta:
+        return {}
+    with open(ruta, encoding='utf-8') as fichero:
+        return json.load(fichero)
+
+
+def variantes(ruta):
+    """URLs de una imagen estática para <picture>.
+
+    Devuelve {'src', 'srcset', 'fuentes': {tipo MIME: srcset}}; si no se han generado
+    variantes de la imagen, solo el src del original.
+    """
+    entrada = manifiesto_estatico().get(ruta)
+    if entrada is None:
+        return {'src': static(ruta), 'srcset': '', 'fuentes': {}}
+    srcsets = {
+        mime: ', '.join(f'{static(f"{DESTINO}/{nombre}")} {ancho}w' for ancho, nombre in lista)
+        for mime, lista in entrada['variantes'].items()
+    }
+    # para los navegadores sin srcset, la variante de respaldo de 640 o la mayor por debajo
+    respaldo = entrada['variantes'][entrada['respaldo']]
+    src = [nombre for ancho, nombre in respaldo if ancho <= 640][-1:] or [respaldo[0][1]]
+    return {
+        'src': static(f'{DESTINO}/{src[0]}'),
+        'srcset': srcsets.pop(entrada['respaldo']),
+        'fuentes': srcsets,
+    }
+
+
+def fondo(ruta, ancho=ANCHOS[-1]):
+    # [(tipo MIME, url)] de la variante más pequeña que cubre `ancho` en cada formato, para image-set()
+    entrada = manifiesto_estatico().get(ruta)
+    if entrada is None:
+        return []
+    urls = []
+    for mime, lista in entrada['variantes'].items():
+        nombre = next((nombre for a, nombre in lista if a >= ancho), lista[-1][1])
+        urls.append((mime, static(f'{DESTINO}/{nombre}')))
+    orden = [mime for _, mime, _, _ in FORMATOS]
+    return sorted(urls, key=lambda url: orden.index(url[0]) if url[0] in orden else len(orden))
@@ -0,0 +1,31 @@
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENTRADA = os.path.join('assets', 'rede.css')
+SALIDA = os.path.join('css', 'rede.css')
+
+
+class Command(BaseCommand):
+    help = ('Compila con Tailwind assets/rede.css en static/css/rede.css, solo con las clases que usan las '
+            'plantillas y el JavaScript. Hay que ejecutarlo antes de collectstatic cada vez que cambian las clases')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vigilar', action='store_true',
+                            help='Seguir recompilando mientras se editan las plantillas')
+
+    def handle(self, *args, **options):
+        tailwind = os.environ.get('TAILWINDCSS') or shutil.which('tailwindcss')
+        if not tailwind:
+            raise CommandError('No se encuentra Tailwind: instálalo con pip install tailwindcss-bin '
+                               'o indica el ejecutable en la variable de entorno TAILWINDCSS')
+        salida = os.path.join(settings.STATICFILES_DIRS[0], SALIDA)
+        orden = [tailwind, '--input', os.path.join(settings.BASE_DIR, ENTRADA), '--output', salida, '--minify']
+        if options['vigilar']:
+            orden.append('--watch')
+        if subprocess.run(orden, cwd=settings.BASE_DIR).returncode:
+            raise CommandError('Tailwind no ha podido compilar los estilos')
+        self.stdout.write(self.style.SUCCESS(f'{salida}: {os.path.getsize(salida) / 1024:.0f} KB'))
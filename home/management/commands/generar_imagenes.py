@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home.imagenes import ANCHOS, generar
+
+
+class Command(BaseCommand):
+    help = (f'Genera variantes de {", ".join(map(str, ANCHOS))} px en AVIF, WebP y el formato original de '
+            'las imágenes de static/images, con el hash del contenido en el nombre. Hay que ejecutarlo '
+            'antes de collectstatic')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenerar también las que no han cambiado')
+
+    def handle(self, *args, **options):
+        procesadas = generar(settings.STATICFILES_DIRS[0], options['forzar'])
+        for ruta, original, menor in procesadas:
+            self.stdout.write(f'{ruta}: {original / 1024:.0f} KB, variante más pequeña {menor / 1024:.0f} KB')
+        self.stdout.write(self.style.SUCCESS(f'{len(procesadas)} imágenes procesadas'))
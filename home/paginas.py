@@ -0,0 +1,87 @@
+import hashlib
+import json
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.translation import get_language
+
+from .imagenes import manifiesto_estatico
+
+# caché de las páginas que solo cambian con cada despliegue (portada, sobre nosotros,
+# política de privacidad) y de los fragmentos de base.html. Lo único que depende del usuario
+# es la barra de navegación: las páginas completas solo se guardan para los anónimos
+
+CACHE = 'paginas'
+BASE = 'base.html'
+
+
+@lru_cache(maxsize=None)
+def _version(plantillas):
+    huella = hashlib.md5()
+    for plantilla in plantillas:
+        huella.update(get_template(plantilla).template.source.encode())
+    # los nombres con hash de los estáticos y de las variantes de las imágenes
+    huella.update(getattr(staticfiles_storage, 'manifest_hash', '').encode())
+    huella.update(json.dumps(manifiesto_estatico(), sort_keys=True).encode())
+    return huella.hexdigest()
+
+
+def version(*plantillas):
+    """Huella de lo que cambia con cada despliegue: el código de las plantillas y los estáticos.
+
+    Se calcula una vez por proceso; con DEBUG en cada petición, para ver los cambios de las
+    plantillas sin reiniciar.
+    """
+    if settings.DEBUG:
+        return _version.__wrapped__(plantillas)
+    return _version(plantillas)
+
+
+def estado_usuario(request):
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonimo'
+    # el formulario de cerrar sesión lleva el token CSRF, que cambia al iniciar sesión
+    return f"{'admin' if user.is_superuser else 'usuario'}:{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}"
+
+
+def pagina_estatica(plantilla):
+    """Decorador para las vistas que solo renderizan <plantilla>: ETag, 304 y caché.
+
+    Responde 304 si el navegador ya tiene la misma versión de la página para el mismo usuario
+    e idioma, y a los anónimos les sirve la página de la caché sin llamar a la vista.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltorio(request, *args, **kwargs):
+            idioma = get_language()
+            pagina = version(plantilla, BASE)
+            estado = estado_usuario(request)
+            etag = '"%s"' % hashlib.md5(f'{pagina}:{idioma}:{estado}'.encode()).hexdigest()
+            response = get_conditional_response(request, etag=etag)
+            if response is None and estado == 'anonimo':
+                clave = f'pagina:{plantilla}:{idioma}:{pagina}'
+                contenido = caches[CACHE].get(clave)
+                if contenido is None:
+                    contenido = vista(request, *args, **kwargs).content
+                    caches[CACHE].set(clave, contenido, None)
+                response = HttpResponse(contenido)
+            elif response is None:
+                response = vista(request, *args, **kwargs)
+            response['ETag'] = etag
+            # el navegador guarda la página pero pregunta siempre si ha cambiado
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie', 'Accept-Language'])
+            return response
+        return envoltorio
+    return decorador
+
+
+def version_base(request):
+    # procesador de contexto: versión de base.html para las claves de sus fragmentos en caché
+    return {'version_base': version(BASE)}
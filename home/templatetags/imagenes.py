@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from home import imagenes
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen(ruta, alt='', sizes='100vw', loading='lazy', **atributos):
+    """<picture> con las variantes AVIF y WebP de una imagen estática y la de respaldo en <img>.
+
+    {% imagen 'images/padel.jpg' alt='Padel' sizes='300px' class='w-full' %}. Con ruta vacía
+    deja los <source> sin srcset, para las plantillas que rellena el JavaScript.
+    """
+    if ruta:
+        datos = imagenes.variantes(ruta)
+    else:
+        datos = {'src': '', 'srcset': '', 'fuentes': {mime: '' for _, mime, _, _ in imagenes.FORMATOS}}
+    fuentes = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcset, sizes) for mime, srcset in datos['fuentes'].items()),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        fuentes, datos['src'], datos['srcset'], sizes, alt, loading,
+        format_html_join('', ' {}="{}"', atributos.items()),
+    )
+
+
+@register.simple_tag
+def fondo(ruta, ancho=imagenes.ANCHOS[-1]):
+    """Declaraciones de background-image con image-set() de las variantes de una imagen."""
+    urls = imagenes.fondo(ruta, ancho)
+    if not urls:
+        return format_html("background-image: url('{}');", imagenes.variantes(ruta)['src'])
+    # la primera, en el formato original, para los navegadores que no entienden image-set()
+    return format_html(
+        "background-image: url('{}'); background-image: image-set({});",
+        urls[-1][1], format_html_join(', ', 'url(\'{}\') type("{}")', ((url, mime) for mime, url in urls)),
+    )
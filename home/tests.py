@@ -1,3 +1,166 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.cache import caches
+from django.shortcuts import render
+from django.template import Context, Template
+from django.templatetags.static import static
 from django.test import TestCase
+from django.urls import reverse
+
+from home import imagenes, paginas
+from rede.estaticos import AlmacenEstaticos
 
 # Create your tests here.
+class GenerarImagenesTestCase(TestCase):
+    def setUp(self):
+        from PIL import Image
+        self.directorio = Path(tempfile.mkdtemp())
+        (self.directorio / 'images').mkdir()
+        Image.new('RGB', (800, 600), 'green').save(self.directorio / 'images' / 'padel.jpg')
+        Image.new('RGBA', (200, 200), (255, 0, 0, 128)).save(self.directorio / 'images' / 'escudo.png')
+        (self.directorio / 'images' / 'logo_ico.ico').write_bytes(b'no es una imagen que se procese')
+
+    def manifiesto(self):
+        return json.loads((self.directorio / imagenes.MANIFIESTO).read_text(encoding='utf-8'))
+
+    def test_variantes_por_ancho_y_formato(self):
+        procesadas = imagenes.generar(self.directorio)
+        self.assertEqual(sorted(ruta for ruta, _, _ in procesadas), ['images/escudo.png', 'images/padel.jpg'])
+        padel = self.manifiesto()['images/padel.jpg']
+        # sin ampliar por encima del original
+        self.assertEqual([ancho for ancho, _ in padel['variantes']['image/webp']], [320, 640, 800])
+        self.assertEqual(set(padel['variantes']), {'image/avif', 'image/webp', 'image/jpeg'})
+        self.assertEqual(set(self.manifiesto()['images/escudo.png']['variantes']), {'image/avif', 'image/webp', 'image/png'})
+        for _, nombre in imagenes.nombres(padel):
+            self.assertRegex(nombre, r'^padel-\d+\.[0-9a-f]{8}\.(avif|webp|jpg)$')
+            self.assertTrue((self.directorio / imagenes.DESTINO / nombre).exists())
+
+    def test_anchos_sin_repetir(self):
+        self.assertEqual(imagenes.anchos_para(200), [200])
+        self.assertEqual(imagenes.anchos_para(1920), [320, 640, 1280, 1920])
+        self.assertEqual(imagenes.anchos_para(4000), [320, 640, 1280, 1920])
+
+    def test_solo_regenera_lo_que_cambia(self):
+        from PIL import Image
+        imagenes.generar(self.directorio)
+        anteriores = {nombre for _, nombre in imagenes.nombres(self.manifiesto()['images/padel.jpg'])}
+        self.assertEqual(imagenes.generar(self.directorio), [])
+
+        Image.new('RGB', (800, 600), 'blue').save(self.directorio / 'images' / 'padel.jpg')
+        procesadas = imagenes.generar(self.directorio)
+        self.assertEqual([ruta for ruta, _, _ in procesadas], ['images/padel.jpg'])
+        nuevas = {nombre for _, nombre in imagenes.nombres(self.manifiesto()['images/padel.jpg'])}
+        self.assertFalse(anteriores & nuevas)
+        # las variantes de la versión anterior se borran
+        self.assertFalse(any((self.directorio / imagenes.DESTINO / nombre).exists() for nombre in anteriores))
+
+
+MANIFIESTO = {
+    'images/padel.jpg': {
+        'hash': 'x', 'ancho': 800, 'respaldo': 'image/jpeg',
+        'variantes': {
+            'image/avif': [[320, 'padel-320.a.avif'], [640, 'padel-640.b.avif']],
+            'image/webp': [[320, 'padel-320.c.webp'], [640, 'padel-640.d.webp']],
+            'image/jpeg': [[320, 'padel-320.e.jpg'], [640, 'padel-640.f.jpg'], [800, 'padel-800.g.jpg']],
+        },
+    },
+}
+
+
+@mock.patch('home.imagenes.manifiesto_estatico', return_value=MANIFIESTO)
+class ImagenTagTestCase(TestCase):
+    def render(self, plantilla):
+        return Template('{% load imagenes %}' + plantilla).render(Context())
+
+    def test_picture_con_srcset(self, manifiesto):
+        html = self.render("{% imagen 'images/padel.jpg' alt='Padel' sizes='300px' class='w-full' %}")
+        variante = lambda nombre: static(f'{imagenes.DESTINO}/{nombre}')
+        self.assertInHTML(
+            f'<picture>'
+            f'<source type="image/avif" srcset="{variante("padel-320.a.avif")} 320w, {variante("padel-640.b.avif")} 640w" sizes="300px">'
+            f'<source type="image/webp" srcset="{variante("padel-320.c.webp")} 320w, {variante("padel-640.d.webp")} 640w" sizes="300px">'
+            f'<img src="{variante("padel-640.f.jpg")}" srcset="{variante("padel-320.e.jpg")} 320w, '
+            f'{variante("padel-640.f.jpg")} 640w, {variante("padel-800.g.jpg")} 800w" sizes="300px" alt="Padel" '
+            f'loading="lazy" decoding="async" class="w-full">'
+            f'</picture>',
+            html,
+        )
+
+    def test_sin_variantes_usa_el_original(self, manifiesto):
+        html = self.render("{% imagen 'images/fondo.jpg' alt='Fondo' %}")
+        self.assertIn(f'src="{static("images/fondo.jpg")}"', html)
+        self.assertNotIn('<source', html)
+
+    def test_fondo_con_image_set(self, manifiesto):
+        css = self.render("{% fondo 'images/padel.jpg' 640 %}")
+        self.assertIn(f"background-image: url('{static(imagenes.DESTINO + '/padel-640.f.jpg')}');", css)
+        self.assertIn(f"""image-set(url('{static(imagenes.DESTINO + '/padel-640.b.avif')}') type("image/avif"), """, css)
+        self.assertEqual(self.render("{% fondo 'images/fondo.jpg' %}"),
+                         f"background-image: url('{static('images/fondo.jpg')}');")
+
+
+class EstaticosTestCase(TestCase):
+    def test_css_y_js_propios_sin_cdn(self):
+        html = self.client.get('/').content.decode()
+        self.assertIn(static('css/rede.css'), html)
+        self.assertIn(static('js/menus.js'), html)
+        self.assertNotIn('cdn.tailwindcss.com', html)
+        self.assertNotIn('flowbite', html)
+
+    def test_css_compilado_con_las_clases_de_las_plantillas(self):
+        with open(finders.find('css/rede.css'), encoding='utf-8') as fichero:
+            css = fichero.read()
+        for clase in ('.bg-gray-100', '.md\\:block', '.dark\\:bg-gray-900', '.bg-black\\/50'):
+            self.assertIn(clase, css)
+        # solo las que se usan
+        self.assertNotIn('.bg-fuchsia-500', css)
+
+    def test_lo_que_no_esta_en_el_manifiesto_se_enlaza_sin_hash(self):
+        almacen = AlmacenEstaticos(location=tempfile.mkdtemp(), base_url='/static/')
+        self.assertEqual(almacen.url('images/video_inicio.mp4'), '/static/images/video_inicio.mp4')
+
+
+class PaginasEstaticasTestCase(TestCase):
+    def setUp(self):
+        caches[paginas.CACHE].clear()
+
+    def test_etag_devuelve_304(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_anonimos_desde_la_cache(self):
+        with mock.patch('home.views.render', wraps=render) as renderizar:
+            primera = self.client.get(reverse('about-us'))
+            segunda = self.client.get(reverse('about-us'))
+        self.assertEqual(renderizar.call_count, 1)
+        self.assertEqual(primera.content, segunda.content)
+        self.assertContains(segunda, 'Iniciar sesión')
+
+    def test_etag_cambia_con_el_usuario(self):
+        anonimo = self.client.get(reverse('home'))['ETag']
+        self.client.force_login(User.objects.create_user(username='12345678Z', password='password123'))
+        with mock.patch('home.views.render', wraps=render) as renderizar:
+            response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=anonimo)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Cerrar sesión')
+            self.assertContains(response, 'csrfmiddlewaretoken')
+            # la página de un usuario no se guarda entera: lleva su token CSRF
+            self.client.get(reverse('home'))
+        self.assertEqual(renderizar.call_count, 2)
+
+    def test_barra_en_cache_por_tipo_de_usuario(self):
+        self.client.force_login(User.objects.create_user(username='12345678Z', password='password123'))
+        self.assertNotContains(self.client.get(reverse('privacy-policy')), 'Panel de Administrador')
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password123'))
+        self.assertContains(self.client.get(reverse('privacy-policy')), 'Panel de Administrador')
+        self.assertContains(self.client.get(reverse('privacy-policy')), 'Panel de Administrador')
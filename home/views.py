@@ -1,11 +1,16 @@
 from django.shortcuts import render
 
+from .paginas import pagina_estatica
+
 # Create your views here.
+@pagina_estatica('home/index.html')
 def home_view(request):
     return render(request, 'home/index.html')
 
+@pagina_estatica('home/privacy_policy.html')
 def privacy_policy_view(request):
     return render(request, 'home/privacy_policy.html')
 
+@pagina_estatica('home/about_us.html')
 def about_us_view(request):
-    return render(request, 'home/about_us.html')
\ No newline at end of file
+    return render(request, 'home/about_us.html')
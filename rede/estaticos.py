@@ -0,0 +1,11 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class AlmacenEstaticos(CompressedManifestStaticFilesStorage):
+    # los ficheros que no están en el manifiesto (los vídeos de la portada no se suben al
+    # repositorio) se enlazan sin hash, como sin manifiesto, en lugar de dar un error 500
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
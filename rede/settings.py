@@ -12,9 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-import yagmail
-import keyring
-from keyrings.alt.file import PlaintextKeyring
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gestion_reservas.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,12 +59,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
 ]
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
 ROOT_URLCONF = 'rede.urls'
 
 TEMPLATES = [
@@ -79,6 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'home.paginas.version_base',
             ],
         },
     },
@@ -94,10 +90,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # las transacciones toman el bloqueo de escritura al empezar (equivale al
+            # select_for_update que SQLite ignora) y esperan hasta 20 s antes de "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# 'disponibilidad' guarda la ocupación por (espacio, día); en producción se puede
+# cambiar por un backend compartido entre workers (Redis, Memcached, base de datos...)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'disponibilidad': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'disponibilidad',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # páginas de home y fragmentos de base.html (ver home.paginas); las claves llevan la versión
+    # de las plantillas, así que no hace falta que caduquen
+    'paginas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'paginas',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # versión del catálogo de pistas (ver gestion_pistas.catalogo): en fichero para que todos los
+    # workers de la máquina vean el cambio de una pista o un cierre. Con varias máquinas, usar un
+    # backend compartido (Memcached, Redis...)
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'rede-catalogo'),
+        'TIMEOUT': None,
+    },
+    # en fichero para que el comando metricas_vistas lea lo que vuelcan los workers
+    'metricas': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'rede-metricas'),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+}
+
+# peticiones que tarden al menos esto (ms) se registran con sus consultas; None lo desactiva
+METRICAS_UMBRAL_LENTO_MS = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -135,6 +180,11 @@ USE_TZ = True
 STATIC_URL = '/static/'  # URL pública para acceder a los archivos estáticos
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]  # Directorio donde estarán tus archivos estáticos en desarrollo
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Directorio para recolectar los archivos estáticos en producción
+# en producción, con hash en el nombre y comprimidos (ver settings_produccion)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 #para cargar imagenes
 MEDIA_URL = '/media/'
@@ -145,13 +195,18 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# configuración de correo electronico
-# Configuración de correo electrónico
-keyring.set_keyring(PlaintextKeyring())
-yagmail.register('atencion.contacto.rede@gmail.com', 'zrzv rcdf iaja okwg')
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_HOST_USER = 'atencion.contacto.rede@gmail.com'
-EMAIL_HOST_PASSWORD = 'zrzv rcdf iaja okwg '
+# Configuración de correo electrónico
+# Se lee de variables de entorno; la conexión SMTP solo se abre al enviar la cola de correos,
+# así que arrancar el proyecto o ejecutar un comando no toca el correo
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'true').lower() == 'true'
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'atencion.contacto.rede@gmail.com')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+# los correos de contacto se guardan en una cola (contacto.CorreoSaliente); con esto se envían
+# en un hilo nada más encolarlos, además de con el comando enviar_correos. El hilo vacía la cola
+# y programa los reintentos de los que fallan, pero solo mientras el proceso siga vivo: para no
+# perder reintentos al reiniciar, ejecute también 'python manage.py enviar_correos' cada pocos
+# minutos (cron) o 'enviar_correos --continuo' como proceso aparte
+CORREO_ENVIO_EN_SEGUNDO_PLANO = True
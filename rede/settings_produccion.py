@@ -0,0 +1,48 @@
+"""
+Django settings for rede project in production.
+
+Extends rede/settings.py. Select it with the environment variable
+DJANGO_SETTINGS_MODULE=rede.settings_produccion (e.g. in the Render service).
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, STORAGES, TEMPLATES
+import os
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+# con DEBUG activado Django guarda en memoria todas las consultas SQL de cada petición
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'rede-ev42.onrender.com').split(',')
+
+# Database
+# conexiones persistentes en lugar de abrir una por petición, y SQLite en modo WAL para
+# que las lecturas no esperen a las escrituras
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+DATABASES['default']['OPTIONS']['init_command'] = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA temp_store=MEMORY;'
+    'PRAGMA cache_size=-20000;'
+    'PRAGMA mmap_size=134217728;'
+)
+
+# Templates
+# las plantillas se compilan una vez por proceso
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Static files
+# collectstatic pone el hash del contenido en el nombre de cada fichero y guarda versiones
+# comprimidas con gzip y brotli; WhiteNoise sirve los ficheros con hash con caché de un año
+STORAGES['staticfiles']['BACKEND'] = 'rede.estaticos.AlmacenEstaticos'
+
+# peticiones lentas al log con sus consultas
+METRICAS_UMBRAL_LENTO_MS = int(os.environ.get('DJANGO_UMBRAL_LENTO_MS', 1000))
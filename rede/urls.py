@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 
 from django.urls import path, include 
-from gestion_reservas.views import reservas_view, crear_reserva_view, modificar_reserva_view, eliminar_reserva_view 
+from gestion_reservas.views import reservas_view, lista_reservas_view, crear_reserva_view, modificar_reserva_view, eliminar_reserva_view, disponibilidad_view, eventos_disponibilidad_view, disponibilidad_estadisticas_view, lote_reservas_view, metricas_vistas_view
 from home.views import home_view
 
 urlpatterns = [
@@ -25,8 +25,14 @@ urlpatterns = [
     path('', include('home.urls')),
     path('', include('autenticacion.urls')),
     path('reservas/', reservas_view, name='reservas'),
+    path('reservas/lista/', lista_reservas_view, name='lista_reservas'),
     path('reservas/crear/', crear_reserva_view, name='crear_reserva'),
     path('reservas/modificar/<int:reserva_id>/', modificar_reserva_view, name='modificar_reserva'),
     path('reservas/eliminar/<int:reserva_id>/', eliminar_reserva_view, name='eliminar_reserva'),
+    path('reservas/lote/', lote_reservas_view, name='lote_reservas'),
+    path('reservas/disponibilidad/', disponibilidad_view, name='disponibilidad'),
+    path('reservas/disponibilidad/eventos/', eventos_disponibilidad_view, name='eventos_disponibilidad'),
+    path('reservas/disponibilidad/estadisticas/', disponibilidad_estadisticas_view, name='disponibilidad_estadisticas'),
+    path('reservas/metricas/', metricas_vistas_view, name='metricas_vistas'),
     path('contacto/', include('contacto.urls')),
     ]
@@ -0,0 +1,54 @@
+// Menú móvil y desplegables de la barra de navegación: los atributos data-collapse-toggle y
+// data-dropdown-toggle de Flowbite, que son lo único de Flowbite que usan las plantillas
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('[data-collapse-toggle]').forEach(function (boton) {
+    const menu = document.getElementById(boton.dataset.collapseToggle);
+    boton.addEventListener('click', function () {
+      const abierto = !menu.classList.toggle('hidden');
+      boton.setAttribute('aria-expanded', abierto);
+    });
+  });
+
+  const desplegables = [];
+  document.querySelectorAll('[data-dropdown-toggle]').forEach(function (boton) {
+    const menu = document.getElementById(boton.dataset.dropdownToggle);
+    desplegables.push(menu);
+    boton.addEventListener('click', function (evento) {
+      evento.stopPropagation();
+      const abrir = menu.classList.contains('hidden');
+      cerrarDesplegables();
+      if (!abrir) {
+        return;
+      }
+      // debajo del botón, alineado a su izquierda
+      menu.classList.remove('hidden');
+      menu.style.position = 'absolute';
+      const padre = (menu.offsetParent || document.body).getBoundingClientRect();
+      const posicion = boton.getBoundingClientRect();
+      menu.style.left = `${posicion.left - padre.left}px`;
+      menu.style.top = `${posicion.bottom - padre.top + 10}px`;
+      boton.setAttribute('aria-expanded', 'true');
+    });
+  });
+
+  function cerrarDesplegables() {
+    desplegables.forEach(function (menu) {
+      menu.classList.add('hidden');
+    });
+    document.querySelectorAll('[data-dropdown-toggle]').forEach(function (boton) {
+      boton.setAttribute('aria-expanded', 'false');
+    });
+  }
+
+  document.addEventListener('click', function (evento) {
+    if (!desplegables.some(function (menu) { return menu.contains(evento.target); })) {
+      cerrarDesplegables();
+    }
+  });
+  document.addEventListener('keydown', function (evento) {
+    if (evento.key === 'Escape') {
+      cerrarDesplegables();
+    }
+  });
+  window.addEventListener('resize', cerrarDesplegables);
+});